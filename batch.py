@@ -0,0 +1,167 @@
+"""
+Batch compilation and execution of many Xlang programs across cores.
+
+Files are handed out one at a time to a pool of worker processes. Each
+worker sets up LLVM (target machine and JIT engine) once when it starts
+and then runs every file it receives in-process, capturing the output in
+memory, so the per-file cost is just compiling and running that file.
+With use_profiles, a file that has a recorded branch profile next to it
+(see pgo.py) is compiled with its branch weights. Programs run on the
+backend chosen by ide.execute, so short ones skip LLVM entirely.
+
+A program that kills its worker (e.g. a fatal signal in native code)
+breaks the pool. The pool is then restarted and the files that were in
+flight are retried one at a time, so a file that breaks the pool again
+while running alone is known to be the one that crashes.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from codegen import DEFAULT_OPT_LEVEL, get_engine, get_target_machine
+from cache import ObjectCache
+from runtime import OutputCapture
+from ide import execute
+from config import DEFAULT_BACKEND
+from pgo import BranchProfile, default_profile_path
+
+
+SOURCE_SUFFIX = ".xl"
+
+
+class BatchResult:
+    __slots__ = ('path', 'exit_code', 'output', 'seconds', 'error')
+    
+    def __init__(self, path: str, exit_code: int = None, output: bytes = b"",
+                 seconds: float = 0.0, error: str = None):
+        self.path = path
+        self.exit_code = exit_code
+        self.output = output
+        self.seconds = seconds
+        self.error = error
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.exit_code == 0
+    
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "exit_code": self.exit_code,
+            "output": self.output.decode('utf-8', 'replace'),
+            "seconds": self.seconds,
+            "error": self.error,
+        }
+    
+    def __repr__(self):
+        return f"BatchResult({self.path!r}, exit_code={self.exit_code}, error={self.error!r})"
+
+
+def collect_sources(paths) -> list:
+    """Expand directories into the .xl files below them, in a stable order."""
+    sources = []
+    for path in paths:
+        if not os.path.isdir(path):
+            sources.append(path)
+            continue
+        found = []
+        for directory, _, names in os.walk(path):
+            found.extend(os.path.join(directory, name) for name in names if name.endswith(SOURCE_SUFFIX))
+        sources.extend(sorted(found))
+    return sources
+
+
+# Per-worker state, set up once by _init_worker.
+_worker_opt_level = DEFAULT_OPT_LEVEL
+_worker_cache = None
+_worker_use_profiles = False
+_worker_backend = DEFAULT_BACKEND
+
+
+def _init_worker(opt_level: int, cache_dir: str, use_cache: bool, use_profiles: bool, backend: str):
+    global _worker_opt_level, _worker_cache, _worker_use_profiles, _worker_backend
+    _worker_opt_level = opt_level
+    _worker_cache = ObjectCache(cache_dir) if use_cache else None
+    _worker_use_profiles = use_profiles
+    _worker_backend = backend
+    get_target_machine(opt_level)
+    get_engine(opt_level)
+
+
+def run_file(path: str, opt_level: int = DEFAULT_OPT_LEVEL, cache: ObjectCache = None,
+             use_profile: bool = False, backend: str = DEFAULT_BACKEND) -> BatchResult:
+    output = OutputCapture()
+    start = time.perf_counter()
+    try:
+        with open(path, 'r') as f:
+            source = f.read()
+        branch_profile = None
+        profile_path = default_profile_path(path)
+        if use_profile and os.path.exists(profile_path):
+            branch_profile = BranchProfile.load(profile_path)
+        exit_code = execute(source, opt_level, cache, output, branch_profile=branch_profile, backend=backend)
+    except Exception as e:
+        return BatchResult(path, output=output.getvalue(), seconds=time.perf_counter() - start,
+                           error=f"{type(e).__name__}: {e}")
+    return BatchResult(path, exit_code, output.getvalue(), time.perf_counter() - start)
+
+
+def _run_in_worker(path: str) -> BatchResult:
+    return run_file(path, _worker_opt_level, _worker_cache, _worker_use_profiles, _worker_backend)
+
+
+def run_batch(paths, jobs: int = None, opt_level: int = DEFAULT_OPT_LEVEL,
+              cache_dir: str = None, use_cache: bool = True, on_result=None,
+              use_profiles: bool = False, backend: str = DEFAULT_BACKEND) -> list:
+    """Run every file in paths on a pool of jobs workers.
+    
+    Returns one BatchResult per file, in the order of paths. on_result, if
+    given, is called with each result as soon as it is available.
+    """
+    paths = list(paths)
+    jobs = jobs or os.cpu_count() or 1
+    results = [None] * len(paths)
+    queue = list(range(len(paths) - 1, -1, -1))
+    # Files that were in flight when a worker died; these run on their own.
+    suspects = set()
+    
+    while queue:
+        running = {}
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(opt_level, cache_dir, use_cache, use_profiles, backend)) as pool:
+            # At most one file per worker is in flight, so a crash only
+            # affects the files that were actually running.
+            try:
+                while queue or running:
+                    while queue and len(running) < jobs:
+                        if running and (queue[-1] in suspects or not suspects.isdisjoint(running.values())):
+                            break
+                        index = queue.pop()
+                        running[pool.submit(_run_in_worker, paths[index])] = index
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        index = running.pop(future)
+                        results[index] = result
+                        if on_result is not None:
+                            on_result(results[index])
+            except BrokenProcessPool:
+                pass
+        
+        for future, index in running.items():
+            if future.done() and not future.exception():
+                results[index] = future.result()
+                if on_result is not None:
+                    on_result(results[index])
+                continue
+            if index in suspects:
+                results[index] = BatchResult(paths[index], error="Worker process crashed")
+                if on_result is not None:
+                    on_result(results[index])
+            else:
+                suspects.add(index)
+                queue.append(index)
+    
+    return results
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Bundled JIT benchmark: runs many small programs once as one module each
+(ide.compile_ast + compile_and_run, what the JIT backend does per file)
+and once through bundle.run_bundle, checks that every program gives the
+same exit code and output both ways, and reports programs per second.
+
+Usage: python benchmarks/bench_bundle.py [--programs N] [--bundle-size B] [-O N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bundle import DEFAULT_BUNDLE_SIZE, run_bundle
+from codegen import DEFAULT_OPT_LEVEL, OPT_LEVELS
+from ide import compile_ast, parse_source, warm_up
+from runtime import OutputCapture
+
+
+SNIPPET = '''make total = {n}
+make i = 0
+loop i < {m}:
+    if i == {m} / 2:
+        show "half way"
+    else:
+        make total = total + i * {k}
+    stop
+    make i = i + 1
+stop
+show total
+'''
+
+
+def snippets(count: int) -> list:
+    """Small programs of a typical regression-test size, all different so nothing is shared by accident."""
+    return [SNIPPET.format(n=n % 97, m=n % 8 + 2, k=n % 13 + 1) for n in range(count)]
+
+
+def run_separately(sources: list, opt_level: int) -> list:
+    results = []
+    for source in sources:
+        output = OutputCapture()
+        exit_code = compile_ast(parse_source(source, opt_level), opt_level).compile_and_run(output)
+        results.append((exit_code, output.getvalue()))
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--programs", type=int, default=2000)
+    arg_parser.add_argument("--bundle-size", type=int, default=DEFAULT_BUNDLE_SIZE)
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL)
+    args = arg_parser.parse_args()
+    
+    sources = snippets(args.programs)
+    warm_up(args.opt_level)
+    
+    start = time.perf_counter()
+    expected = run_separately(sources, args.opt_level)
+    separate = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    results = run_bundle(sources, args.opt_level, bundle_size=args.bundle_size)
+    bundled = time.perf_counter() - start
+    
+    mismatches = sum(1 for result, (exit_code, output) in zip(results, expected)
+                     if (result.exit_code, result.output, result.error) != (exit_code, output, None))
+    
+    count = len(sources)
+    print(f"{'':>10} {'seconds':>10} {'programs/s':>12} {'ms/program':>12}")
+    for name, seconds in (("separate", separate), ("bundled", bundled)):
+        print(f"{name:>10} {seconds:>10.3f} {count / seconds:>12.1f} {seconds * 1000 / count:>12.3f}")
+    print(f"speedup {separate / bundled:.1f}x, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Compiler throughput benchmark: times every pipeline stage separately on
+synthetic programs of each shape (see generators.py) and size.
+
+Stages: tokenize (Lexer.tokenize), lex (Lexer.tokenize_buffer), parse,
+optimize_ast, generate, verify, jit (LLVM optimization and machine code)
+and run. LLVM stages are skipped above --llvm-max-lines, since a single
+large function takes minutes to optimize at -O2.
+
+Results can be saved as a JSON baseline with --output. With --baseline,
+each stage is compared against the saved numbers, and any stage whose
+time per line regressed by more than --tolerance, or whose time grows
+faster than --max-exponent between two sizes (super-linear scaling), is
+reported and makes the run fail.
+
+baseline.json next to this script holds a run with the defaults; the
+machine it was recorded on is in its environment. Known limit: the jit
+stage of the nested shape grows about as lines^1.25. A program is one
+LLVM function, and loop passes such as LoopRotate and GVN cost more per
+loop the larger that function gets.
+
+Usage: python benchmarks/bench_compiler.py [--shapes S ...] [--lines N ...]
+                                           [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import llvmlite
+from llvmlite import binding
+
+from lexer import Lexer
+from parser import Parser
+from optimizer import optimize_ast
+from codegen import (
+    CodeGenerator, DEFAULT_OPT_LEVEL, OPT_LEVELS, get_target_machine, load_module, unload_module, run_entry,
+)
+from runtime import OutputCapture, output_symbol
+from generators import GENERATORS
+
+
+STAGES = ("tokenize", "lex", "parse", "optimize_ast", "generate", "verify", "jit", "run")
+
+DEFAULT_LINES = [1000, 10000, 100000]
+
+# Timings shorter than this are too noisy to compare.
+MIN_SECONDS = 0.05
+
+
+def timed(func):
+    # Like timeit, keep collector pauses triggered by earlier stages out of the numbers.
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = func()
+        return time.perf_counter() - start, result
+    finally:
+        gc.enable()
+
+
+def measure(source: str, opt_level: int, llvm: bool) -> dict:
+    times = {}
+    times["tokenize"], _ = timed(lambda: Lexer(source).tokenize())
+    times["lex"], tokens = timed(lambda: Lexer(source).tokenize_buffer())
+    times["parse"], ast = timed(lambda: Parser(tokens).parse())
+    del tokens
+    if opt_level > 0:
+        times["optimize_ast"], ast = timed(lambda: optimize_ast(ast))
+    if not llvm:
+        return times
+    
+    codegen = CodeGenerator(opt_level=opt_level)
+    times["generate"], _ = timed(lambda: codegen.generate(ast))
+    del ast
+    times["verify"], mod = timed(codegen.verify)
+    
+    loaded = []
+    
+    def jit():
+        codegen.optimize(mod, get_target_machine(opt_level))
+        engine = load_module(mod, opt_level)
+        loaded.append(mod)
+        engine.finalize_object()
+        return (engine.get_function_address(codegen.entry_name),
+                engine.get_global_value_address(output_symbol(codegen.entry_name)))
+    
+    try:
+        times["jit"], (main_ptr, sink_ptr) = timed(jit)
+        times["run"], _ = timed(lambda: run_entry(main_ptr, sink_ptr, OutputCapture()))
+    finally:
+        if loaded:
+            unload_module(mod, opt_level)
+    return times
+
+
+def best_of(source: str, opt_level: int, llvm: bool, repeat: int) -> dict:
+    best = {}
+    for _ in range(repeat):
+        for stage, seconds in measure(source, opt_level, llvm).items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+    return best
+
+
+def environment(opt_level: int) -> dict:
+    return {
+        "python": platform.python_version(),
+        "llvmlite": llvmlite.__version__,
+        "llvm": ".".join(map(str, binding.llvm_version_info)),
+        "machine": platform.machine(),
+        "opt_level": opt_level,
+    }
+
+
+def scaling_problems(results: list, max_exponent: float) -> list:
+    """Find stages whose time grows faster than lines ** max_exponent."""
+    problems = []
+    by_shape = {}
+    for result in results:
+        by_shape.setdefault(result["shape"], []).append(result)
+    for shape, rows in by_shape.items():
+        rows.sort(key=lambda row: row["lines"])
+        for small, large in zip(rows, rows[1:]):
+            for stage in STAGES:
+                before = small["seconds"].get(stage)
+                after = large["seconds"].get(stage)
+                if not before or not after or after < MIN_SECONDS:
+                    continue
+                exponent = math.log(after / before) / math.log(large["lines"] / small["lines"])
+                if exponent > max_exponent:
+                    problems.append(f"{shape}/{stage}: time grows as lines^{exponent:.2f} "
+                                    f"from {small['lines']} to {large['lines']} lines")
+    return problems
+
+
+def regressions(results: list, baseline: dict, tolerance: float) -> list:
+    """Find stages that are more than tolerance times slower per line than the baseline."""
+    problems = []
+    saved = {(row["shape"], row["lines"]): row for row in baseline["results"]}
+    for result in results:
+        row = saved.get((result["shape"], result["lines"]))
+        if row is None:
+            continue
+        for stage, seconds in result["seconds"].items():
+            before = row["seconds"].get(stage)
+            if not before or seconds < MIN_SECONDS:
+                continue
+            ratio = (seconds / result["actual_lines"]) / (before / row["actual_lines"])
+            if ratio > tolerance:
+                problems.append(f"{result['shape']}/{stage} at {result['lines']} lines: "
+                                f"{ratio:.2f}x slower per line than the baseline")
+    return problems
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--shapes", nargs="+", choices=sorted(GENERATORS), default=list(GENERATORS))
+    arg_parser.add_argument("--lines", type=int, nargs="+", default=DEFAULT_LINES)
+    arg_parser.add_argument("--repeat", type=int, default=1)
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL)
+    arg_parser.add_argument("--llvm-max-lines", type=int, default=10000,
+                            help="Skip generate/verify/jit/run above this size (default: %(default)s)")
+    arg_parser.add_argument("--output", help="Write the results as a JSON baseline to this file")
+    arg_parser.add_argument("--baseline", help="Compare against a JSON baseline written by --output")
+    arg_parser.add_argument("--tolerance", type=float, default=1.5,
+                            help="Allowed slowdown per line against the baseline (default: %(default)s)")
+    arg_parser.add_argument("--max-exponent", type=float, default=1.3,
+                            help="Largest acceptable growth exponent between sizes (default: %(default)s)")
+    args = arg_parser.parse_args()
+    
+    print(f"{'shape':>12} {'lines':>8} " + " ".join(f"{stage:>12}" for stage in STAGES))
+    results = []
+    for shape in args.shapes:
+        for lines in sorted(args.lines):
+            source = GENERATORS[shape](lines)
+            actual_lines = source.count('\n')
+            llvm = lines <= args.llvm_max_lines
+            seconds = best_of(source, args.opt_level, llvm, args.repeat)
+            del source
+            results.append({"shape": shape, "lines": lines, "actual_lines": actual_lines, "seconds": seconds})
+            
+            cells = (f"{seconds[stage]:>12.4f}" if stage in seconds else f"{'-':>12}" for stage in STAGES)
+            print(f"{shape:>12} {lines:>8} " + " ".join(cells), flush=True)
+    
+    report = {"environment": environment(args.opt_level), "results": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    
+    problems = scaling_problems(results, args.max_exponent)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline["environment"] != report["environment"]:
+            print("Note: baseline was recorded in a different environment")
+        problems += regressions(results, baseline, args.tolerance)
+    
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
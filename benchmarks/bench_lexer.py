@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Lexer throughput benchmark: the table-driven Lexer against the original
+character-at-a-time CharLexer on synthetic Xlang sources. Reports both
+Token-object output (tokenize) and columnar output (tokenize_buffer), the
+memory each representation takes, and the parse time from each, plus the
+throughput of parallel_lexer.tokenize_parallel with --jobs processes.
+
+Usage: python benchmarks/bench_lexer.py [--lines N ...] [--repeat R] [--jobs J]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lexer import Lexer
+from parallel_lexer import tokenize_parallel
+from parser import Parser
+from char_lexer import CharLexer
+
+
+BLOCK = '''// block {n}
+make counter_{n} = {n} * 3 + 7
+show "value of counter {n}:"
+show counter_{n}
+loop counter_{n} < {n} + 100:
+    if counter_{n} == 50:
+        show "half way"
+    else:
+        make counter_{n} = counter_{n} + 1 - 0 / 1
+    stop
+    make counter_{n} = counter_{n} + 1
+stop
+'''
+
+BLOCK_LINES = BLOCK.count('\n')
+
+
+def generate_source(lines: int) -> str:
+    return "".join(BLOCK.format(n=n) for n in range(max(1, lines // BLOCK_LINES)))
+
+
+def best_time(func, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def traced_size(func) -> int:
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def token_stream(tokens):
+    return [(token.type, token.value, token.line) for token in tokens]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Processes for the parallel lexer")
+    args = arg_parser.parse_args()
+    
+    print(f"{'lines':>9} {'MB':>7} {'tokens':>9} {'CharLexer MB/s':>15} {'Lexer MB/s':>11} "
+          f"{'buffer MB/s':>12} {'parallel MB/s':>14} {'list B/tok':>11} {'buffer B/tok':>13} {'parse list s':>13} {'parse buffer s':>15}")
+    for lines in args.lines:
+        source = generate_source(lines)
+        megabytes = len(source) / 1e6
+        
+        old_time, old_tokens = best_time(lambda: CharLexer(source).tokenize(), args.repeat)
+        new_time, new_tokens = best_time(lambda: Lexer(source).tokenize(), args.repeat)
+        buffer_time, buffer = best_time(lambda: Lexer(source).tokenize_buffer(), args.repeat)
+        # Small chunks, so even the smallest source is split between the processes.
+        chunk_size = len(source) // (4 * args.jobs) + 1
+        parallel_time, parallel = best_time(lambda: tokenize_parallel(source, args.jobs, chunk_size), args.repeat)
+        
+        if not (token_stream(old_tokens) == token_stream(new_tokens) == token_stream(buffer)
+                == token_stream(parallel)):
+            print(f"Token streams differ at {lines} lines")
+            return 1
+        
+        list_bytes = traced_size(lambda: Lexer(source).tokenize())
+        buffer_bytes = traced_size(lambda: Lexer(source).tokenize_buffer())
+        parse_list_time, _ = best_time(lambda: Parser(new_tokens).parse(), args.repeat)
+        parse_buffer_time, _ = best_time(lambda: Parser(buffer).parse(), args.repeat)
+        
+        count = len(buffer)
+        print(f"{source.count(chr(10)):>9} {megabytes:>7.2f} {count:>9} "
+              f"{megabytes / old_time:>15.2f} {megabytes / new_time:>11.2f} {megabytes / buffer_time:>12.2f} {megabytes / parallel_time:>14.2f} "
+              f"{list_bytes / count:>11.1f} {buffer_bytes / count:>13.1f} "
+              f"{parse_list_time:>13.3f} {parse_buffer_time:>15.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Generators for large synthetic Xlang programs.
+
+Every generator takes a target line count and returns source of roughly
+that many lines. All programs start from a seed variable that is assigned
+inside a loop, so the AST optimizer cannot fold them away, and they show
+what they compute, so dead-store elimination keeps it. Every loop runs a
+bounded number of times, so the programs can also be executed.
+"""
+
+SEED = '''make seed = 0
+loop seed < 1:
+    make seed = seed + 1
+stop
+'''
+
+SEED_LINES = SEED.count('\n')
+
+INDENT = "    "
+
+
+def statements_program(lines: int, width: int = 64) -> str:
+    """Flat straight-line code cycling through a small set of variables."""
+    out = [SEED]
+    out.extend(f"make v{n} = seed + {n}\n" for n in range(width))
+    for n in range(max(0, lines - SEED_LINES - width)):
+        kind = n % 3
+        if kind == 0:
+            out.append(f"make v{n % width} = v{(n + 1) % width} + seed * {n % 7}\n")
+        elif kind == 1:
+            out.append(f"show v{n % width}\n")
+        else:
+            out.append(f'show "line {n}"\n')
+    return "".join(out)
+
+
+def variables_program(lines: int) -> str:
+    """One new variable per line, each computed from the previous one."""
+    out = [SEED, "make var0 = seed\n"]
+    count = max(1, lines - SEED_LINES - 2)
+    for n in range(1, count):
+        out.append(f"make var{n} = var{n - 1} * 3 + seed - {n % 11}\n")
+    out.append(f"show var{count - 1}\n")
+    return "".join(out)
+
+
+def expressions_program(lines: int, terms: int = 64) -> str:
+    """Long arithmetic expressions, terms operands per line."""
+    ops = ("+", "-", "*", "+", "/")
+    out = [SEED, "make e = seed\n"]
+    for n in range(max(1, lines - SEED_LINES - 1)):
+        expression = ["e"]
+        for k in range(1, terms):
+            op = ops[(n + k) % len(ops)]
+            # Divisors stay non-zero constants so the programs never trap.
+            operand = str(k % 9 + 1) if op == "/" else ("seed" if k % 2 else str(k))
+            expression.append(f"{op} {operand}")
+        out.append(f"make e = {' '.join(expression)}\n")
+        if n % 16 == 15:
+            out.append("show e\n")
+    out.append("show e\n")
+    return "".join(out)
+
+
+def _nested_group(out: list, group: int, level: int, depth: int):
+    pad = INDENT * level
+    if level == depth:
+        out.append(f"{pad}show c{group}_{level - 1}\n")
+        return
+    counter = f"c{group}_{level}"
+    if level % 2 == 0:
+        out.append(f"{pad}make {counter} = 0\n")
+        out.append(f"{pad}loop {counter} < seed:\n")
+        _nested_group(out, group, level + 1, depth)
+        out.append(f"{pad}{INDENT}make {counter} = {counter} + 1\n")
+        out.append(f"{pad}stop\n")
+    else:
+        out.append(f"{pad}if seed == {level % 2}:\n")
+        out.append(f"{pad}{INDENT}make {counter} = seed + {level}\n")
+        _nested_group(out, group, level + 1, depth)
+        out.append(f"{pad}else:\n")
+        out.append(f'{pad}{INDENT}show "level {level}"\n')
+        out.append(f"{pad}stop\n")
+
+
+def nested_program(lines: int, depth: int = 32) -> str:
+    """Repeated groups of loops and ifs nested depth levels deep."""
+    out = [SEED]
+    group = 0
+    total = SEED_LINES
+    while total < lines:
+        start = len(out)
+        _nested_group(out, group, 0, depth)
+        total += len(out) - start
+        group += 1
+    return "".join(out)
+
+
+GENERATORS = {
+    "statements": statements_program,
+    "variables": variables_program,
+    "expressions": expressions_program,
+    "nested": nested_program,
+}
@@ -0,0 +1,71 @@
+"""
+Ahead-of-time compilation of Xlang programs to object files and native
+executables.
+
+The object file is emitted by the LLVM target machine and linked with the
+system C compiler ($CC, default "cc"), so the resulting executable needs
+neither Python nor llvmlite at run time.
+"""
+
+import os
+import subprocess
+import tempfile
+
+from codegen import CodeGenerator, DEFAULT_OPT_LEVEL, create_target_machine
+from pgo import BranchProfile
+from ide import parse_source
+
+
+def create_aot_target_machine(opt_level: int = DEFAULT_OPT_LEVEL):
+    # Position-independent code so the default (PIE) link just works.
+    return create_target_machine(opt_level, reloc='pic', codemodel='default')
+
+
+def link_executable(object_path: str, output: str, cc: str = None):
+    cc = cc or os.environ.get("CC", "cc")
+    result = subprocess.run([cc, object_path, "-o", output], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Linking with {cc} failed:\n{result.stderr.strip()}")
+
+
+def build(source_code: str, output: str, opt_level: int = DEFAULT_OPT_LEVEL,
+          object_only: bool = False, emit_llvm: bool = False, emit_asm: bool = False,
+          cc: str = None, branch_profile: BranchProfile = None) -> list:
+    """Compile source_code to an executable (or object file) at output.
+    
+    Returns the list of files written.
+    """
+    ast = parse_source(source_code, opt_level)
+    
+    codegen = CodeGenerator(opt_level=opt_level, branch_profile=branch_profile)
+    codegen.generate(ast)
+    
+    target_machine = create_aot_target_machine(opt_level)
+    obj = codegen.emit_object(target_machine)
+    
+    written = []
+    stem = os.path.splitext(output)[0] if object_only else output
+    
+    if emit_llvm:
+        with open(stem + ".ll", 'w') as f:
+            f.write(str(codegen.llvm_module))
+        written.append(stem + ".ll")
+    
+    if emit_asm:
+        with open(stem + ".s", 'w') as f:
+            f.write(codegen.emit_assembly(target_machine))
+        written.append(stem + ".s")
+    
+    if object_only:
+        with open(output, 'wb') as f:
+            f.write(obj)
+        written.append(output)
+        return written
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        object_path = os.path.join(tmp_dir, os.path.basename(output) + ".o")
+        with open(object_path, 'wb') as f:
+            f.write(obj)
+        link_executable(object_path, output, cc)
+    written.append(output)
+    return written
@@ -0,0 +1,242 @@
+"""
+Compiling many small programs as one JIT module.
+
+For a small program nearly all of the JIT's time is fixed per-module
+cost: emitting the output runtime, printing and re-parsing the IR,
+setting up the pass pipeline, code generation and MCJIT finalization. A
+Bundle generates each program as its own entry function in one module,
+sharing a single output runtime and identical string constants, and pays
+those costs once for all of them:
+
+    with compile_bundle(sources, opt_level=2) as bundle:
+        for i in range(len(bundle)):
+            output = OutputCapture()
+            exit_code = bundle.run(i, output)
+
+    results = run_bundle(sources)        # one BundleResult per source
+
+Every entry runs on its own, with its variables starting at 0, its own
+output and its own exit code. A program that does not compile is left out
+of the module: run(i) raises its error, and the others are unaffected.
+Some invalid programs are only caught when the module is printed or
+verified, which happens for the module as a whole; when that fails, each
+program is compiled on its own and the module is generated again without
+the ones that fail.
+Programs still share the process, so one that crashes (e.g. a fatal
+signal in native code) takes it down; untrusted code belongs in pool.py.
+
+The module stays loaded in the JIT until close().
+"""
+
+import time
+
+from codegen import CodeGenerator, DEFAULT_OPT_LEVEL, get_target_machine, load_module, run_entry, unload_module
+from perfmap import perf_mode, register_object
+from runtime import OutputCapture, fuel_symbol
+from stats import NULL_STATS
+from ide import compile_ast, parse_source
+
+
+# Programs per module in run_bundle. Larger modules no longer save much
+# time per program, and a module's code is only released as a whole.
+DEFAULT_BUNDLE_SIZE = 1000
+
+# Entry functions of all bundles are loaded into the same engine, so every
+# bundle gets its own name prefix.
+_bundle_count = 0
+
+
+class BundleResult:
+    __slots__ = ('index', 'exit_code', 'output', 'seconds', 'error')
+    
+    def __init__(self, index: int, exit_code: int = None, output: bytes = b"", seconds: float = 0.0,
+                 error: str = None):
+        self.index = index
+        self.exit_code = exit_code
+        self.output = output
+        self.seconds = seconds
+        self.error = error
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.exit_code == 0
+    
+    def __repr__(self):
+        return f"BundleResult({self.index}, exit_code={self.exit_code}, error={self.error!r})"
+
+
+class Bundle:
+    """Programs added with add() are compiled together by compile() and run one at a time by run()."""
+    
+    def __init__(self, opt_level: int = DEFAULT_OPT_LEVEL, fuel_metering: bool = False, stats=None):
+        global _bundle_count
+        self.prefix = f"xlang_bundle_{_bundle_count}"
+        _bundle_count += 1
+        self.opt_level = opt_level
+        self.fuel_metering = fuel_metering
+        self.stats = stats or NULL_STATS
+        # Per program: its source and entry name, or None and the exception it failed with.
+        self.sources = []
+        self.entry_names = []
+        self.errors = []
+        # The first generator; it owns the module the others generate into.
+        self.codegen = None
+        self.llvm_module = None
+        # (entry address, fuel address) per program once compiled.
+        self.addresses = None
+        self.sink_ptr = 0
+        self.closed = False
+    
+    def __len__(self):
+        return len(self.entry_names)
+    
+    def add(self, source_code: str) -> int:
+        """Generate a program into the module; returns its index."""
+        if self.addresses is not None:
+            raise RuntimeError("Programs cannot be added to a compiled Bundle")
+        index = len(self.sources)
+        self.sources.append(source_code)
+        self.entry_names.append(None)
+        self.errors.append(None)
+        self._generate(index)
+        return index
+    
+    def _generate(self, index: int):
+        entry_name = f"{self.prefix}_{index}"
+        codegen = None
+        try:
+            ast = parse_source(self.sources[index], self.opt_level, self.stats)
+            codegen = CodeGenerator(opt_level=self.opt_level, entry_name=entry_name, stats=self.stats,
+                                    fuel_metering=self.fuel_metering, shared=self.codegen)
+            codegen.generate(ast)
+        except Exception as e:
+            if codegen is not None:
+                # Drop the half-generated entry function; constants it added are unused and harmless.
+                codegen.module.globals.pop(entry_name, None)
+            self.errors[index] = e
+        else:
+            self.entry_names[index] = entry_name
+        if self.codegen is None:
+            self.codegen = codegen
+    
+    def _verify(self):
+        try:
+            return self.codegen.verify()
+        except Exception:
+            # Raised while printing or verifying the IR; the module as a whole tells us nothing more.
+            pass
+        # Find the programs the verifier rejects on their own, then generate the module again without them.
+        for index, entry_name in enumerate(self.entry_names):
+            if entry_name is not None:
+                try:
+                    compile_ast(parse_source(self.sources[index], self.opt_level), self.opt_level)
+                except Exception as e:
+                    self.errors[index] = e
+        self.codegen = None
+        self.entry_names = [None] * len(self.sources)
+        for index, error in enumerate(self.errors):
+            if error is None:
+                self._generate(index)
+        return self.codegen.verify() if any(self.entry_names) else None
+    
+    def compile(self):
+        """Verify, optimize and JIT-compile the module; later calls do nothing."""
+        if self.addresses is not None:
+            return
+        self.addresses = [(0, 0)] * len(self.entry_names)
+        if not any(self.entry_names):
+            return
+        
+        mod = self._verify()
+        if mod is None:
+            return
+        codegen = self.codegen
+        codegen.optimize(mod, get_target_machine(self.opt_level))
+        # Loaded until close(), which keeps the engine from being recycled meanwhile.
+        engine = load_module(mod, self.opt_level)
+        self.llvm_module = mod
+        objects = []
+        hooked = perf_mode() is not None
+        if hooked:
+            engine.set_object_cache(lambda module, obj: objects.append(obj))
+        try:
+            with self.stats.phase("emit"):
+                engine.finalize_object()
+                for index, entry_name in enumerate(self.entry_names):
+                    if entry_name is not None:
+                        fuel_ptr = engine.get_global_value_address(fuel_symbol(entry_name)) if self.fuel_metering else 0
+                        self.addresses[index] = (engine.get_function_address(entry_name), fuel_ptr)
+                self.sink_ptr = engine.get_global_value_address(codegen.runtime.sink.name)
+        finally:
+            if hooked:
+                engine.set_object_cache()
+        if objects:
+            register_object(objects[-1], codegen.entry_name, engine.get_function_address(codegen.entry_name))
+    
+    def run(self, index: int, output: OutputCapture = None, fuel: int = None) -> int:
+        """Run program index (compiling the bundle first if needed); returns its exit code.
+        
+        Output goes to fd 1, or into output if an OutputCapture is given.
+        fuel needs a bundle compiled with fuel_metering=True (see
+        CodeGenerator). A program that did not compile raises its error.
+        """
+        if self.closed:
+            raise RuntimeError("Bundle is closed")
+        self.compile()
+        error = self.errors[index]
+        if error is not None:
+            raise error
+        main_ptr, fuel_ptr = self.addresses[index]
+        return run_entry(main_ptr, self.sink_ptr, output, fuel_ptr, fuel)
+    
+    def run_all(self, fuel: int = None) -> list:
+        """Run every program with its output captured; returns one BundleResult each, never raising."""
+        self.compile()
+        results = []
+        for index in range(len(self.entry_names)):
+            output = OutputCapture()
+            start = time.perf_counter()
+            try:
+                exit_code = self.run(index, output, fuel)
+            except Exception as e:
+                results.append(BundleResult(index, output=output.getvalue(), seconds=time.perf_counter() - start,
+                                            error=f"{type(e).__name__}: {e}"))
+                continue
+            results.append(BundleResult(index, exit_code, output.getvalue(), time.perf_counter() - start))
+        return results
+    
+    def close(self):
+        """Unload the module from the JIT."""
+        if self.llvm_module is not None:
+            unload_module(self.llvm_module, self.opt_level)
+            self.llvm_module = None
+        self.closed = True
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compile_bundle(sources, opt_level: int = DEFAULT_OPT_LEVEL, fuel_metering: bool = False,
+                   stats=None) -> Bundle:
+    """Compile sources (an iterable of program texts) into one Bundle; program i is bundle.run(i)."""
+    bundle = Bundle(opt_level, fuel_metering, stats)
+    for source_code in sources:
+        bundle.add(source_code)
+    bundle.compile()
+    return bundle
+
+
+def run_bundle(sources, opt_level: int = DEFAULT_OPT_LEVEL, fuel: int = None,
+               bundle_size: int = DEFAULT_BUNDLE_SIZE) -> list:
+    """Compile and run sources bundle_size at a time; returns one BundleResult per source, in order."""
+    sources = list(sources)
+    results = []
+    for start in range(0, len(sources), bundle_size):
+        with compile_bundle(sources[start:start + bundle_size], opt_level, fuel is not None) as bundle:
+            for result in bundle.run_all(fuel):
+                result.index += start
+                results.append(result)
+    return results
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import tempfile
+
+from config import DEFAULT_OPT_LEVEL
+from runtime import OutputCapture
+from pgo import BranchProfile
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "xlang")
+
+
+class ObjectCache:
+    """Content-addressed on-disk store of compiled object code."""
+    
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.environ.get("XLANG_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self._target_id = None
+    
+    def key(self, source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, variant: str = "") -> str:
+        """variant names any other input that changes the code, e.g. a PGO profile digest."""
+        if self._target_id is None:
+            # Importing codegen loads LLVM, so it waits until a key is actually needed.
+            from codegen import host_target_id
+            self._target_id = host_target_id()
+        digest = hashlib.sha256()
+        digest.update(f"{self._target_id}|O{opt_level}|{variant}\0".encode('utf-8'))
+        digest.update(source_code.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def interpreted_key(self, source_code: str, opt_level: int = DEFAULT_OPT_LEVEL) -> str:
+        """Key of the marker for a program the auto backend interpreted; computed without loading LLVM."""
+        digest = hashlib.sha256()
+        digest.update(f"interp|O{opt_level}\0".encode('utf-8'))
+        digest.update(source_code.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def path(self, key: str, suffix: str = ".o") -> str:
+        return os.path.join(self.directory, key[:2], key + suffix)
+    
+    def load(self, key: str):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def store(self, key: str, obj: bytes, suffix: str = ".o"):
+        path = self.path(key, suffix)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial object.
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(obj)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+    
+    # The auto backend runs small programs on the interpreter, so they never
+    # get an object. An empty marker remembers that, letting later runs skip
+    # the object lookup, which needs LLVM for its key. It is only a hint:
+    # the program still goes through backend selection.
+    def was_interpreted(self, source_code: str, opt_level: int = DEFAULT_OPT_LEVEL) -> bool:
+        return os.path.exists(self.path(self.interpreted_key(source_code, opt_level), ".interp"))
+    
+    def mark_interpreted(self, source_code: str, opt_level: int = DEFAULT_OPT_LEVEL):
+        self.store(self.interpreted_key(source_code, opt_level), b"", ".interp")
+
+
+def compile_to_object(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, entry_name: str = "main",
+                      branch_profile: BranchProfile = None, fuel_metering: bool = False, ast=None) -> bytes:
+    """Compile a program to object code; ast, if given, is its already parsed and optimized AST."""
+    from codegen import CodeGenerator
+    from ide import parse_source
+    
+    if ast is None:
+        ast = parse_source(source_code, opt_level)
+    
+    codegen = CodeGenerator(opt_level=opt_level, entry_name=entry_name, branch_profile=branch_profile,
+                            fuel_metering=fuel_metering)
+    codegen.generate(ast)
+    return codegen.emit_object()
+
+
+def object_key(cache: ObjectCache, source_code: str, opt_level: int = DEFAULT_OPT_LEVEL,
+               branch_profile: BranchProfile = None, fuel_metering: bool = False) -> str:
+    variant = branch_profile.digest() if branch_profile is not None else ""
+    if fuel_metering:
+        variant += "|fuel"
+    return cache.key(source_code, opt_level, variant)
+
+
+def entry_name_for(key: str) -> str:
+    # Entry points get a key-derived name so objects loaded into the shared
+    # engine never clash with each other.
+    return f"xlang_{key[:16]}"
+
+
+def run_cached(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, cache: ObjectCache = None,
+               output: OutputCapture = None, branch_profile: BranchProfile = None, fuel: int = None,
+               ast=None):
+    """Run a program from its cached object, compiling and storing it first if needed.
+    
+    With fuel, the program is compiled with fuel metering (cached apart
+    from the unmetered build) and its loops get that budget. ast saves
+    parsing the source again when the caller already has it.
+    """
+    from codegen import run_object
+    
+    if cache is None:
+        cache = ObjectCache()
+    
+    key = object_key(cache, source_code, opt_level, branch_profile, fuel is not None)
+    entry_name = entry_name_for(key)
+    
+    obj = cache.load(key)
+    if obj is None:
+        obj = compile_to_object(source_code, opt_level, entry_name, branch_profile, fuel is not None, ast)
+        cache.store(key, obj)
+    
+    return run_object(obj, entry_name, opt_level, output, fuel)
+
+
+def run_if_cached(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, cache: ObjectCache = None,
+                  output: OutputCapture = None):
+    """Run a program from its cached object without touching the front end; None if it has none."""
+    from codegen import run_object
+    
+    if cache is None:
+        cache = ObjectCache()
+    
+    key = object_key(cache, source_code, opt_level)
+    obj = cache.load(key)
+    if obj is None:
+        return None
+    return run_object(obj, entry_name_for(key), opt_level, output)
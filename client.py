@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Thin client for the Xlang server (see server.py).
+
+Sends each file to a running 'ide.py serve' daemon and prints the
+program's output, so a run costs a socket round trip instead of starting
+LLVM. Only the standard library and config.py are imported here, to keep
+start-up short.
+
+Protocol: every message is one line of JSON, optionally followed by a raw
+byte payload whose length the JSON gives as "payload_length". A request
+is {"path": ...} or {"source": ...} plus optional "opt_level" and
+"backend"; the response is {"exit_code", "error", "timings"} with the
+program's output as payload.
+
+Usage: python client.py [--socket PATH] [-O N] [--backend B] [--timings] FILE...
+       python client.py - < program.xl
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+from config import OPT_LEVELS, BACKENDS
+
+SOCKET_ENV = "XLANG_SOCKET"
+
+
+def default_socket_path() -> str:
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "xlang.sock")
+    return f"/tmp/xlang-{os.getuid()}.sock"
+
+
+def encode_message(message: dict, payload: bytes = b"") -> bytes:
+    if payload:
+        message = dict(message, payload_length=len(payload))
+    return json.dumps(message).encode('utf-8') + b"\n" + bytes(payload)
+
+
+def decode_header(line: bytes):
+    """Parse a message's JSON line; returns (message dict, payload length)."""
+    message = json.loads(line)
+    return message, message.pop("payload_length", 0)
+
+
+def send_message(sock_file, message: dict, payload: bytes = b""):
+    sock_file.write(encode_message(message, payload))
+    sock_file.flush()
+
+
+def recv_message(sock_file):
+    """Read one message; returns (message dict, payload bytes), or (None, b"") at end of stream."""
+    line = sock_file.readline()
+    if not line:
+        return None, b""
+    message, length = decode_header(line)
+    payload = sock_file.read(length) if length else b""
+    if len(payload) != length:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return message, payload
+
+
+class Client:
+    """One connection to the server; run() can be called any number of times."""
+    
+    def __init__(self, socket_path: str = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+        self.file = self.sock.makefile('rwb')
+    
+    def run(self, source: str = None, path: str = None, opt_level: int = None, backend: str = None):
+        """Run a program given as source or as a path the server can read; returns (response, output)."""
+        request = {"source": source} if path is None else {"path": os.path.abspath(path)}
+        if opt_level is not None:
+            request["opt_level"] = opt_level
+        if backend is not None:
+            request["backend"] = backend
+        send_message(self.file, request)
+        response, output = recv_message(self.file)
+        if response is None:
+            # The server runs each connection in its own process, which a crashing program takes down.
+            raise ConnectionError("The server closed the connection (the program may have crashed)")
+        return response, output
+    
+    def close(self):
+        self.file.close()
+        self.sock.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def format_timings(timings: dict) -> str:
+    parts = [f"{name}={seconds * 1000:.2f}ms" for name, seconds in timings["phases"]]
+    parts.append(f"server={timings['total_seconds'] * 1000:.2f}ms")
+    return f"[{' '.join(parts)}]"
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Run Xlang programs on a running 'ide.py serve' daemon")
+    arg_parser.add_argument("files", nargs="+", help="Xlang source files ('-' reads the program from stdin)")
+    arg_parser.add_argument("--socket", help=f"Server socket (default: ${SOCKET_ENV} or {default_socket_path()})")
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS,
+                            help="LLVM optimization level (default: the server's)")
+    arg_parser.add_argument("--backend", choices=BACKENDS, help="Execution backend (default: the server's)")
+    arg_parser.add_argument("--timings", action="store_true", help="Print the server-side phase timings to stderr")
+    args = arg_parser.parse_args(argv)
+    
+    try:
+        client = Client(args.socket)
+    except OSError as e:
+        print(f"Cannot reach the Xlang server at {args.socket or default_socket_path()}: {e.strerror}", file=sys.stderr)
+        print("Start one with: python ide.py serve", file=sys.stderr)
+        return 1
+    
+    status = 0
+    with client:
+        for name in args.files:
+            try:
+                if name == "-":
+                    response, output = client.run(source=sys.stdin.read(), opt_level=args.opt_level, backend=args.backend)
+                else:
+                    response, output = client.run(path=name, opt_level=args.opt_level, backend=args.backend)
+            except ConnectionError as e:
+                print(f"{name}: {e}", file=sys.stderr)
+                return 1
+            
+            sys.stdout.buffer.write(output)
+            sys.stdout.flush()
+            if response["error"]:
+                print(f"{name}: Error: {response['error']}", file=sys.stderr)
+                status = 1
+            elif response["exit_code"] != 0:
+                status = response["exit_code"]
+            if args.timings:
+                print(f"{name}: {format_timings(response['timings'])}", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,98 +1,637 @@
+import ctypes
+import os
+import sys
+
+import llvmlite
 from llvmlite import ir, binding
 from parser import (
-    ProgramNode, MakeNode, ShowNode, LoopNode, IfNode,
+    ASTNode, ProgramNode, MakeNode, ShowNode, LoopNode, IfNode,
     NumberNode, StringNode, IdentifierNode, BinaryOpNode
 )
+from stats import NULL_STATS
+from config import OPT_LEVELS, DEFAULT_OPT_LEVEL
+from outputgen import OutputRuntime
+from optimizer import INT64_MIN, check_types, iter_children
+from perfmap import perf_mode, register_object
+from runtime import (
+    OutputCapture, VariableStorage, BlockProfile, OUT_OF_FUEL_EXIT_CODE, DIVISION_ERROR_EXIT_CODE, UNLIMITED_FUEL,
+    output_symbol, profile_symbol, fuel_symbol, set_output_sink, set_fuel
+)
+
+
+COMPILER_VERSION = "0.5.0"
+
+BINARY_OPS = {
+    '+': lambda builder, left, right: builder.add(left, right, name="addtmp"),
+    '-': lambda builder, left, right: builder.sub(left, right, name="subtmp"),
+    '*': lambda builder, left, right: builder.mul(left, right, name="multmp"),
+    '/': lambda builder, left, right: builder.sdiv(left, right, name="divtmp"),
+    '<': lambda builder, left, right: builder.icmp_signed('<', left, right, name="cmptmp"),
+    '==': lambda builder, left, right: builder.icmp_signed('==', left, right, name="eqtmp"),
+}
+
+
+_llvm_initialized = False
+
+
+def initialize_llvm():
+    """Set up the host target on first use; code is only ever generated for the host."""
+    global _llvm_initialized
+    if not _llvm_initialized:
+        binding.initialize_native_target()
+        binding.initialize_native_asmprinter()
+        _llvm_initialized = True
+
+
+def create_target_machine(opt_level: int = DEFAULT_OPT_LEVEL, reloc: str = 'default',
+                          codemodel: str = 'jitdefault'):
+    initialize_llvm()
+    target = binding.Target.from_default_triple()
+    return target.create_target_machine(
+        cpu=binding.get_host_cpu_name(),
+        features=binding.get_host_cpu_features().flatten(),
+        opt=opt_level,
+        reloc=reloc,
+        codemodel=codemodel,
+    )
+
+
+# One target machine and one MCJIT engine per optimization level, shared by
+# every CodeGenerator in the process. Modules are added to the engine for a
+# run (load_module) and removed again afterwards (unload_module).
+_target_machines = {}
+_engines = {}
+
+# MCJIT never frees the code of a module removed from its engine, so a
+# long-lived process (the REPL, a server connection, a pool worker) would
+# keep every program it ran, about 80 KB each. An engine that has loaded
+# this many modules and objects is replaced by a fresh one as soon as no
+# module is loaded in it; entry points loaded from object code are then
+# loaded again on their next run. Replacing one takes about 6 ms.
+#
+# Running llvmlite's optimization pipeline (-O1 and up) also keeps about
+# 80 KB per module that nothing here can free, even with the pass builder
+# closed. That is what ExecutionPool's max_runs bounds for its workers;
+# the server forks per connection, and a REPL session grows by that much
+# per entry.
+ENGINE_RECYCLE_LOADS = 200
+
+# Per optimization level: modules and objects added to its engine, and
+# modules added but not removed yet.
+_engine_loads = {}
+_engine_modules = {}
+
+
+def get_target_machine(opt_level: int = DEFAULT_OPT_LEVEL):
+    target_machine = _target_machines.get(opt_level)
+    if target_machine is None:
+        target_machine = _target_machines[opt_level] = create_target_machine(opt_level)
+    return target_machine
+
+
+def get_engine(opt_level: int = DEFAULT_OPT_LEVEL):
+    engine = _engines.get(opt_level)
+    if engine is not None and _engine_loads[opt_level] >= ENGINE_RECYCLE_LOADS and not _engine_modules[opt_level]:
+        engine.close()
+        for key in [key for key in _loaded_objects if key[0] == opt_level]:
+            del _loaded_objects[key]
+        engine = None
+    if engine is None:
+        # The engine takes ownership of its target machine, so it gets its own.
+        engine = binding.create_mcjit_compiler(binding.parse_assembly(""),
+                                               create_target_machine(opt_level))
+        _engines[opt_level] = engine
+        _engine_loads[opt_level] = 0
+        _engine_modules[opt_level] = 0
+    return engine
+
+
+def load_module(mod, opt_level: int = DEFAULT_OPT_LEVEL):
+    """Add mod to the shared engine and return the engine; every call needs an unload_module."""
+    engine = get_engine(opt_level)
+    engine.add_module(mod)
+    _engine_loads[opt_level] += 1
+    _engine_modules[opt_level] += 1
+    return engine
+
+
+def unload_module(mod, opt_level: int = DEFAULT_OPT_LEVEL):
+    _engines[opt_level].remove_module(mod)
+    _engine_modules[opt_level] -= 1
+
+
+def host_target_id() -> str:
+    """Identify everything about the host that affects emitted machine code."""
+    return "|".join((
+        COMPILER_VERSION,
+        llvmlite.__version__,
+        ".".join(map(str, binding.llvm_version_info)),
+        binding.get_default_triple(),
+        binding.get_host_cpu_name(),
+        binding.get_host_cpu_features().flatten(),
+    ))
+
+
+# Addresses of entry points loaded from object code, keyed by (opt level,
+# entry name). MCJIT cannot unload object files, so each one is loaded at
+# most once per engine.
+_loaded_objects = {}
+
+
+def run_entry(main_ptr: int, sink_ptr: int, output: OutputCapture = None, fuel_ptr: int = 0,
+              fuel: int = None):
+    """Call a loaded entry function, sending its output to output or fd 1.
+    
+    fuel is the loop budget of a fuel-metered entry (fuel_ptr is its
+    <entry>.fuel global, 0 if it has none); None means unlimited.
+    """
+    if fuel_ptr:
+        set_fuel(fuel_ptr, fuel)
+    elif fuel is not None:
+        raise ValueError("Fuel needs code compiled with fuel_metering=True")
+    if output is None:
+        # The program writes to fd 1 directly; keep it in order with Python's own output.
+        sys.stdout.flush()
+    set_output_sink(sink_ptr, output)
+    try:
+        main_func = ctypes.CFUNCTYPE(ctypes.c_int)(main_ptr)
+        return main_func()
+    finally:
+        set_output_sink(sink_ptr, None)
 
 
-binding.initialize_all_targets()
-binding.initialize_all_asmprinters()
+def run_object(obj: bytes, entry_name: str, opt_level: int = DEFAULT_OPT_LEVEL,
+               output: OutputCapture = None, fuel: int = None):
+    addresses = _loaded_objects.get((opt_level, entry_name))
+    if addresses is None:
+        engine = get_engine(opt_level)
+        engine.add_object_file(binding.ObjectFileRef.from_data(obj))
+        _engine_loads[opt_level] += 1
+        addresses = _loaded_objects[(opt_level, entry_name)] = (
+            engine.get_function_address(entry_name),
+            engine.get_global_value_address(output_symbol(entry_name)),
+            engine.get_global_value_address(fuel_symbol(entry_name)),
+        )
+        register_object(obj, entry_name, addresses[0])
+    main_ptr, sink_ptr, fuel_ptr = addresses
+    return run_entry(main_ptr, sink_ptr, output, fuel_ptr, fuel)
+
+
+def _names_in(node) -> set:
+    """Every variable read or made anywhere inside node."""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        node_type = type(node)
+        if node_type is IdentifierNode or node_type is MakeNode:
+            names.add(node.name)
+        stack.extend(iter_children(node))
+    return names
 
 
 class CodeGenerator:
-    def __init__(self):
-        self.module = ir.Module(name="xlang_module")
-        self.module.triple = binding.get_default_triple()
+    """Generates an LLVM module whose entry function runs the program.
+    
+    Variables normally live in entry-block allocas that start at 0, unless
+    a make always runs before any read of them. With a VariableStorage
+    they live in its cells instead, so their values carry over between
+    separately compiled modules (see session.py).
+    
+    Code generation never recurses on the AST: nested statements and the
+    rest of their enclosing loop or if wait on the self.pending work stack,
+    and expressions are evaluated from an explicit operand stack, so any
+    expression length and nesting depth can be compiled.
+    
+    With stats (a stats.CompileStats), the codegen, verify, optimize, emit
+    and run phases are timed and the IR is counted before and after LLVM
+    optimization.
+    
+    With profile=True every basic block increments its own i64 counter on
+    entry, and compile_and_run leaves a BlockProfile in self.block_profile
+    that maps the counts back to source lines. A branch_profile (a
+    pgo.BranchProfile recorded from such a run) adds branch weights to the
+    loop and if conditions it has counts for.
+    
+    With fuel_metering=True every loop back-edge decrements a fuel counter,
+    loaded at entry from the exported <entry>.fuel global, and the program
+    stops with exit code OUT_OF_FUEL_EXIT_CODE (after flushing its output)
+    when a back-edge finds it empty. That costs a decrement and a branch
+    that is predicted not taken per iteration; the budget is passed to
+    compile_and_run, or run_object for cached code.
+    
+    A division whose divisor is not a constant other than 0 and -1 is
+    checked first: dividing by zero, or INT64_MIN by -1, flushes the output
+    and returns DIVISION_ERROR_EXIT_CODE, like the interpreter, instead of
+    leaving it to the undefined behavior of sdiv.
+    
+    With debug_info=True the module carries DWARF line info: every
+    statement's instructions are attributed to its line in source_path,
+    for debuggers and for perf (see perfmap.py).
+    
+    With shared (another CodeGenerator), the entry function goes into
+    shared's module instead of a new one and reuses its output runtime and
+    string constants, so many programs can be compiled as one module
+    (see bundle.py). entry_name must then be unique within the module.
+    """
+    
+    def __init__(self, opt_level: int = DEFAULT_OPT_LEVEL, entry_name: str = "main",
+                 storage: VariableStorage = None, stats=None, profile: bool = False,
+                 branch_profile=None, fuel_metering: bool = False, debug_info: bool = False,
+                 source_path: str = None, shared: 'CodeGenerator' = None):
+        if opt_level not in OPT_LEVELS:
+            raise ValueError(f"Invalid optimization level: {opt_level}")
+        
+        if shared is not None and profile:
+            raise ValueError("Block profiling needs a module of its own")
+        
+        if shared is None:
+            self.module = ir.Module(name="xlang_module")
+            self.module.triple = binding.get_default_triple()
+            # Interned string constants, keyed by their text.
+            self.string_pool = {}
+        else:
+            self.module = shared.module
+            self.string_pool = shared.string_pool
+        self.opt_level = opt_level
+        self.entry_name = entry_name
+        self.storage = storage
+        self.stats = stats or NULL_STATS
+        self.profile = profile
+        # Profiling state: one counter global per block, (block name, line)
+        # for each, and (line, counter index) for every statement.
+        self.counter_globals = []
+        self.counter_blocks = []
+        self.statement_counters = []
+        self.current_counter = None
+        self.block_lines = {}
+        self.block_profile = None
+        # (kind, line, occurrence, taken counter, not-taken counter) per branch.
+        self.branch_counters = []
+        self.branch_profile = branch_profile
+        self.branch_occurrences = {}
+        self.fuel_metering = fuel_metering
+        self.fuel_ptr = None
+        self.out_of_fuel_block = None
+        self.division_error_block = None
+        self.debug_info = debug_info
+        self.source_path = source_path
+        self.debug_scope = None
+        # DILocation per line, so each is emitted once.
+        self.debug_locations = {}
         
         self.builder = None
         self.func = None
         self.variables = {}
-        self.string_counter = 0
-        self.collected_vars = set()
+        # Ordered set (dict keys) so allocas come out in a stable order.
+        self.collected_vars = {}
+        # Variables read before any make was seen; only used by generate_stream.
+        self.forward_refs = None
+        # Variables every read of which runs after a make (see
+        # _find_assigned_first), so they need no initial 0.
+        self.assigned_first = set()
+        # Statements still to generate and continuations (callables) that
+        # finish a loop or if once its body is done; the next one is last.
+        self.pending = []
+        self.llvm_module = None
+        self.optimized = False
         
         self.int_type = ir.IntType(64)
         self.bool_type = ir.IntType(1)
         self.char_ptr_type = ir.IntType(8).as_pointer()
         self.void_type = ir.VoidType()
         
-        self._declare_printf()
-    
-    def _declare_printf(self):
-        printf_type = ir.FunctionType(ir.IntType(32), [self.char_ptr_type], var_arg=True)
-        self.printf = ir.Function(self.module, printf_type, name="printf")
+        # Dispatch tables keyed by exact node type.
+        self._collectors = {
+            MakeNode: self._collect_make,
+            LoopNode: self._collect_loop,
+            IfNode: self._collect_if,
+            ProgramNode: self._collect_program,
+        }
+        self._statement_generators = {
+            MakeNode: self._generate_make,
+            ShowNode: self._generate_show,
+            LoopNode: self._generate_loop,
+            IfNode: self._generate_if,
+        }
+        # Operands only: binary operations are handled by _generate_expression itself.
+        self._expression_generators = {
+            NumberNode: self._generate_number,
+            IdentifierNode: self._generate_identifier,
+            StringNode: self._generate_string,
+        }
+        
+        self.runtime = OutputRuntime(self.module, entry_name) if shared is None else shared.runtime
     
     def _create_global_string(self, string: str) -> ir.GlobalVariable:
-        string_bytes = (string + '\0').encode('utf-8')
+        global_str = self.string_pool.get(string)
+        if global_str is not None:
+            return global_str
+        
+        # Lengths are passed explicitly, so no NUL terminator is needed.
+        string_bytes = string.encode('utf-8')
         string_type = ir.ArrayType(ir.IntType(8), len(string_bytes))
         
-        global_str = ir.GlobalVariable(self.module, string_type, name=f".str.{self.string_counter}")
+        global_str = ir.GlobalVariable(self.module, string_type, name=f".str.{len(self.string_pool)}")
         global_str.global_constant = True
         global_str.linkage = 'private'
         global_str.initializer = ir.Constant(string_type, bytearray(string_bytes))
         
-        self.string_counter += 1
+        self.string_pool[string] = global_str
         return global_str
     
     def _get_string_ptr(self, global_str: ir.GlobalVariable):
         zero = ir.Constant(ir.IntType(32), 0)
         return self.builder.gep(global_str, [zero, zero], inbounds=True)
     
+    def _declare_variable(self, name: str):
+        if self.storage is not None:
+            address = ir.Constant(self.int_type, self.storage.address(name))
+            ptr = self.variables[name] = address.inttoptr(self.int_type.as_pointer())
+            return ptr
+        
+        ptr = self.alloca_builder.alloca(self.int_type, name=name)
+        # The store of 0 keeps the variable live from the entry block on, and
+        # SROA then gets quadratic in the number of variables: skip it where
+        # a make always comes first.
+        if name not in self.assigned_first:
+            self.alloca_builder.store(ir.Constant(self.int_type, 0), ptr)
+        self.variables[name] = ptr
+        return ptr
+    
+    def _find_assigned_first(self, statements) -> set:
+        """Names whose first appearance is a make that does not read them, with every later one in that make's block.
+        
+        Each run of the block starts with that make, so no read ever sees
+        the variable uninitialized.
+        """
+        # Per name, the id() of the block of its first make, or None once it may be read first.
+        first_blocks = {}
+        path = []
+        active = set()
+        
+        def see(name, block_id=None):
+            if name not in first_blocks:
+                first_blocks[name] = block_id
+            elif first_blocks[name] not in active:
+                first_blocks[name] = None
+        
+        # Lists are blocks to enter; ints are the ids of blocks to leave.
+        stack = [statements]
+        while stack:
+            item = stack.pop()
+            item_type = type(item)
+            if item_type is list:
+                path.append(id(item))
+                active.add(id(item))
+                stack.append(id(item))
+                stack.extend(reversed(item))
+            elif item_type is int:
+                active.discard(path.pop())
+            elif item_type is MakeNode:
+                names = _names_in(item.value)
+                for name in names:
+                    see(name)
+                see(item.name, None if item.name in names else path[-1])
+            elif item_type is ShowNode:
+                for name in _names_in(item.value):
+                    see(name)
+            elif item_type is LoopNode:
+                for name in _names_in(item.condition):
+                    see(name)
+                stack.append(item.body)
+            elif item_type is IfNode:
+                for name in _names_in(item.condition):
+                    see(name)
+                stack.append(item.else_body)
+                stack.append(item.then_body)
+        return {name for name, block_id in first_blocks.items() if block_id is not None}
+    
     def _collect_variables(self, node):
-        if isinstance(node, MakeNode):
-            self.collected_vars.add(node.name)
-        elif isinstance(node, LoopNode):
-            for stmt in node.body:
-                self._collect_variables(stmt)
-        elif isinstance(node, IfNode):
-            for stmt in node.then_body:
-                self._collect_variables(stmt)
-            for stmt in node.else_body:
-                self._collect_variables(stmt)
-        elif isinstance(node, ProgramNode):
-            for stmt in node.statements:
-                self._collect_variables(stmt)
+        # Depth-first in source order, so allocas come out as if each block were walked recursively.
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            collector = self._collectors.get(type(node))
+            if collector is not None:
+                children = collector(node)
+                if children:
+                    stack.extend(reversed(children))
     
-    def generate(self, ast: ProgramNode):
+    def _collect_make(self, node: MakeNode):
+        if node.name not in self.collected_vars:
+            self.collected_vars[node.name] = None
+            if node.name not in self.variables:
+                self._declare_variable(node.name)
+    
+    def _collect_loop(self, node: LoopNode):
+        return node.body
+    
+    def _collect_if(self, node: IfNode):
+        return node.then_body + node.else_body
+    
+    def _collect_program(self, node: ProgramNode):
+        return node.statements
+    
+    def _begin_main(self):
         func_type = ir.FunctionType(ir.IntType(32), [])
-        self.func = ir.Function(self.module, func_type, name="main")
+        self.func = ir.Function(self.module, func_type, name=self.entry_name)
         
-        entry_block = self.func.append_basic_block(name="entry")
+        entry_block = self._append_block("entry", None)
         self.builder = ir.IRBuilder(entry_block)
+        self.alloca_builder = self.builder
+        if self.debug_info:
+            self._begin_debug_info()
+        if self.fuel_metering:
+            self._begin_fuel()
+        if self.profile:
+            self._count_block(entry_block)
+    
+    def _begin_debug_info(self):
+        module = self.module
+        path = os.path.abspath(self.source_path) if self.source_path else "<xlang>"
+        di_file = module.add_debug_info("DIFile", {
+            "filename": os.path.basename(path),
+            "directory": os.path.dirname(path),
+        })
+        # DWARF has no language code for Xlang; C is the closest in what debuggers expect.
+        compile_unit = module.add_debug_info("DICompileUnit", {
+            "language": ir.DIToken("DW_LANG_C"),
+            "file": di_file,
+            "producer": f"xlang {COMPILER_VERSION}",
+            "runtimeVersion": 0,
+            "isOptimized": self.opt_level > 0,
+            "emissionKind": ir.DIToken("FullDebug"),
+        }, is_distinct=True)
+        int_type = module.add_debug_info("DIBasicType", {
+            "name": "int",
+            "size": 32,
+            "encoding": ir.DIToken("DW_ATE_signed"),
+        })
+        function_type = module.add_debug_info("DISubroutineType", {"types": module.add_metadata([int_type])})
+        self.debug_scope = module.add_debug_info("DISubprogram", {
+            "name": self.entry_name,
+            "file": di_file,
+            "line": 1,
+            "type": function_type,
+            "isLocal": False,
+            "isDefinition": True,
+            "scopeLine": 1,
+            "isOptimized": self.opt_level > 0,
+            "unit": compile_unit,
+        }, is_distinct=True)
+        self.func.set_metadata("dbg", self.debug_scope)
         
-        self._collect_variables(ast)
-        
-        for var_name in self.collected_vars:
-            ptr = self.builder.alloca(self.int_type, name=var_name)
-            self.builder.store(ir.Constant(self.int_type, 0), ptr)
-            self.variables[var_name] = ptr
-        
-        for statement in ast.statements:
-            self._generate_statement(statement)
+        module.add_named_metadata("llvm.dbg.cu", compile_unit)
+        if "llvm.module.flags" not in module.namedmetadata:
+            i32 = ir.IntType(32)
+            # Version 4 line tables are the ones perfmap reads (behavior 2: warn on mismatch).
+            module.add_named_metadata("llvm.module.flags", [i32(2), "Dwarf Version", i32(4)])
+            module.add_named_metadata("llvm.module.flags", [i32(2), "Debug Info Version", i32(3)])
+        # Set-up code before the first statement belongs to no line.
+        self._set_line(0)
+    
+    def _set_line(self, line: int):
+        """Attribute the instructions built from now on to source line line."""
+        location = self.debug_locations.get(line)
+        if location is None:
+            location = self.debug_locations[line] = self.module.add_debug_info("DILocation", {
+                "line": line,
+                "column": 0,
+                "scope": self.debug_scope,
+            })
+        self.builder.debug_metadata = location
+    
+    def _begin_fuel(self):
+        budget = ir.GlobalVariable(self.module, self.int_type, name=fuel_symbol(self.entry_name))
+        budget.initializer = ir.Constant(self.int_type, UNLIMITED_FUEL)
+        # A local copy, so optimization can keep the counter in a register.
+        self.fuel_ptr = self.builder.alloca(self.int_type, name="fuel")
+        self.builder.store(self.builder.load(budget, name="fuel.budget"), self.fuel_ptr)
         
+        self.out_of_fuel_block = self.func.append_basic_block(name="out_of_fuel")
+        builder = ir.IRBuilder(self.out_of_fuel_block)
+        builder.call(self.runtime.flush, [])
+        builder.ret(ir.Constant(ir.IntType(32), OUT_OF_FUEL_EXIT_CODE))
+    
+    def _branch_with_fuel(self, target):
+        fuel = self.builder.sub(self.builder.load(self.fuel_ptr), ir.Constant(self.int_type, 1), name="fuel")
+        self.builder.store(fuel, self.fuel_ptr)
+        empty = self.builder.icmp_signed('<', fuel, ir.Constant(self.int_type, 0), name="fuel.empty")
+        branch = self.builder.cbranch(empty, self.out_of_fuel_block, target)
+        branch.set_weights([1, 2000])
+    
+    def _finish_main(self):
         if not self.builder.block.is_terminated:
+            if self.debug_info:
+                self._set_line(0)
+            self.builder.call(self.runtime.flush, [])
             self.builder.ret(ir.Constant(ir.IntType(32), 0))
         
+        if self.profile:
+            # Exported table of counter addresses, read back by BlockProfile.
+            table_type = ir.ArrayType(self.int_type.as_pointer(), len(self.counter_globals))
+            table = ir.GlobalVariable(self.module, table_type, name=profile_symbol(self.entry_name))
+            table.global_constant = True
+            table.initializer = ir.Constant(table_type, self.counter_globals)
+        
         return self.module
     
+    def _append_block(self, name: str, line: int):
+        block = self.func.append_basic_block(name=name)
+        self.block_lines[block] = (name, line)
+        return block
+    
+    def _enter_block(self, block):
+        self.builder.position_at_end(block)
+        if self.profile:
+            self._count_block(block)
+    
+    def _count_block(self, block):
+        index = len(self.counter_globals)
+        counter = ir.GlobalVariable(self.module, self.int_type, name=f".prof.{index}")
+        counter.linkage = 'internal'
+        counter.initializer = ir.Constant(self.int_type, 0)
+        self.counter_globals.append(counter)
+        self.counter_blocks.append(self.block_lines[block])
+        self.current_counter = index
+        
+        count = self.builder.load(counter, name="prof.count")
+        self.builder.store(self.builder.add(count, ir.Constant(self.int_type, 1)), counter)
+    
+    def _branch_key(self, kind: str, line: int):
+        occurrence = self.branch_occurrences.get((kind, line), 0)
+        self.branch_occurrences[(kind, line)] = occurrence + 1
+        return kind, line, occurrence
+    
+    def _apply_branch_weights(self, branch, key):
+        if self.branch_profile is not None:
+            weights = self.branch_profile.weights(*key)
+            if weights is not None:
+                branch.set_weights(weights)
+    
+    def generate(self, ast: ProgramNode):
+        with self.stats.phase("codegen"):
+            check_types(ast.statements)
+            self._begin_main()
+            self.assigned_first = self._find_assigned_first(ast.statements)
+            self._collect_variables(ast)
+            
+            for statement in ast.statements:
+                self._generate_statement(statement)
+            
+            return self._finish_main()
+    
+    def generate_stream(self, statements):
+        """Generate code for top-level statements as they arrive.
+        
+        statements can be any iterable, e.g. Parser.iter_statements(), so
+        the whole AST never has to exist at once. Variables are allocated
+        in the entry block as they are first seen, and the code itself
+        goes into a separate body block. The codegen phase recorded in stats
+        therefore includes the lexing and parsing that feed it.
+        """
+        with self.stats.phase("codegen"):
+            self._begin_main()
+            self.alloca_builder = ir.IRBuilder(self.builder.block)
+            body_block = self.func.append_basic_block(name="body")
+            self.builder.position_at_end(body_block)
+            self.forward_refs = {}
+            
+            for statement in statements:
+                check_types((statement,))
+                # Earlier reads of a name have already declared it.
+                if (type(statement) is MakeNode and statement.name not in self.variables
+                        and statement.name not in _names_in(statement.value)):
+                    self.assigned_first.add(statement.name)
+                self._collect_variables(statement)
+                self._generate_statement(statement)
+            
+            for name in self.forward_refs:
+                if name not in self.collected_vars:
+                    raise NameError(f"Undefined variable: {name}")
+            
+            self.alloca_builder.branch(body_block)
+            return self._finish_main()
+    
     def _generate_statement(self, node):
-        if isinstance(node, MakeNode):
-            self._generate_make(node)
-        elif isinstance(node, ShowNode):
-            self._generate_show(node)
-        elif isinstance(node, LoopNode):
-            self._generate_loop(node)
-        elif isinstance(node, IfNode):
-            self._generate_if(node)
+        pending = self.pending
+        pending.append(node)
+        while pending:
+            item = pending.pop()
+            if not isinstance(item, ASTNode):
+                item()
+                continue
+            generator = self._statement_generators.get(type(item))
+            if generator is not None:
+                if self.debug_info:
+                    self._set_line(item.line)
+                if self.profile:
+                    self.statement_counters.append((item.line, self.current_counter))
+                generator(item)
+    
+    def _push_statements(self, statements):
+        self.pending.extend(reversed(statements))
     
     def _generate_make(self, node: MakeNode):
         value = self._generate_expression(node.value)
@@ -100,111 +639,236 @@ class CodeGenerator:
         self.builder.store(value, ptr)
     
     def _generate_show(self, node: ShowNode):
-        if isinstance(node.value, StringNode):
-            format_str = self._create_global_string(node.value.value + "\n")
-            format_ptr = self._get_string_ptr(format_str)
-            self.builder.call(self.printf, [format_ptr])
+        if type(node.value) is StringNode:
+            text = self._create_global_string(node.value.value + "\n")
+            length = ir.Constant(self.int_type, text.type.pointee.count)
+            self.builder.call(self.runtime.write_bytes, [self._get_string_ptr(text), length])
         else:
             value = self._generate_expression(node.value)
-            format_str = self._create_global_string("%lld\n")
-            format_ptr = self._get_string_ptr(format_str)
-            self.builder.call(self.printf, [format_ptr, value])
+            if value.type == self.bool_type:
+                value = self.builder.zext(value, self.int_type)
+            self.builder.call(self.runtime.write_int, [value])
     
     def _generate_loop(self, node: LoopNode):
-        loop_cond = self.func.append_basic_block(name="loop.cond")
-        loop_body = self.func.append_basic_block(name="loop.body")
-        loop_end = self.func.append_basic_block(name="loop.end")
+        loop_cond = self._append_block("loop.cond", node.line)
+        loop_body = self._append_block("loop.body", node.line)
+        loop_end = self._append_block("loop.end", node.line)
         
         self.builder.branch(loop_cond)
         
-        self.builder.position_at_end(loop_cond)
+        self._enter_block(loop_cond)
         cond_value = self._generate_expression(node.condition)
-        self.builder.cbranch(cond_value, loop_body, loop_end)
-        
-        self.builder.position_at_end(loop_body)
-        for stmt in node.body:
-            self._generate_statement(stmt)
+        key = self._branch_key("loop", node.line)
+        branch = self.builder.cbranch(cond_value, loop_body, loop_end)
+        self._apply_branch_weights(branch, key)
         
+        self._enter_block(loop_body)
+        body_counter = self.current_counter
+        self.pending.append(lambda: self._finish_loop(loop_cond, loop_end, key, body_counter))
+        self._push_statements(node.body)
+    
+    def _finish_loop(self, loop_cond, loop_end, key, body_counter):
+        if self.debug_info:
+            self._set_line(key[1])
         if not self.builder.block.is_terminated:
-            self.builder.branch(loop_cond)
+            if self.fuel_metering:
+                self._branch_with_fuel(loop_cond)
+            else:
+                self.builder.branch(loop_cond)
         
-        self.builder.position_at_end(loop_end)
+        self._enter_block(loop_end)
+        if self.profile:
+            self.branch_counters.append(key + (body_counter, self.current_counter))
     
     def _generate_if(self, node: IfNode):
-        then_block = self.func.append_basic_block(name="if.then")
-        else_block = self.func.append_basic_block(name="if.else")
-        merge_block = self.func.append_basic_block(name="if.merge")
+        then_block = self._append_block("if.then", node.line)
+        else_block = self._append_block("if.else", node.line)
+        merge_block = self._append_block("if.merge", node.line)
         
         cond_value = self._generate_expression(node.condition)
-        self.builder.cbranch(cond_value, then_block, else_block)
+        key = self._branch_key("if", node.line)
+        branch = self.builder.cbranch(cond_value, then_block, else_block)
+        self._apply_branch_weights(branch, key)
         
-        self.builder.position_at_end(then_block)
-        for stmt in node.then_body:
-            self._generate_statement(stmt)
+        self._enter_block(then_block)
+        then_counter = self.current_counter
+        self.pending.append(lambda: self._finish_if(merge_block, node.line))
+        self._push_statements(node.else_body)
+        self.pending.append(lambda: self._begin_else(else_block, merge_block, key, then_counter))
+        self._push_statements(node.then_body)
+    
+    def _begin_else(self, else_block, merge_block, key, then_counter):
+        if self.debug_info:
+            self._set_line(key[1])
         if not self.builder.block.is_terminated:
             self.builder.branch(merge_block)
         
-        self.builder.position_at_end(else_block)
-        for stmt in node.else_body:
-            self._generate_statement(stmt)
+        self._enter_block(else_block)
+        if self.profile:
+            self.branch_counters.append(key + (then_counter, self.current_counter))
+    
+    def _finish_if(self, merge_block, line: int):
+        if self.debug_info:
+            self._set_line(line)
         if not self.builder.block.is_terminated:
             self.builder.branch(merge_block)
         
-        self.builder.position_at_end(merge_block)
+        self._enter_block(merge_block)
     
     def _generate_expression(self, node):
-        if isinstance(node, NumberNode):
-            return ir.Constant(self.int_type, node.value)
-        
-        elif isinstance(node, IdentifierNode):
-            ptr = self.variables.get(node.name)
-            if ptr is None:
-                raise NameError(f"Undefined variable: {node.name}")
-            return self.builder.load(ptr, name=node.name + ".val")
-        
-        elif isinstance(node, BinaryOpNode):
-            left = self._generate_expression(node.left)
-            right = self._generate_expression(node.right)
-            
-            if node.op == '+':
-                return self.builder.add(left, right, name="addtmp")
-            elif node.op == '-':
-                return self.builder.sub(left, right, name="subtmp")
-            elif node.op == '*':
-                return self.builder.mul(left, right, name="multmp")
-            elif node.op == '/':
-                return self.builder.sdiv(left, right, name="divtmp")
-            elif node.op == '<':
-                return self.builder.icmp_signed('<', left, right, name="cmptmp")
-            elif node.op == '==':
-                return self.builder.icmp_signed('==', left, right, name="eqtmp")
+        # Post-order over binary operations: an operation is pushed once to
+        # schedule its operands (left first) and once more, as (node,), to
+        # combine their values.
+        values = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            if node_type is BinaryOpNode:
+                stack.append((node,))
+                stack.append(node.right)
+                stack.append(node.left)
+            elif node_type is tuple:
+                right = values.pop()
+                values.append(self._generate_binary_op(node[0], values.pop(), right))
             else:
-                raise ValueError(f"Unknown operator: {node.op}")
-        
-        elif isinstance(node, StringNode):
-            return node.value
+                generator = self._expression_generators.get(node_type)
+                if generator is None:
+                    raise TypeError(f"Unknown expression type: {node_type}")
+                values.append(generator(node))
+        return values[0]
+    
+    def _generate_number(self, node: NumberNode):
+        return ir.Constant(self.int_type, node.value)
+    
+    def _generate_identifier(self, node: IdentifierNode):
+        ptr = self.variables.get(node.name)
+        if ptr is None and self.storage is not None and node.name in self.storage:
+            ptr = self._declare_variable(node.name)
+        if ptr is None:
+            if self.forward_refs is None:
+                raise NameError(f"Undefined variable: {node.name}")
+            # A later statement may still make it; until then it reads as 0.
+            ptr = self._declare_variable(node.name)
+            self.forward_refs[node.name] = None
+        return self.builder.load(ptr, name=node.name + ".val")
+    
+    def _generate_binary_op(self, node: BinaryOpNode, left, right):
+        if node.op == '/':
+            self._check_division(left, right)
+        emit = BINARY_OPS.get(node.op)
+        if emit is None:
+            raise ValueError(f"Unknown operator: {node.op}")
+        return emit(self.builder, left, right)
+    
+    def _check_division(self, left, right):
+        """Branch to the division error block if left / right would trap; sdiv follows."""
+        int_type = self.int_type
+        if getattr(left, 'type', None) != int_type or getattr(right, 'type', None) != int_type:
+            # Left for the verifier to reject.
+            return
+        if isinstance(right, ir.Constant) and right.constant not in (0, -1):
+            return
+        builder = self.builder
+        error = builder.icmp_signed('==', right, ir.Constant(int_type, 0), name="div.zero")
+        if not (isinstance(left, ir.Constant) and left.constant != INT64_MIN):
+            overflow = builder.and_(builder.icmp_signed('==', left, ir.Constant(int_type, INT64_MIN)),
+                                    builder.icmp_signed('==', right, ir.Constant(int_type, -1)),
+                                    name="div.overflow")
+            error = builder.or_(error, overflow, name="div.error")
         
-        else:
-            raise TypeError(f"Unknown expression type: {type(node)}")
+        if self.division_error_block is None:
+            self.division_error_block = self.func.append_basic_block(name="division_error")
+            error_builder = ir.IRBuilder(self.division_error_block)
+            error_builder.call(self.runtime.flush, [])
+            error_builder.ret(ir.Constant(ir.IntType(32), DIVISION_ERROR_EXIT_CODE))
+        divide = self.func.append_basic_block(name="div")
+        branch = builder.cbranch(error, self.division_error_block, divide)
+        branch.set_weights([1, 2000])
+        builder.position_at_end(divide)
+    
+    def _generate_string(self, node: StringNode):
+        return node.value
     
     def verify(self):
-        llvm_ir = str(self.module)
-        mod = binding.parse_assembly(llvm_ir)
-        mod.verify()
-        return mod
+        if self.llvm_module is None:
+            with self.stats.phase("verify"):
+                mod = binding.parse_assembly(str(self.module))
+                mod.verify()
+            self.llvm_module = mod
+            self.stats.count_module("ir", mod)
+        return self.llvm_module
     
-    def compile_and_run(self):
-        mod = self.verify()
+    def optimize(self, mod, target_machine):
+        if self.opt_level == 0 or self.optimized:
+            return mod
         
-        target = binding.Target.from_default_triple()
-        target_machine = target.create_target_machine()
+        # The default O1-O3 pipelines cover mem2reg (SROA), instcombine,
+        # GVN and the loop passes; vectorization is enabled from O2 up.
+        tuning = binding.create_pipeline_tuning_options(speed_level=self.opt_level)
+        tuning.loop_unrolling = True
+        tuning.loop_vectorization = self.opt_level >= 2
+        tuning.slp_vectorization = self.opt_level >= 2
         
-        backing_mod = binding.parse_assembly(str(self.module))
-        engine = binding.create_mcjit_compiler(backing_mod, target_machine)
-        engine.finalize_object()
+        with self.stats.phase("optimize"):
+            pass_builder = binding.create_pass_builder(target_machine, tuning)
+            pass_manager = pass_builder.getModulePassManager()
+            pass_manager.run(mod, pass_builder)
+        self.optimized = True
+        self.stats.count_module("optimized_ir", mod)
+        return mod
+    
+    def emit_object(self, target_machine=None) -> bytes:
+        mod = self.verify()
+        target_machine = target_machine or get_target_machine(self.opt_level)
+        self.optimize(mod, target_machine)
+        with self.stats.phase("emit"):
+            obj = target_machine.emit_object(mod)
+        self.stats.count("object_bytes", len(obj))
+        return obj
+    
+    def emit_assembly(self, target_machine=None) -> str:
+        mod = self.verify()
+        target_machine = target_machine or get_target_machine(self.opt_level)
+        self.optimize(mod, target_machine)
+        with self.stats.phase("emit_asm"):
+            return target_machine.emit_assembly(mod)
+    
+    def compile_and_run(self, output: OutputCapture = None, fuel: int = None):
+        """JIT-compile and run the module.
         
-        main_ptr = engine.get_function_address("main")
+        Output goes to fd 1, or into output if an OutputCapture is given.
+        fuel bounds the loop back-edges of a fuel-metered module (see the
+        class docstring); None means unlimited.
+        """
+        mod = self.verify()
+        self.optimize(mod, get_target_machine(self.opt_level))
         
-        import ctypes
-        main_func = ctypes.CFUNCTYPE(ctypes.c_int)(main_ptr)
-        return main_func()
+        engine = load_module(mod, self.opt_level)
+        objects = []
+        hooked = perf_mode() is not None
+        if hooked:
+            # MCJIT hands the object code it generates to the cache hook, which perf needs.
+            engine.set_object_cache(lambda module, obj: objects.append(obj))
+        try:
+            with self.stats.phase("emit"):
+                engine.finalize_object()
+                main_ptr = engine.get_function_address(self.entry_name)
+                if objects:
+                    register_object(objects[-1], self.entry_name, main_ptr, self.source_path)
+                sink_ptr = engine.get_global_value_address(self.runtime.sink.name)
+                fuel_ptr = 0
+                if self.fuel_metering:
+                    fuel_ptr = engine.get_global_value_address(fuel_symbol(self.entry_name))
+            with self.stats.phase("run"):
+                exit_code = run_entry(main_ptr, sink_ptr, output, fuel_ptr, fuel)
+            if self.profile:
+                table_ptr = engine.get_global_value_address(profile_symbol(self.entry_name))
+                self.block_profile = BlockProfile.read(table_ptr, self.counter_blocks, self.statement_counters,
+                                                       self.branch_counters)
+            return exit_code
+        finally:
+            if hooked:
+                # The engine is shared; later modules must not run this run's hook.
+                engine.set_object_cache()
+            unload_module(mod, self.opt_level)
@@ -0,0 +1,13 @@
+"""
+Settings shared by the front end, the interpreter and the LLVM back end.
+
+Importing this module does not load LLVM, so command-line parsing and
+front-end-only runs can use these without starting llvmlite.
+"""
+
+OPT_LEVELS = (0, 1, 2, 3)
+DEFAULT_OPT_LEVEL = 2
+
+# Execution backends (see ide.execute).
+BACKENDS = ("auto", "jit", "interp")
+DEFAULT_BACKEND = "auto"
@@ -1,19 +1,192 @@
 #!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+
 from lexer import Lexer
+from parallel_lexer import tokenize_source
 from parser import Parser
-from codegen import CodeGenerator
+from config import OPT_LEVELS, DEFAULT_OPT_LEVEL, BACKENDS, DEFAULT_BACKEND
+from optimizer import optimize_ast
+from runtime import OutputCapture
+from stats import CompileStats, NULL_STATS, count_ast_nodes
+from pgo import BranchProfile, default_profile_path
+from perfmap import PERF_MODES, enable as enable_perf, perf_mode
+from interpreter import AUTO_FUEL, OutOfFuel, choose_backend, compile_program, run_program
 
+# LLVM (codegen, session, build) and the object cache are imported only by
+# the functions that need them, so checking, emitting and interpreting
+# programs start up without loading llvmlite.
 
-def run_xlang(source_code: str):
-    try:
-        lexer = Lexer(source_code)
-        tokens = lexer.tokenize()
-        
+
+def parse_source(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, stats: CompileStats = None):
+    """Run the front end: lex (in parallel for very large sources), parse and, above -O0, the AST optimizer."""
+    if stats is None:
+        stats = NULL_STATS
+    
+    with stats.phase("lex"):
+        tokens = tokenize_source(source_code)
+    stats.count("tokens", len(tokens))
+    
+    with stats.phase("parse"):
         parser = Parser(tokens)
         ast = parser.parse()
+    if stats is not NULL_STATS:
+        stats.count("ast_nodes", count_ast_nodes(ast))
+    
+    if opt_level > 0:
+        with stats.phase("optimize_ast"):
+            ast = optimize_ast(ast)
+        if stats is not NULL_STATS:
+            stats.count("optimized_ast_nodes", count_ast_nodes(ast))
+    return ast
+
+
+def compile_ast(ast, opt_level: int = DEFAULT_OPT_LEVEL, stats: CompileStats = None,
+                profile: bool = False, branch_profile: BranchProfile = None,
+                fuel_metering: bool = False, debug_info: bool = False,
+                source_path: str = None) -> 'CodeGenerator':
+    from codegen import CodeGenerator
+    
+    codegen = CodeGenerator(opt_level=opt_level, stats=stats, profile=profile, branch_profile=branch_profile,
+                            fuel_metering=fuel_metering, debug_info=debug_info, source_path=source_path)
+    codegen.generate(ast)
+    codegen.verify()
+    return codegen
+
+
+def compile_source(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, stats: CompileStats = None,
+                   profile: bool = False, branch_profile: BranchProfile = None,
+                   fuel_metering: bool = False, debug_info: bool = False,
+                   source_path: str = None) -> 'CodeGenerator':
+    ast = parse_source(source_code, opt_level, stats)
+    return compile_ast(ast, opt_level, stats, profile, branch_profile, fuel_metering, debug_info, source_path)
+
+
+def interpret(ast, output: OutputCapture = None, stats: CompileStats = None, fuel: int = None):
+    """Run an AST on the bytecode interpreter; raises OutOfFuel if fuel runs out."""
+    if stats is None:
+        stats = NULL_STATS
+    with stats.phase("bytecode"):
+        program = compile_program(ast)
+    stats.count("bytecode_instructions", len(program.code))
+    with stats.phase("interpret"):
+        return run_program(program, output, fuel)
+
+
+def execute(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, cache: 'ObjectCache' = None,
+            output: OutputCapture = None, stats: CompileStats = None, branch_profile: BranchProfile = None,
+            backend: str = DEFAULT_BACKEND, fuel: int = None, source_path: str = None):
+    """Compile and run a program on backend: "jit", "interp" or "auto" (see interpreter.choose_backend).
+    
+    Branch profiles only affect JIT code, so they force the JIT. So does
+    fuel: the program's loops may take at most that many back-edges in
+    total before it stops with runtime.OUT_OF_FUEL_EXIT_CODE.
+    
+    With jitdump perf output enabled (see perfmap.py), freshly compiled JIT
+    code carries line info for source_path, the file source_code came from.
+    
+    With a cache, "auto" looks for the program's object before running the
+    front end, so only a cache miss pays for backend selection. Programs
+    it interpreted are remembered (ObjectCache.mark_interpreted) and skip
+    that lookup, which would load LLVM.
+    """
+    debug_info = perf_mode() == "jitdump"
+    if backend == "jit" or branch_profile is not None or fuel is not None:
+        if cache is not None:
+            from cache import run_cached
+            return run_cached(source_code, opt_level, cache, output, branch_profile, fuel)
+        codegen = compile_source(source_code, opt_level, stats, branch_profile=branch_profile,
+                                 fuel_metering=fuel is not None, debug_info=debug_info, source_path=source_path)
+        return codegen.compile_and_run(output, fuel)
+    
+    auto_cache = cache if backend == "auto" else None
+    if auto_cache is not None and not auto_cache.was_interpreted(source_code, opt_level):
+        from cache import run_if_cached
+        exit_code = run_if_cached(source_code, opt_level, auto_cache, output)
+        if exit_code is not None:
+            return exit_code
+    
+    ast = parse_source(source_code, opt_level, stats)
+    choice = "interp" if backend == "interp" else choose_backend(ast)
+    if choice != "jit":
+        try:
+            exit_code = interpret(ast, output, stats, AUTO_FUEL if choice == "interp-fuel" else None)
+        except OutOfFuel:
+            # The interpreter held back all output, so the program can start over on the JIT.
+            if stats is not None:
+                stats.count("interpreter_fallback", 1)
+        else:
+            if auto_cache is not None:
+                auto_cache.mark_interpreted(source_code, opt_level)
+            return exit_code
+    
+    if cache is not None:
+        from cache import run_cached
+        return run_cached(source_code, opt_level, cache, output, ast=ast)
+    codegen = compile_ast(ast, opt_level, stats, debug_info=debug_info, source_path=source_path)
+    return codegen.compile_and_run(output)
+
+
+WARMUP_PROGRAM = "make x = 0\nloop x < 1:\n    make x = x + 1\nstop\nshow x\n"
+
+
+def warm_up(opt_level: int = DEFAULT_OPT_LEVEL):
+    """Load LLVM and compile one program ahead of time, e.g. before forking workers."""
+    from codegen import get_engine, get_target_machine
+    
+    get_target_machine(opt_level)
+    get_engine(opt_level)
+    # The first compile also sets up LLVM's pass pipelines.
+    execute(WARMUP_PROGRAM, opt_level, output=OutputCapture(), backend="jit")
+
+
+def profile_xlang(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, output: OutputCapture = None):
+    """Run a program with basic-block counters; returns (exit code, BlockProfile)."""
+    codegen = compile_source(source_code, opt_level, profile=True)
+    exit_code = codegen.compile_and_run(output)
+    return exit_code, codegen.block_profile
+
+
+def run_xlang(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, cache: 'ObjectCache' = None,
+              stats: CompileStats = None, branch_profile: BranchProfile = None, backend: str = DEFAULT_BACKEND,
+              source_path: str = None):
+    try:
+        return execute(source_code, opt_level, cache, stats=stats, branch_profile=branch_profile, backend=backend,
+                       source_path=source_path)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+
+def capture_xlang(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, cache: 'ObjectCache' = None,
+                  backend: str = DEFAULT_BACKEND):
+    """Run a program and return (exit code, output as a memoryview).
+    
+    The output is collected in memory by the native runtime, without pipes
+    or redirecting stdout. Errors are raised rather than printed.
+    """
+    output = OutputCapture()
+    exit_code = execute(source_code, opt_level, cache, output, backend=backend)
+    return exit_code, output.getbuffer()
+
+
+def run_xlang_stream(source_file, opt_level: int = DEFAULT_OPT_LEVEL, stats: CompileStats = None):
+    """Compile a file on the JIT while reading it (CodeGenerator.generate_stream).
+    
+    There is never a whole AST, so the AST optimizer and backend selection
+    are skipped. Output matches the normal pipeline, except that an
+    undefined variable is only reported once the whole file is read.
+    """
+    from codegen import CodeGenerator
+    
+    try:
+        lexer = Lexer(source_file)
+        parser = Parser.from_buffers(lexer.iter_buffers())
         
-        codegen = CodeGenerator()
-        codegen.generate(ast)
+        codegen = CodeGenerator(opt_level=opt_level, stats=stats)
+        codegen.generate_stream(parser.iter_statements())
         codegen.verify()
         
         return codegen.compile_and_run()
@@ -22,59 +195,76 @@ def run_xlang(source_code: str):
         return 1
 
 
-def interactive_mode():
+def interactive_mode(opt_level: int = DEFAULT_OPT_LEVEL):
+    from session import Session, block_depth_change
+    
     print("=" * 50)
     print("XLANG INTERACTIVE IDE")
     print("=" * 50)
+    print("Statements run as soon as they are entered; blocks run")
+    print("once their closing 'stop' is entered.")
     print("Commands:")
-    print("  run    - Execute the code you entered")
-    print("  clear  - Clear current code buffer")
-    print("  show   - Show current code buffer")
+    print("  vars   - Show the session's variables")
+    print("  clear  - Forget all variables and history")
+    print("  show   - Show the entries run so far")
     print("  help   - Show Xlang syntax help")
     print("  exit   - Exit the IDE")
     print("=" * 50)
     print()
     
-    code_buffer = []
+    session = Session(opt_level)
+    pending = []
+    depth = 0
     
     while True:
         try:
-            line = input("xlang> ")
+            line = input("...    " if pending else "xlang> ")
         except EOFError:
             break
         except KeyboardInterrupt:
-            print("\nUse 'exit' to quit")
+            if pending:
+                pending = []
+                depth = 0
+                print("\nBlock discarded.")
+            else:
+                print("\nUse 'exit' to quit")
             continue
         
         cmd = line.strip().lower()
         
-        if cmd == "exit" or cmd == "quit":
+        if pending or not line.strip():
+            pass
+        
+        elif cmd == "exit" or cmd == "quit":
             print("Goodbye!")
             break
         
-        elif cmd == "run":
-            if code_buffer:
-                print("\n" + "-" * 40)
-                print("OUTPUT:")
-                print("-" * 40)
-                source = "\n".join(code_buffer)
-                run_xlang(source)
-                print("-" * 40 + "\n")
-            else:
-                print("No code to run. Enter some Xlang code first.")
-        
         elif cmd == "clear":
-            code_buffer = []
-            print("Code buffer cleared.")
+            session.reset()
+            print("Session cleared.")
+            continue
+        
+        elif cmd == "vars":
+            variables = session.variables()
+            if variables:
+                for name, value in variables.items():
+                    print(f"  {name} = {value}")
+            else:
+                print("No variables defined.")
+            continue
         
         elif cmd == "show":
-            if code_buffer:
-                print("\n--- Current Code ---")
-                for i, line in enumerate(code_buffer, 1):
-                    print(f"{i:3}: {line}")
+            if session.history:
+                print("\n--- Session ---")
+                number = 1
+                for entry in session.history:
+                    for entry_line in entry.splitlines():
+                        print(f"{number:3}: {entry_line}")
+                        number += 1
                 print("--- End ---\n")
             else:
-                print("Code buffer is empty.")
+                print("Nothing has been run yet.")
+            continue
         
         elif cmd == "help":
             print("""
@@ -99,30 +289,307 @@ Conditional:
       show "no"
   stop
 """)
+            continue
+        
+        if not line.strip():
+            continue
+        
+        pending.append(line)
+        depth += block_depth_change(line)
+        if depth > 0:
+            continue
         
-        elif line.strip():
-            code_buffer.append(line)
+        source = "\n".join(pending) + "\n"
+        pending = []
+        depth = 0
+        try:
+            session.execute(source)
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+def run_xlang_profiled(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, profile_path: str = None):
+    """Run with block counters; print the hottest lines or save a PGO profile to profile_path."""
+    try:
+        exit_code, profile = profile_xlang(source_code, opt_level)
+        if profile_path is not None:
+            BranchProfile.from_block_profile(profile).save(profile_path)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    print("-" * 40)
+    if profile_path is not None:
+        print(f"Wrote branch profile {profile_path}")
+    else:
+        print("Hottest lines:")
+        print(profile.format(source_code))
+    return exit_code
 
 
-def file_mode(filename: str):
+def file_mode(filename: str, opt_level: int = DEFAULT_OPT_LEVEL, cache: 'ObjectCache' = None,
+              stream: bool = False, stats: CompileStats = None, profile: bool = False,
+              profile_generate: str = None, profile_use: str = None, backend: str = DEFAULT_BACKEND):
     try:
         with open(filename, 'r') as f:
+            if stream:
+                print(f"Running: {filename}")
+                print("-" * 40)
+                run_xlang_stream(f, opt_level, stats)
+                print("-" * 40)
+                return
             source = f.read()
         
         print(f"Running: {filename}")
         print("-" * 40)
-        run_xlang(source)
+        if profile or profile_generate:
+            run_xlang_profiled(source, opt_level, profile_generate)
+        else:
+            branch_profile = BranchProfile.load(profile_use) if profile_use else None
+            run_xlang(source, opt_level, cache, stats, branch_profile, backend, filename)
         print("-" * 40)
+    except FileNotFoundError as e:
+        print(f"File not found: {e.filename}")
+    except Exception as e:
+        print(f"Error: {e}")
+
+
+EMIT_CHOICES = ("tokens", "ast")
+
+
+def check_file(path: str, emit: str = None) -> bool:
+    """Lex and parse a file without generating code; with emit, print its tokens or AST."""
+    try:
+        with open(path, 'r') as f:
+            tokens = tokenize_source(f.read())
+        if emit == "tokens":
+            for token in tokens:
+                print(f"{token.line}: {token.type.name} {token.value!r}")
+        ast = Parser(tokens).parse()
     except FileNotFoundError:
-        print(f"File not found: {filename}")
+        print(f"{path}: File not found")
+        return False
+    except Exception as e:
+        print(f"{path}: {type(e).__name__}: {e}")
+        return False
+    
+    if emit == "ast":
+        for statement in ast.statements:
+            print(f"{statement.line}: {statement!r}")
+    return True
+
+
+def check_command(argv):
+    arg_parser = argparse.ArgumentParser(prog="ide.py check",
+                                         description="Syntax-check Xlang files without loading LLVM")
+    arg_parser.add_argument("files", nargs="+", help="Xlang source files")
+    arg_parser.add_argument("--emit", choices=EMIT_CHOICES, help="Also print each file's tokens or AST")
+    args = arg_parser.parse_args(argv)
+    
+    failed = 0
+    for path in args.files:
+        if not check_file(path, args.emit):
+            failed += 1
+    return 1 if failed else 0
+
+
+def build_command(argv):
+    from build import build
+    
+    arg_parser = argparse.ArgumentParser(prog="ide.py build", description="Compile an Xlang program ahead of time")
+    arg_parser.add_argument("file", help="Xlang source file")
+    arg_parser.add_argument("-o", "--output", help="Output path (default: source name without extension)")
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL,
+                            help="LLVM optimization level (default: %(default)s)")
+    arg_parser.add_argument("-c", "--object", action="store_true", help="Emit an object file instead of linking")
+    arg_parser.add_argument("--emit-llvm", action="store_true", help="Also write the optimized LLVM IR (.ll)")
+    arg_parser.add_argument("--emit-asm", action="store_true", help="Also write the native assembly (.s)")
+    arg_parser.add_argument("--profile-use", nargs="?", const="", metavar="FILE",
+                            help="Compile with branch weights from a recorded profile (default: <file>.xlprof)")
+    args = arg_parser.parse_args(argv)
+    
+    output = args.output
+    if output is None:
+        output = os.path.splitext(args.file)[0] + (".o" if args.object else "")
+    
+    try:
+        with open(args.file, 'r') as f:
+            source = f.read()
+        branch_profile = None
+        if args.profile_use is not None:
+            branch_profile = BranchProfile.load(args.profile_use or default_profile_path(args.file))
+        written = build(source, output, args.opt_level, object_only=args.object,
+                        emit_llvm=args.emit_llvm, emit_asm=args.emit_asm, branch_profile=branch_profile)
+    except FileNotFoundError as e:
+        print(f"File not found: {e.filename}")
+        return 1
     except Exception as e:
         print(f"Error: {e}")
+        return 1
+    
+    for path in written:
+        print(f"Wrote {path}")
+    return 0
 
 
-if __name__ == "__main__":
-    import sys
+def batch_command(argv):
+    import time
+    from batch import collect_sources, run_batch
+    
+    arg_parser = argparse.ArgumentParser(prog="ide.py batch", description="Run many Xlang programs in parallel")
+    arg_parser.add_argument("paths", nargs="+", help="Xlang source files or directories (searched for *.xl)")
+    arg_parser.add_argument("-j", "--jobs", type=int, help="Number of worker processes (default: CPU count)")
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL,
+                            help="LLVM optimization level (default: %(default)s)")
+    arg_parser.add_argument("--cache-dir", help="Object cache directory (default: $XLANG_CACHE_DIR or ~/.cache/xlang)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Always recompile instead of using the object cache")
+    arg_parser.add_argument("--show-output", action="store_true", help="Print each program's output after its result")
+    arg_parser.add_argument("--report", help="Write per-file results (exit code, output, timing) as JSON to this file")
+    arg_parser.add_argument("--profile-use", action="store_true",
+                            help="Compile each file with its recorded branch profile (<file>.xlprof) when there is one")
+    arg_parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                            help="Run on the LLVM JIT, the bytecode interpreter, or pick per program (default: %(default)s)")
+    args = arg_parser.parse_args(argv)
+    
+    paths = collect_sources(args.paths)
+    if not paths:
+        print("No Xlang files found.")
+        return 1
+    
+    def on_result(result):
+        status = "ok" if result.ok else "FAIL"
+        detail = result.error if result.error else f"exit {result.exit_code}"
+        print(f"{status:4} {result.path} ({detail}, {result.seconds * 1000:.1f} ms)")
+        if args.show_output and result.output:
+            sys.stdout.write(result.output.decode('utf-8', 'replace'))
+    
+    start = time.perf_counter()
+    results = run_batch(paths, args.jobs, args.opt_level, args.cache_dir, not args.no_cache, on_result,
+                        use_profiles=args.profile_use, backend=args.backend)
+    elapsed = time.perf_counter() - start
     
-    if len(sys.argv) > 1:
-        file_mode(sys.argv[1])
+    failed = sum(not result.ok for result in results)
+    busy = sum(result.seconds for result in results)
+    print("-" * 40)
+    print(f"{len(results)} files, {failed} failed, {elapsed:.2f} s wall, {busy:.2f} s in programs")
+    
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump([result.as_dict() for result in results], f, indent=2)
+        print(f"Wrote {args.report}")
+    return 1 if failed else 0
+
+
+def serve_command(argv):
+    from client import default_socket_path
+    from cache import ObjectCache
+    from server import serve
+    
+    arg_parser = argparse.ArgumentParser(prog="ide.py serve",
+                                         description="Run a compile-and-run daemon with warm LLVM state (see client.py)")
+    arg_parser.add_argument("--socket", help=f"Unix socket to listen on (default: {default_socket_path()})")
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL,
+                            help="Default LLVM optimization level for requests (default: %(default)s)")
+    arg_parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                            help="Default backend for requests (default: %(default)s)")
+    arg_parser.add_argument("--cache-dir", help="Object cache directory (default: $XLANG_CACHE_DIR or ~/.cache/xlang)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Always recompile instead of using the object cache")
+    args = arg_parser.parse_args(argv)
+    
+    try:
+        cache = None if args.no_cache else ObjectCache(args.cache_dir)
+        serve(args.socket, args.opt_level, args.backend, cache)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+COMMANDS = {
+    "check": check_command,
+    "build": build_command,
+    "batch": batch_command,
+    "serve": serve_command,
+}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    
+    arg_parser = argparse.ArgumentParser(description="Xlang IDE",
+                                         epilog=f"Commands: {', '.join(COMMANDS)} (run 'ide.py <command> -h')")
+    arg_parser.add_argument("file", nargs="?", help="Xlang source file to run (omit for interactive mode)")
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL,
+                            help="LLVM optimization level (default: %(default)s)")
+    arg_parser.add_argument("--cache-dir", help="Object cache directory (default: $XLANG_CACHE_DIR or ~/.cache/xlang)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Always recompile instead of using the object cache")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="Lex, parse and generate code incrementally while reading the file; always runs on "
+                                 "the JIT and skips the AST optimizer, the object cache and --backend selection")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="Print the time of each compiler phase and token/AST/IR counts (bypasses the cache)")
+    arg_parser.add_argument("--trace-memory", action="store_true",
+                            help="Also record each phase's peak Python memory with tracemalloc (slower)")
+    arg_parser.add_argument("--stats-json", metavar="FILE",
+                            help="Write the statistics as JSON to FILE ('-' for stdout)")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="Count basic-block executions and report the hottest source lines (bypasses the cache)")
+    arg_parser.add_argument("--profile-generate", nargs="?", const="", metavar="FILE",
+                            help="Training run: record branch counts to FILE (default: <file>.xlprof)")
+    arg_parser.add_argument("--profile-use", nargs="?", const="", metavar="FILE",
+                            help="Compile with branch weights from a recorded profile (default: <file>.xlprof)")
+    arg_parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                            help="Run on the LLVM JIT, the bytecode interpreter, or pick per program (default: %(default)s)")
+    arg_parser.add_argument("--perf", choices=PERF_MODES,
+                            help="Describe JIT code to Linux perf: a /tmp/perf-<pid>.map of functions, or a "
+                                 "jitdump with source lines for perf inject --jit (jitdump bypasses the cache)")
+    arg_parser.add_argument("--check", action="store_true",
+                            help="Only lex and parse the file and report syntax errors (same as 'ide.py check')")
+    arg_parser.add_argument("--emit", choices=EMIT_CHOICES,
+                            help="Print the file's tokens or AST instead of running it")
+    args = arg_parser.parse_args(argv)
+    
+    if args.stream and args.backend == "interp":
+        arg_parser.error("--stream generates LLVM code as it reads, so it cannot run on the interpreter")
+    if args.file and (args.check or args.emit):
+        return 0 if check_file(args.file, args.emit) else 1
+    if args.file:
+        profile_generate = args.profile_generate
+        if profile_generate == "":
+            profile_generate = default_profile_path(args.file)
+        profile_use = args.profile_use
+        if profile_use == "":
+            profile_use = default_profile_path(args.file)
+        
+        stats = None
+        if args.stats or args.trace_memory or args.stats_json:
+            stats = CompileStats(trace_memory=args.trace_memory)
+        if args.perf:
+            enable_perf(args.perf)
+        # Statistics describe a full compile, so they never come from the cache.
+        # Neither does perf line info, which cached objects are compiled without.
+        cache = None
+        if not (args.no_cache or stats or args.profile or args.perf == "jitdump"):
+            from cache import ObjectCache
+            cache = ObjectCache(args.cache_dir)
+        file_mode(args.file, args.opt_level, cache, stream=args.stream, stats=stats, profile=args.profile,
+                  profile_generate=profile_generate, profile_use=profile_use, backend=args.backend)
+        
+        if args.stats or args.trace_memory:
+            print(stats.format())
+        if args.stats_json == "-":
+            json.dump(stats.as_dict(), sys.stdout, indent=2)
+            print()
+        elif args.stats_json:
+            with open(args.stats_json, 'w') as f:
+                json.dump(stats.as_dict(), f, indent=2)
     else:
-        interactive_mode()
+        interactive_mode(args.opt_level)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
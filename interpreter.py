@@ -0,0 +1,437 @@
+"""
+Bytecode interpreter backend.
+
+Compiles a ProgramNode into register-style bytecode and runs it in one
+dispatch loop, without touching LLVM. For short programs this is much
+faster than building, verifying and JIT-compiling a module.
+
+Semantics follow the generated code: i64 wrap-around arithmetic, signed
+division truncating toward zero, comparisons as i1 values (shown as 0/1,
+and ordered as signed i1, i.e. true < false), and the same type rules
+(optimizer.check_types). A division by zero, or of INT64_MIN by -1, ends
+the program with DIVISION_ERROR_EXIT_CODE after flushing its output, as in
+generated code.
+
+Every variable, constant and temporary lives in one slot list; an
+instruction is a tuple (opcode, a, b, c) of slot indices or jump targets.
+Loops are compiled condition-last, so an iteration costs one branch. The
+compiler walks the AST with explicit stacks, never recursively.
+"""
+
+import os
+import sys
+
+from parser import (
+    ProgramNode, MakeNode, ShowNode, LoopNode, IfNode,
+    NumberNode, StringNode, IdentifierNode, BinaryOpNode
+)
+from optimizer import INT, BOOL, INT64_MIN, INT64_MAX, check_types, wrap_i64, iter_blocks
+from runtime import DIVISION_ERROR_EXIT_CODE
+from stats import count_ast_nodes
+
+
+# Opcodes.
+ADD = 0        # slots[a] = wrap(slots[b] + slots[c])
+SUB = 1
+MUL = 2
+DIV = 3
+LT = 4         # slots[a] = int(slots[b] < slots[c])
+EQ = 5
+MOVE = 6       # slots[a] = slots[b]
+JUMP = 7       # pc = a
+BR_LT = 8      # if slots[a] < slots[b]: pc = c
+BR_EQ = 9
+BR_GE = 10     # if not slots[a] < slots[b]: pc = c
+BR_NE = 11
+LOOP_LT = 12   # like BR_LT/BR_EQ, but a back-edge that uses fuel
+LOOP_EQ = 13
+SHOW_INT = 14  # append slots[a] and a newline
+SHOW_STR = 15  # append the bytes in strings[a]
+
+ARITHMETIC_OPS = {'+': ADD, '-': SUB, '*': MUL, '/': DIV}
+COMPARISON_OPS = {'<': LT, '==': EQ}
+BRANCH_TRUE = {'<': BR_LT, '==': BR_EQ}
+BRANCH_FALSE = {'<': BR_GE, '==': BR_NE}
+BACK_EDGE = {'<': LOOP_LT, '==': LOOP_EQ}
+
+# Output is flushed to fd 1 in chunks of this size when not held back.
+FLUSH_SIZE = 1 << 16
+
+
+class OutOfFuel(Exception):
+    """Raised when a run exceeds its instruction budget."""
+
+
+class Program:
+    __slots__ = ('code', 'slots', 'strings', 'loop_costs')
+    
+    def __init__(self, code: list, slots: list, strings: list, loop_costs: list):
+        self.code = code
+        self.slots = slots
+        self.strings = strings
+        self.loop_costs = loop_costs
+
+
+class BytecodeCompiler:
+    def __init__(self):
+        self.code = []
+        self.slots = []
+        self.variables = {}
+        self.constants = {}
+        self.strings = []
+        self.string_index = {}
+        # Static instruction count of each loop, charged to fuel per iteration.
+        self.loop_costs = []
+        self.free_temps = []
+        # Statements still to compile and continuations (callables) that
+        # finish a loop or if once its body is done; the next one is last.
+        self.pending = []
+        
+        self._statement_compilers = {
+            MakeNode: self._compile_make,
+            ShowNode: self._compile_show,
+            LoopNode: self._compile_loop,
+            IfNode: self._compile_if,
+        }
+    
+    def compile(self, ast: ProgramNode) -> Program:
+        check_types(ast.statements)
+        # Like the code generator, every variable made anywhere exists from the start as 0.
+        self._collect(ast.statements)
+        self._compile_block(ast.statements)
+        return Program(self.code, self.slots, [s.encode('utf-8') for s in self.strings], self.loop_costs)
+    
+    def _collect(self, statements):
+        # Depth-first in source order, the order the code generator allocates variables in.
+        stack = list(reversed(statements))
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            if node_type is MakeNode:
+                if node.name not in self.variables:
+                    self.variables[node.name] = self._new_slot(0)
+            elif node_type is LoopNode:
+                stack.extend(reversed(node.body))
+            elif node_type is IfNode:
+                stack.extend(reversed(node.else_body))
+                stack.extend(reversed(node.then_body))
+    
+    def _new_slot(self, value=0) -> int:
+        self.slots.append(value)
+        return len(self.slots) - 1
+    
+    def _constant(self, value: int) -> int:
+        slot = self.constants.get(value)
+        if slot is None:
+            slot = self.constants[value] = self._new_slot(wrap_i64(value))
+        return slot
+    
+    def _temp(self) -> int:
+        return self.free_temps.pop() if self.free_temps else self._new_slot()
+    
+    def _release(self, slot: int, owned: bool):
+        if owned:
+            self.free_temps.append(slot)
+    
+    def _emit(self, op: int, a: int = 0, b: int = 0, c: int = 0) -> int:
+        self.code.append((op, a, b, c))
+        return len(self.code) - 1
+    
+    def _patch(self, index: int, **fields):
+        op, a, b, c = self.code[index]
+        self.code[index] = (op, fields.get('a', a), fields.get('b', b), fields.get('c', c))
+    
+    def _compile_block(self, statements):
+        pending = self.pending
+        pending.extend(reversed(statements))
+        while pending:
+            item = pending.pop()
+            if callable(item):
+                item()
+                continue
+            compiler = self._statement_compilers.get(type(item))
+            if compiler is not None:
+                compiler(item)
+    
+    def _compile_make(self, node: MakeNode):
+        self._compile_into(node.value, self.variables[node.name])
+    
+    def _compile_show(self, node: ShowNode):
+        if type(node.value) is StringNode:
+            text = node.value.value + "\n"
+            index = self.string_index.get(text)
+            if index is None:
+                index = self.string_index[text] = len(self.strings)
+                self.strings.append(text)
+            self._emit(SHOW_STR, index)
+            return
+        slot, kind, owned = self._compile_expression(node.value)
+        self._emit(SHOW_INT, slot)
+        self._release(slot, owned)
+    
+    def _compile_loop(self, node: LoopNode):
+        to_condition = self._emit(JUMP)
+        body = len(self.code)
+        
+        def finish():
+            self._patch(to_condition, a=len(self.code))
+            self._compile_branch(node.condition, BACK_EDGE, body)
+            self.loop_costs.append(len(self.code) - body)
+        
+        self.pending.append(finish)
+        self.pending.extend(reversed(node.body))
+    
+    def _compile_if(self, node: IfNode):
+        self._compile_branch(node.condition, BRANCH_FALSE, None)
+        to_else = len(self.code) - 1
+        
+        if not node.else_body:
+            self.pending.append(lambda: self._patch(to_else, c=len(self.code)))
+            self.pending.extend(reversed(node.then_body))
+            return
+        
+        to_end = []
+        
+        def begin_else():
+            to_end.append(self._emit(JUMP))
+            self._patch(to_else, c=len(self.code))
+        
+        self.pending.append(lambda: self._patch(to_end[0], a=len(self.code)))
+        self.pending.extend(reversed(node.else_body))
+        self.pending.append(begin_else)
+        self.pending.extend(reversed(node.then_body))
+    
+    def _compile_branch(self, condition: BinaryOpNode, branch_ops: dict, target):
+        """Emit a fused compare-and-branch, preceded by whatever its operands need."""
+        left, right, op = self._compile_comparison_operands(condition)
+        opcode = branch_ops[op]
+        if opcode == LOOP_LT or opcode == LOOP_EQ:
+            # Loop back-edges also carry the loop index, so fuel can be charged.
+            self._emit(opcode, left[0], right[0], (target, len(self.loop_costs)))
+        else:
+            self._emit(opcode, left[0], right[0], target or 0)
+        self._release(left[0], left[2])
+        self._release(right[0], right[2])
+    
+    def _compile_comparison_operands(self, node: BinaryOpNode):
+        left = self._compile_expression(node.left)
+        right = self._bool_literal(node, left)
+        if right is None:
+            right = self._compile_expression(node.right)
+        return self._order_comparison(node, left, right)
+    
+    def _bool_literal(self, node: BinaryOpNode, left):
+        if left[1] is BOOL and type(node.right) is NumberNode:
+            # In a chained comparison like a < b == 1, LLVM reads the literal as an i1, keeping its low bit.
+            return self._constant(node.right.value & 1), BOOL, False
+        return None
+    
+    def _order_comparison(self, node: BinaryOpNode, left, right):
+        if left[1] is BOOL and node.op == '<':
+            # Signed i1: true is -1, so a < b exactly when a is true and b is false.
+            return right, left, '<'
+        return left, right, node.op
+    
+    def _compile_expression(self, node):
+        """Returns (slot, kind, owned), where owned means the slot is a temporary."""
+        node_type = type(node)
+        if node_type is NumberNode:
+            return self._constant(node.value), INT, False
+        if node_type is IdentifierNode:
+            slot = self.variables.get(node.name)
+            if slot is None:
+                raise NameError(f"Undefined variable: {node.name}")
+            return slot, INT, False
+        if node_type is BinaryOpNode:
+            target = self._temp()
+            kind = self._compile_into(node, target)
+            return target, kind, True
+        raise TypeError(f"Unknown expression type: {node_type}")
+    
+    def _compile_into(self, node, target: int):
+        """Compute node into slot target; returns its kind.
+        
+        Nested operations are compiled from an explicit stack of frames
+        [node, target slot, left operand, right operand], where an operand
+        is (slot, kind, owned) once it has been compiled.
+        """
+        if type(node) is not BinaryOpNode:
+            slot, kind, owned = self._compile_expression(node)
+            self._emit(MOVE, target, slot)
+            self._release(slot, owned)
+            return kind
+        
+        frames = [self._operation_frame(node, target)]
+        while True:
+            frame = frames[-1]
+            node = frame[0]
+            if frame[2] is None:
+                index = 2
+                operand = node.left
+            elif frame[3] is None:
+                index = 3
+                operand = node.right
+                if node.op in COMPARISON_OPS:
+                    frame[3] = self._bool_literal(node, frame[2])
+                    if frame[3] is not None:
+                        continue
+            else:
+                frames.pop()
+                kind = self._emit_operation(*frame)
+                if not frames:
+                    return kind
+                parent = frames[-1]
+                parent[2 if parent[2] is None else 3] = frame[1], kind, True
+                continue
+            
+            if type(operand) is BinaryOpNode:
+                frames.append(self._operation_frame(operand, self._temp()))
+            else:
+                frame[index] = self._compile_expression(operand)
+    
+    def _operation_frame(self, node: BinaryOpNode, target: int) -> list:
+        if node.op not in COMPARISON_OPS and node.op not in ARITHMETIC_OPS:
+            raise ValueError(f"Unknown operator: {node.op}")
+        return [node, target, None, None]
+    
+    def _emit_operation(self, node: BinaryOpNode, target: int, left, right):
+        if node.op in COMPARISON_OPS:
+            left, right, op = self._order_comparison(node, left, right)
+            self._emit(COMPARISON_OPS[op], target, left[0], right[0])
+            kind = BOOL
+        else:
+            self._emit(ARITHMETIC_OPS[node.op], target, left[0], right[0])
+            kind = INT
+        self._release(left[0], left[2])
+        self._release(right[0], right[2])
+        return kind
+
+
+def compile_program(ast: ProgramNode) -> Program:
+    return BytecodeCompiler().compile(ast)
+
+
+def _flush(out: bytearray, output):
+    if output is not None:
+        output.write(out)
+    else:
+        view = memoryview(out)
+        while view:
+            view = view[os.write(1, view):]
+
+
+def run_program(program: Program, output=None, fuel: int = None) -> int:
+    """Run program; output is an OutputCapture or None for fd 1.
+    
+    With fuel, the run stops with OutOfFuel once loops have executed about
+    that many instructions. Nothing is written in that case, since all
+    output is held back until the program finishes.
+    """
+    code = program.code
+    slots = list(program.slots)
+    strings = program.strings
+    loop_costs = program.loop_costs
+    out = bytearray()
+    hold = fuel is not None
+    if fuel is None:
+        fuel = -1
+    
+    if output is None:
+        sys.stdout.flush()
+    
+    pc = 0
+    end = len(code)
+    while pc < end:
+        op, a, b, c = code[pc]
+        pc += 1
+        if op == LOOP_LT:
+            if slots[a] < slots[b]:
+                pc, loop = c
+                if fuel >= 0:
+                    fuel -= loop_costs[loop]
+                    if fuel < 0:
+                        raise OutOfFuel()
+        elif op == ADD:
+            value = slots[b] + slots[c]
+            slots[a] = value if INT64_MIN <= value <= INT64_MAX else wrap_i64(value)
+        elif op == SUB:
+            value = slots[b] - slots[c]
+            slots[a] = value if INT64_MIN <= value <= INT64_MAX else wrap_i64(value)
+        elif op == MOVE:
+            slots[a] = slots[b]
+        elif op == BR_GE:
+            if not slots[a] < slots[b]:
+                pc = c
+        elif op == BR_NE:
+            if slots[a] != slots[b]:
+                pc = c
+        elif op == JUMP:
+            pc = a
+        elif op == MUL:
+            value = slots[b] * slots[c]
+            slots[a] = value if INT64_MIN <= value <= INT64_MAX else wrap_i64(value)
+        elif op == DIV:
+            left = slots[b]
+            right = slots[c]
+            if right == 0 or (left == INT64_MIN and right == -1):
+                # The program ends here, keeping what it printed so far.
+                _flush(out, output)
+                return DIVISION_ERROR_EXIT_CODE
+            quotient = abs(left) // abs(right)
+            slots[a] = quotient if (left < 0) == (right < 0) else -quotient
+        elif op == SHOW_INT:
+            out += b"%d\n" % slots[a]
+            if not hold and len(out) >= FLUSH_SIZE:
+                _flush(out, output)
+                out = bytearray()
+        elif op == SHOW_STR:
+            out += strings[a]
+            if not hold and len(out) >= FLUSH_SIZE:
+                _flush(out, output)
+                out = bytearray()
+        elif op == LOOP_EQ:
+            if slots[a] == slots[b]:
+                pc, loop = c
+                if fuel >= 0:
+                    fuel -= loop_costs[loop]
+                    if fuel < 0:
+                        raise OutOfFuel()
+        elif op == LT:
+            slots[a] = int(slots[b] < slots[c])
+        elif op == EQ:
+            slots[a] = int(slots[b] == slots[c])
+        elif op == BR_LT:
+            if slots[a] < slots[b]:
+                pc = c
+        elif op == BR_EQ:
+            if slots[a] == slots[b]:
+                pc = c
+    
+    _flush(out, output)
+    return 0
+
+
+# About as many instructions as the interpreter runs in the time a JIT
+# compile takes (~25 ms), so falling back never costs more than twice the
+# JIT alone.
+AUTO_FUEL = 75000
+
+# Loop-free programs run each statement once, so they are always interpreted
+# unless they are this large.
+MAX_INTERPRETED_NODES = 200000
+
+
+def has_loops(statements) -> bool:
+    return any(type(node) is LoopNode for block in iter_blocks(statements) for node in block)
+
+
+def choose_backend(ast: ProgramNode) -> str:
+    """Pick "interp", "interp-fuel" or "jit" for a program.
+    
+    Loop-free programs are interpreted outright. Programs with loops get
+    "interp-fuel": interpreted with AUTO_FUEL and rerun on the JIT if that
+    runs out, which is safe because a program's only effect is its output.
+    """
+    if count_ast_nodes(ast) > MAX_INTERPRETED_NODES:
+        return "jit"
+    return "interp-fuel" if has_loops(ast.statements) else "interp"
@@ -1,8 +1,58 @@
-from tokens import Token, TokenType, KEYWORDS
+import re
+from itertools import islice
+
+from tokens import TokenType, TokenBuffer, KEYWORDS
+
+
+# Leading indentation is spaces followed by tabs; a tab counts as 4 columns.
+INDENT_RE = re.compile(r' *(\t*)')
+
+# One alternative per token class. Trailing blanks are consumed together
+# with the token, so most tokens cost a single match.
+TOKEN_RE = re.compile(r"""
+      (?P<NEWLINE>\n)
+    | (?:
+          (?P<NAME>[^\W\d]\w*)
+        | (?P<NUMBER>\d+)
+        | (?P<COMMENT>//[^\n]*)
+        | (?P<OP>==|[-+*/<=:])
+        | (?P<STRING>"(?:\\"|[^"])*"?|'(?:\\'|[^'])*'?)
+      )[ \t]*
+    | (?P<SPACE>[ \t]+)
+""", re.VERBOSE)
+
+# Number of lines pulled from a streamed source per scanning chunk.
+CHUNK_LINES = 4096
+
+OPERATORS = {
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.STAR,
+    '/': TokenType.SLASH,
+    '<': TokenType.LESS,
+    '==': TokenType.EQUAL_EQUAL,
+    '=': TokenType.EQUAL,
+    ':': TokenType.COLON,
+}
+
+# Integer type codes used when writing TokenBuffer columns.
+KEYWORD_CODES = {text: token_type.value for text, token_type in KEYWORDS.items()}
+OPERATOR_CODES = {text: token_type.value for text, token_type in OPERATORS.items()}
 
 
 class Lexer:
-    def __init__(self, source: str):
+    """Turns Xlang source into tokens.
+    
+    source is either the whole program as a string or an iterable of text
+    (typically an open file, yielding lines). Iterables are scanned a chunk
+    of lines at a time, so iter_buffers() and iter_tokens() can stream
+    tokens from inputs of any length.
+    
+    The scanner writes straight into columnar TokenBuffers; Token objects
+    are only created for callers that ask for them (tokenize, iter_tokens).
+    """
+    
+    def __init__(self, source):
         self.source = source
         self.pos = 0
         self.line = 1
@@ -10,175 +60,172 @@ class Lexer:
         self.tokens = []
         self.at_line_start = True
     
-    def current_char(self):
-        if self.pos >= len(self.source):
-            return None
-        return self.source[self.pos]
-    
-    def peek_char(self):
-        if self.pos + 1 >= len(self.source):
-            return None
-        return self.source[self.pos + 1]
-    
-    def advance(self):
-        char = self.current_char()
-        self.pos += 1
-        if char == '\n':
-            self.line += 1
-        return char
-    
-    def skip_comment(self):
-        while self.current_char() is not None and self.current_char() != '\n':
-            self.advance()
-    
-    def read_string(self):
-        quote = self.advance()
-        result = ""
-        while self.current_char() is not None and self.current_char() != quote:
-            if self.current_char() == '\\' and self.peek_char() == quote:
-                self.advance()
-                result += self.advance()
-            else:
-                result += self.advance()
-        if self.current_char() == quote:
-            self.advance()
-        return result
-    
-    def read_number(self):
-        result = ""
-        while self.current_char() is not None and self.current_char().isdigit():
-            result += self.advance()
-        return int(result)
-    
-    def read_identifier(self):
-        result = ""
-        while self.current_char() is not None and (self.current_char().isalnum() or self.current_char() == '_'):
-            result += self.advance()
-        return result
-    
-    def count_indent(self):
-        count = 0
-        while self.current_char() == ' ':
-            self.advance()
-            count += 1
-        while self.current_char() == '\t':
-            self.advance()
-            count += 4
-        return count
-    
-    def handle_indentation(self, indent):
+    def handle_indentation(self, indent, buffer: TokenBuffer):
         current_indent = self.indent_stack[-1]
         
         if indent > current_indent:
             self.indent_stack.append(indent)
-            self.tokens.append(Token(TokenType.INDENT, indent, self.line))
+            buffer.append(TokenType.INDENT.value, indent, self.line)
         elif indent < current_indent:
             while self.indent_stack and self.indent_stack[-1] > indent:
                 self.indent_stack.pop()
-                self.tokens.append(Token(TokenType.DEDENT, indent, self.line))
+                buffer.append(TokenType.DEDENT.value, indent, self.line)
     
-    def tokenize(self):
-        while self.current_char() is not None:
-            if self.at_line_start:
-                if self.current_char() == '\n':
-                    self.advance()
-                    continue
-                if self.current_char() == '/' and self.peek_char() == '/':
-                    self.skip_comment()
-                    continue
+    @staticmethod
+    def string_closed(text: str) -> bool:
+        # A backslash only escapes the quote character, so the string is
+        # closed exactly when it ends in an unescaped quote.
+        return len(text) > 1 and text[-1] == text[0] and text[-2] != '\\'
+    
+    def read_string(self, text: str) -> str:
+        quote = text[0]
+        value = text[1:-1] if self.string_closed(text) else text[1:]
+        if '\\' in value:
+            value = value.replace('\\' + quote, quote)
+        return value
+    
+    def _chunks(self):
+        if isinstance(self.source, str):
+            yield self.source
+            return
+        
+        # Only hand out complete lines, so that the one token that can span
+        # lines (a string literal) is the only one that can cross a chunk.
+        pieces = iter(self.source)
+        carry = ""
+        while True:
+            block = "".join(islice(pieces, CHUNK_LINES))
+            if not block:
+                if carry:
+                    yield carry
+                return
+            block = carry + block
+            cut = block.rfind('\n') + 1
+            carry = block[cut:]
+            if cut:
+                yield block[:cut]
+    
+    def iter_buffers(self):
+        """Yield one TokenBuffer per scanned chunk (a single one for strings)."""
+        line = self.line
+        at_line_start = self.at_line_start
+        match_indent = INDENT_RE.match
+        match_token = TOKEN_RE.match
+        keyword_codes = KEYWORD_CODES
+        operator_codes = OPERATOR_CODES
+        IDENTIFIER = TokenType.IDENTIFIER.value
+        NEWLINE = TokenType.NEWLINE.value
+        NUMBER = TokenType.NUMBER.value
+        STRING = TokenType.STRING.value
+        
+        pending = None
+        chunks = self._chunks()
+        for source in chunks:
+            pos = 0
+            end = len(source)
+            buffer = TokenBuffer()
+            types_append = buffer.types.append
+            lines_append = buffer.lines.append
+            ids_append = buffer.value_ids.append
+            value_id = buffer.value_index.get
+            intern = buffer.intern
+            newline_id = intern('\\n')
+            
+            while pos < end:
+                if at_line_start:
+                    match = match_indent(source, pos)
+                    pos = match.end()
+                    if pos >= end:
+                        break
                     
-                indent = self.count_indent()
+                    char = source[pos]
+                    if char == '\n':
+                        pos += 1
+                        line += 1
+                        continue
+                    if char == '/' and source.startswith('//', pos):
+                        pos = source.find('\n', pos)
+                        if pos < 0:
+                            pos = end
+                        continue
+                    
+                    spaces = match.start(1) - match.start()
+                    tabs = pos - match.start(1)
+                    self.line = line
+                    self.handle_indentation(spaces + 4 * tabs, buffer)
+                    at_line_start = False
+                
+                match = match_token(source, pos)
+                if match is None:
+                    raise SyntaxError(f"Unexpected character '{source[pos]}' at line {line}")
+                pos = match.end()
+                kind = match.lastgroup
                 
-                if self.current_char() == '\n':
-                    self.advance()
+                if kind == 'NAME':
+                    text = match.group(kind)
+                    types_append(keyword_codes.get(text, IDENTIFIER))
+                elif kind == 'NEWLINE':
+                    types_append(NEWLINE)
+                    lines_append(line)
+                    ids_append(newline_id)
+                    line += 1
+                    at_line_start = True
                     continue
-                if self.current_char() == '/' and self.peek_char() == '/':
-                    self.skip_comment()
+                elif kind == 'OP':
+                    text = match.group(kind)
+                    types_append(operator_codes[text])
+                elif kind == 'NUMBER':
+                    text = int(match.group(kind))
+                    types_append(NUMBER)
+                elif kind == 'STRING':
+                    text = match.group(kind)
+                    if pos == end and not self.string_closed(text):
+                        # The literal runs past this chunk: rescan it with the next one.
+                        more = next(chunks, None)
+                        if more is not None:
+                            source = source[match.start():] + more
+                            pos = 0
+                            end = len(source)
+                            continue
+                    line += text.count('\n')
+                    text = self.read_string(text)
+                    types_append(STRING)
+                else:
                     continue
-                if self.current_char() is None:
-                    break
-                    
-                self.handle_indentation(indent)
-                self.at_line_start = False
-            
-            char = self.current_char()
-            
-            if char == '\n':
-                self.tokens.append(Token(TokenType.NEWLINE, '\\n', self.line))
-                self.advance()
-                self.at_line_start = True
-                continue
-            
-            if char in ' \t':
-                self.advance()
-                continue
-            
-            if char == '/' and self.peek_char() == '/':
-                self.skip_comment()
-                continue
-            
-            if char == '"' or char == "'":
-                value = self.read_string()
-                self.tokens.append(Token(TokenType.STRING, value, self.line))
-                continue
-            
-            if char.isdigit():
-                value = self.read_number()
-                self.tokens.append(Token(TokenType.NUMBER, value, self.line))
-                continue
-            
-            if char.isalpha() or char == '_':
-                value = self.read_identifier()
-                token_type = KEYWORDS.get(value, TokenType.IDENTIFIER)
-                self.tokens.append(Token(token_type, value, self.line))
-                continue
-            
-            if char == '+':
-                self.tokens.append(Token(TokenType.PLUS, '+', self.line))
-                self.advance()
-                continue
-            
-            if char == '-':
-                self.tokens.append(Token(TokenType.MINUS, '-', self.line))
-                self.advance()
-                continue
-            
-            if char == '*':
-                self.tokens.append(Token(TokenType.STAR, '*', self.line))
-                self.advance()
-                continue
-            
-            if char == '/':
-                self.tokens.append(Token(TokenType.SLASH, '/', self.line))
-                self.advance()
-                continue
-            
-            if char == '<':
-                self.tokens.append(Token(TokenType.LESS, '<', self.line))
-                self.advance()
-                continue
-            
-            if char == '=' and self.peek_char() == '=':
-                self.tokens.append(Token(TokenType.EQUAL_EQUAL, '==', self.line))
-                self.advance()
-                self.advance()
-                continue
-            
-            if char == '=':
-                self.tokens.append(Token(TokenType.EQUAL, '=', self.line))
-                self.advance()
-                continue
-            
-            if char == ':':
-                self.tokens.append(Token(TokenType.COLON, ':', self.line))
-                self.advance()
-                continue
-            
-            raise SyntaxError(f"Unexpected character '{char}' at line {self.line}")
+                
+                lines_append(line)
+                text_id = value_id(text)
+                ids_append(intern(text) if text_id is None else text_id)
+            
+            self.pos = pos
+            if pending is not None:
+                yield pending
+            pending = buffer
+        
+        self.line = line
+        self.at_line_start = at_line_start
+        
+        if pending is None:
+            pending = TokenBuffer()
         
         while len(self.indent_stack) > 1:
             self.indent_stack.pop()
-            self.tokens.append(Token(TokenType.DEDENT, 0, self.line))
+            pending.append(TokenType.DEDENT.value, 0, self.line)
         
-        self.tokens.append(Token(TokenType.EOF, None, self.line))
+        pending.append(TokenType.EOF.value, None, self.line)
+        yield pending
+    
+    def tokenize_buffer(self) -> TokenBuffer:
+        buffers = self.iter_buffers()
+        result = next(buffers)
+        for buffer in buffers:
+            result.extend(buffer)
+        return result
+    
+    def iter_tokens(self):
+        for buffer in self.iter_buffers():
+            yield from buffer
+    
+    def tokenize(self):
+        self.tokens.extend(self.iter_tokens())
         return self.tokens
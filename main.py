@@ -8,7 +8,7 @@ Compilation Pipeline:
    |
    v
 2. LEXER (lexer.py)
-   - Reads source code character by character
+   - Scans source code with a single compiled token regex
    - Produces stream of tokens (keywords, operators, literals)
    - Handles indentation for block detection
    |
@@ -27,8 +27,9 @@ Compilation Pipeline:
    v
 5. LLVM JIT COMPILER
    - Verifies IR correctness
-   - Optimizes code
+   - Optimizes code (--opt-level 0-3, default 2)
    - Compiles to native machine code
+   - --stats / --stats-json report per-phase times and sizes (stats.py)
    |
    v
 6. CPU EXECUTION
@@ -47,28 +48,50 @@ Xlang Syntax Summary:
 - Blocks end with 'stop' keyword
 """
 
+import argparse
+import json
+import sys
+
 from lexer import Lexer
 from parser import Parser
-from codegen import CodeGenerator
+from config import OPT_LEVELS, DEFAULT_OPT_LEVEL
+from optimizer import optimize_ast
+from stats import CompileStats, NULL_STATS, count_ast_nodes
 
 
-def compile_and_run(source_code: str):
+def compile_and_run(source_code: str, opt_level: int = DEFAULT_OPT_LEVEL, stats: CompileStats = None):
     print("=" * 50)
     print("XLANG COMPILER")
     print("=" * 50)
     
+    if stats is None:
+        stats = NULL_STATS
+    
     print("\n[1] Lexical Analysis...")
-    lexer = Lexer(source_code)
-    tokens = lexer.tokenize()
+    with stats.phase("lex"):
+        lexer = Lexer(source_code)
+        tokens = lexer.tokenize_buffer()
+    stats.count("tokens", len(tokens))
     print(f"    Generated {len(tokens)} tokens")
     
     print("\n[2] Parsing...")
-    parser = Parser(tokens)
-    ast = parser.parse()
+    with stats.phase("parse"):
+        parser = Parser(tokens)
+        ast = parser.parse()
+    if stats is not NULL_STATS:
+        stats.count("ast_nodes", count_ast_nodes(ast))
     print(f"    Generated AST with {len(ast.statements)} top-level statements")
     
+    if opt_level > 0:
+        with stats.phase("optimize_ast"):
+            ast = optimize_ast(ast)
+        if stats is not NULL_STATS:
+            stats.count("optimized_ast_nodes", count_ast_nodes(ast))
+        print(f"    Optimized AST to {len(ast.statements)} top-level statements")
+    
     print("\n[3] Code Generation...")
-    codegen = CodeGenerator()
+    from codegen import CodeGenerator
+    codegen = CodeGenerator(opt_level=opt_level, stats=stats)
     module = codegen.generate(ast)
     print("    Generated LLVM IR")
     
@@ -76,7 +99,7 @@ def compile_and_run(source_code: str):
     codegen.verify()
     print("    Module verified successfully!")
     
-    print("\n[5] JIT Compilation & Execution...")
+    print(f"\n[5] JIT Compilation & Execution (-O{opt_level})...")
     print("-" * 50)
     print("OUTPUT:")
     print("-" * 50)
@@ -110,10 +133,42 @@ stop
 
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Xlang compiler pipeline demo")
+    arg_parser.add_argument("file", nargs="?", help="Xlang source file (default: built-in test program)")
+    arg_parser.add_argument("-O", "--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL,
+                            help="LLVM optimization level (default: %(default)s)")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="Print the time of each compiler phase and token/AST/IR counts")
+    arg_parser.add_argument("--trace-memory", action="store_true",
+                            help="Also record each phase's peak Python memory with tracemalloc (slower)")
+    arg_parser.add_argument("--stats-json", metavar="FILE",
+                            help="Write the statistics as JSON to FILE ('-' for stdout)")
+    args = arg_parser.parse_args()
+    
+    if args.file:
+        with open(args.file, 'r') as f:
+            source = f.read()
+    else:
+        source = TEST_PROGRAM
+    
     print("\nXlang Source Code:")
     print("-" * 50)
-    print(TEST_PROGRAM)
+    print(source)
     print("-" * 50)
     print()
     
-    compile_and_run(TEST_PROGRAM)
+    stats = None
+    if args.stats or args.trace_memory or args.stats_json:
+        stats = CompileStats(trace_memory=args.trace_memory)
+    
+    compile_and_run(source, opt_level=args.opt_level, stats=stats)
+    
+    if args.stats or args.trace_memory:
+        print("\nCompiler statistics:")
+        print(stats.format())
+    if args.stats_json == "-":
+        json.dump(stats.as_dict(), sys.stdout, indent=2)
+        print()
+    elif args.stats_json:
+        with open(args.stats_json, 'w') as f:
+            json.dump(stats.as_dict(), f, indent=2)
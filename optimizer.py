@@ -0,0 +1,456 @@
+"""
+AST-level optimizer run between Parser.parse and CodeGenerator.generate.
+
+- Folds constant arithmetic, and comparisons used as loop/if conditions.
+- Propagates known variable values through straight-line code.
+- Prunes if-branches on constant conditions and loops that never run.
+- Drops stores to variables that are never read.
+
+Type errors (check_types) and undefined variables are reported before
+anything is pruned, so every optimization level rejects the same programs.
+
+Folding follows the generated code exactly: i64 wrap-around arithmetic and
+signed division truncating toward zero. Divisions that would trap at run
+time (by zero, or INT64_MIN / -1) are never folded or removed.
+
+Like the parser and the code generator, every walk here uses an explicit
+stack instead of recursion, so long expressions and deeply nested blocks
+are optimized in linear time.
+"""
+
+from parser import (
+    ProgramNode, MakeNode, ShowNode, LoopNode, IfNode,
+    NumberNode, StringNode, IdentifierNode, BinaryOpNode
+)
+
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+
+def wrap_i64(value: int) -> int:
+    return ((value - INT64_MIN) & 0xFFFFFFFFFFFFFFFF) + INT64_MIN
+
+
+def fold_binary(op: str, left: int, right: int):
+    """Evaluate an arithmetic operator like the generated code, or return None."""
+    if op == '+':
+        return wrap_i64(left + right)
+    elif op == '-':
+        return wrap_i64(left - right)
+    elif op == '*':
+        return wrap_i64(left * right)
+    elif op == '/':
+        if right == 0 or (left == INT64_MIN and right == -1):
+            return None
+        quotient = abs(left) // abs(right)
+        return quotient if (left < 0) == (right < 0) else -quotient
+    return None
+
+
+def compare(op: str, left: int, right: int):
+    if op == '<':
+        return left < right
+    elif op == '==':
+        return left == right
+    return None
+
+
+def is_constant(node) -> bool:
+    return type(node) is NumberNode and INT64_MIN <= node.value <= INT64_MAX
+
+
+def iter_blocks(statements):
+    """Yield statements and every block nested in it, parents before their children."""
+    blocks = [statements]
+    for block in blocks:
+        yield block
+        for node in block:
+            node_type = type(node)
+            if node_type is LoopNode:
+                blocks.append(node.body)
+            elif node_type is IfNode:
+                blocks.append(node.then_body)
+                blocks.append(node.else_body)
+
+
+def iter_children(node):
+    """The nodes directly inside node, in source order."""
+    node_type = type(node)
+    if node_type is BinaryOpNode:
+        return node.left, node.right
+    if node_type is MakeNode or node_type is ShowNode:
+        return node.value,
+    if node_type is LoopNode:
+        return [node.condition] + node.body
+    if node_type is IfNode:
+        return [node.condition] + node.then_body + node.else_body
+    return ()
+
+
+# Value kinds: integers, and comparison results (i1 in generated code).
+INT = "i64"
+BOOL = "i1"
+
+COMPARISON_OPERATORS = ('<', '==')
+
+
+def expression_kind(node) -> str:
+    """The kind of value node computes; raises TypeError if it cannot be computed."""
+    # Post-order, like fold(): an operation is pushed again as (node,) once its operands are on kinds.
+    kinds = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        node_type = type(node)
+        if node_type is BinaryOpNode:
+            stack.append((node,))
+            stack.append(node.right)
+            stack.append(node.left)
+        elif node_type is tuple:
+            node = node[0]
+            right = kinds.pop()
+            left = kinds.pop()
+            if node.op in COMPARISON_OPERATORS:
+                # In a chained comparison like a < b == 1, the literal is read as an i1.
+                if left is not right and not (left is BOOL and type(node.right) is NumberNode):
+                    raise TypeError(f"Cannot compare {left} with {right}")
+                kinds.append(BOOL)
+            else:
+                if left is not INT or right is not INT:
+                    raise TypeError(f"Operator {node.op} needs integer operands")
+                kinds.append(INT)
+        elif node_type is StringNode:
+            raise TypeError("Strings can only be shown")
+        else:
+            kinds.append(INT)
+    return kinds[0]
+
+
+def check_types(statements):
+    """Raise the TypeError of the first ill-typed statement, in source order.
+    
+    Every backend calls this before compiling anything, and the optimizer
+    before pruning, so a program is rejected the same way everywhere.
+    """
+    stack = list(reversed(statements))
+    while stack:
+        node = stack.pop()
+        node_type = type(node)
+        if node_type is MakeNode:
+            if expression_kind(node.value) is not INT:
+                raise TypeError(f"Cannot store a comparison result in variable {node.name}")
+        elif node_type is ShowNode:
+            if type(node.value) is not StringNode:
+                expression_kind(node.value)
+        elif node_type is LoopNode or node_type is IfNode:
+            condition = node.condition
+            if type(condition) is not BinaryOpNode or condition.op not in COMPARISON_OPERATORS:
+                raise TypeError("Loop and if conditions must be comparisons")
+            expression_kind(condition)
+            if node_type is LoopNode:
+                stack.extend(reversed(node.body))
+            else:
+                stack.extend(reversed(node.else_body))
+                stack.extend(reversed(node.then_body))
+
+
+# Stored by a block for a name it made unknown, hiding what enclosing blocks know.
+UNKNOWN = object()
+
+
+class Env:
+    """Known variable values, layered over the Env of the enclosing block.
+    
+    A branch or loop body only records the names it assigns, so entering
+    one costs nothing however many variables the program has.
+    """
+    
+    __slots__ = ('values', 'parent')
+    
+    def __init__(self, parent: 'Env' = None, values: dict = None):
+        self.values = {} if values is None else values
+        self.parent = parent
+    
+    def get(self, name: str):
+        env = self
+        while env is not None:
+            value = env.values.get(name)
+            if value is not None:
+                return None if value is UNKNOWN else value
+            env = env.parent
+        return None
+    
+    def set(self, name: str, value: int):
+        self.values[name] = value
+    
+    def forget(self, name: str):
+        self.values[name] = UNKNOWN
+    
+    def forget_all(self, names):
+        self.values.update(dict.fromkeys(names, UNKNOWN))
+    
+    def merge(self, first: 'Env', second: 'Env'):
+        """Keep what two child Envs agree on, for every name either of them assigned."""
+        values = self.values
+        first_values = first.values
+        second_values = second.values
+        for name in first_values.keys() | second_values.keys():
+            value = first_values.get(name)
+            if value is UNKNOWN:
+                values[name] = UNKNOWN
+                continue
+            if value is None:
+                value = self.get(name)
+            other = second_values.get(name)
+            if other is None:
+                other = self.get(name)
+            values[name] = value if value is not None and value == other else UNKNOWN
+
+
+class ASTOptimizer:
+    def __init__(self):
+        self.made_vars = set()
+        # Names made anywhere in each block of the input, keyed by the block's id().
+        self.block_assignments = {}
+        # Statements still to optimize, as (node, env, result list), and
+        # continuations (callables) that finish an if once both branches are done.
+        self.pending = []
+        
+        self._statement_optimizers = {
+            MakeNode: self._optimize_make,
+            ShowNode: self._optimize_show,
+            LoopNode: self._optimize_loop,
+            IfNode: self._optimize_if,
+        }
+    
+    def optimize(self, ast: ProgramNode) -> ProgramNode:
+        self.block_assignments = self._assigned_names(ast.statements)
+        self.made_vars = self.block_assignments[id(ast.statements)]
+        # Pruning and dead store elimination could hide errors -O0 reports.
+        check_types(ast.statements)
+        self._check_reads(ast.statements)
+        
+        # Every variable starts out as 0 in the entry block.
+        env = Env(values=dict.fromkeys(self.made_vars, 0))
+        statements = self._optimize_block(ast.statements, env)
+        statements = self._eliminate_dead_stores(statements)
+        return ProgramNode(statements)
+    
+    def _assigned_names(self, statements) -> dict:
+        """Map the id() of statements and of every block nested in it to the names made anywhere inside."""
+        assignments = {}
+        # Innermost blocks first, so nested blocks' names are ready for their parents.
+        for block in reversed(list(iter_blocks(statements))):
+            names = set()
+            for node in block:
+                node_type = type(node)
+                if node_type is MakeNode:
+                    names.add(node.name)
+                elif node_type is LoopNode:
+                    names |= assignments[id(node.body)]
+                elif node_type is IfNode:
+                    names |= assignments[id(node.then_body)]
+                    names |= assignments[id(node.else_body)]
+            assignments[id(block)] = names
+        return assignments
+    
+    def _read_names(self, node, names: set):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if type(node) is IdentifierNode:
+                names.add(node.name)
+            else:
+                stack.extend(iter_children(node))
+        return names
+    
+    def _check_reads(self, statements):
+        # Report undefined variables before pruning could hide them, in the
+        # same order code generation would.
+        for node in statements:
+            for name in self._ordered_reads(node):
+                if name not in self.made_vars:
+                    raise NameError(f"Undefined variable: {name}")
+    
+    def _ordered_reads(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if type(node) is IdentifierNode:
+                yield node.name
+            else:
+                stack.extend(reversed(iter_children(node)))
+    
+    def _may_trap(self, node) -> bool:
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if type(node) is not BinaryOpNode:
+                continue
+            if node.op == '/' and not (is_constant(node.right) and node.right.value not in (0, -1)):
+                return True
+            stack.append(node.right)
+            stack.append(node.left)
+        return False
+    
+    def fold(self, node, env: Env):
+        # Post-order, like CodeGenerator._generate_expression: an operation
+        # is pushed again as (node,) to combine its folded operands.
+        values = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            
+            if node_type is BinaryOpNode:
+                stack.append((node,))
+                stack.append(node.right)
+                stack.append(node.left)
+            elif node_type is tuple:
+                node = node[0]
+                right = values.pop()
+                left = values.pop()
+                values.append(self._fold_operation(node, left, right))
+            elif node_type is IdentifierNode:
+                value = env.get(node.name)
+                values.append(node if value is None else NumberNode(value))
+            else:
+                values.append(node)
+        return values[0]
+    
+    def _fold_operation(self, node: BinaryOpNode, left, right):
+        if is_constant(left) and is_constant(right):
+            # Comparisons yield i1 values, so they are only folded as
+            # conditions (see fold_condition).
+            value = fold_binary(node.op, left.value, right.value)
+            if value is not None:
+                return NumberNode(value)
+        if left is node.left and right is node.right:
+            return node
+        return BinaryOpNode(left, node.op, right)
+    
+    def fold_condition(self, node, env: Env):
+        """Return (folded condition, True/False if known else None)."""
+        folded = self.fold(node, env)
+        if (type(folded) is BinaryOpNode and is_constant(folded.left)
+                and is_constant(folded.right)):
+            return folded, compare(folded.op, folded.left.value, folded.right.value)
+        return folded, None
+    
+    def _optimize_block(self, statements, env: Env) -> list:
+        result = []
+        pending = self.pending
+        self._push_block(statements, env, result)
+        while pending:
+            item = pending.pop()
+            if callable(item):
+                item()
+                continue
+            node, env, result_list = item
+            optimizer = self._statement_optimizers.get(type(node))
+            if optimizer is None:
+                result_list.append(node)
+            else:
+                optimizer(node, env, result_list)
+        return result
+    
+    def _push_block(self, statements, env: Env, result: list):
+        """Schedule statements to be optimized with env, appending to result."""
+        self.pending.extend((node, env, result) for node in reversed(statements))
+    
+    def _optimize_make(self, node: MakeNode, env: Env, result: list):
+        value = self.fold(node.value, env)
+        if is_constant(value):
+            env.set(node.name, value.value)
+        else:
+            env.forget(node.name)
+        result.append(MakeNode(node.name, value, node.line))
+    
+    def _optimize_show(self, node: ShowNode, env: Env, result: list):
+        result.append(ShowNode(self.fold(node.value, env), node.line))
+    
+    def _optimize_if(self, node: IfNode, env: Env, result: list):
+        condition, known = self.fold_condition(node.condition, env)
+        
+        if known is True:
+            self._push_block(node.then_body, env, result)
+            return
+        if known is False:
+            self._push_block(node.else_body, env, result)
+            return
+        
+        then_env = Env(env)
+        else_env = Env(env)
+        then_body = []
+        else_body = []
+        
+        def merge():
+            # After the merge a value is only known if both branches agree on
+            # it; names neither branch assigned keep what env knows.
+            env.merge(then_env, else_env)
+            
+            if then_body or else_body or self._may_trap(condition):
+                result.append(IfNode(condition, then_body, else_body, node.line))
+        
+        self.pending.append(merge)
+        self._push_block(node.else_body, else_env, else_body)
+        self._push_block(node.then_body, then_env, then_body)
+    
+    def _optimize_loop(self, node: LoopNode, env: Env, result: list):
+        _, runs = self.fold_condition(node.condition, env)
+        if runs is False:
+            return
+        
+        # Anything the body assigns is unknown on every iteration and after the loop.
+        env.forget_all(self.block_assignments[id(node.body)])
+        
+        condition, _ = self.fold_condition(node.condition, env)
+        # Nothing else is added to result until the body is done, so the loop can go in now.
+        loop = LoopNode(condition, [], node.line)
+        result.append(loop)
+        self._push_block(node.body, Env(env), loop.body)
+    
+    def _eliminate_dead_stores(self, statements) -> list:
+        while True:
+            live = set()
+            for node in statements:
+                self._read_names(node, live)
+            pruned, changed = self._drop_stores(statements, live)
+            if not changed:
+                return statements
+            statements = pruned
+    
+    def _drop_stores(self, statements, live: set):
+        # Blocks are rewritten innermost first, so every nested block's
+        # (statements, changed) is ready when its parent needs it.
+        rewritten = {}
+        for block in reversed(list(iter_blocks(statements))):
+            result = []
+            changed = False
+            for node in block:
+                node_type = type(node)
+                if node_type is MakeNode:
+                    if node.name not in live and not self._may_trap(node.value):
+                        changed = True
+                        continue
+                elif node_type is LoopNode:
+                    body, body_changed = rewritten[id(node.body)]
+                    if body_changed:
+                        node = LoopNode(node.condition, body, node.line)
+                        changed = True
+                elif node_type is IfNode:
+                    then_body, then_changed = rewritten[id(node.then_body)]
+                    else_body, else_changed = rewritten[id(node.else_body)]
+                    if then_changed or else_changed:
+                        changed = True
+                        if not then_body and not else_body and not self._may_trap(node.condition):
+                            continue
+                        node = IfNode(node.condition, then_body, else_body, node.line)
+                result.append(node)
+            rewritten[id(block)] = result, changed
+        return rewritten[id(statements)]
+
+
+def optimize_ast(ast: ProgramNode) -> ProgramNode:
+    return ASTOptimizer().optimize(ast)
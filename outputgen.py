@@ -0,0 +1,223 @@
+"""
+Native output runtime emitted into every generated module.
+
+show statements append to a 64 KiB buffer inside the module: strings are
+copied from interned constants and integers are formatted in place, so no
+printf format parsing or stdio locking happens per call. The buffer is
+handed to the output sink when it fills up and when the entry function
+returns.
+
+The sink is an exported function pointer global, <entry>.output. While it
+is null the buffer goes straight to file descriptor 1 with write(2), which
+is also what AOT-built executables do. The Python side can point it at an
+OutputCapture (runtime.py) to collect a run's output in memory instead.
+"""
+
+from llvmlite import ir
+
+from runtime import output_symbol
+
+
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+# Longest formatted i64 ("-9223372036854775808") plus the newline.
+MAX_INT_TEXT = 21
+
+STDOUT_FD = 1
+
+
+class OutputRuntime:
+    """Declares the output buffer and the functions show statements call.
+    
+    write_bytes(ptr, length) appends raw bytes, write_int(value) appends a
+    decimal i64 and a newline, and flush() hands the buffer to the sink.
+    All of them are internal to the module except the sink global, so any
+    number of modules can be loaded into one engine side by side. They are
+    never inlined: every show would get its own copy of the digit loop,
+    and optimization time and code size would grow with the program.
+    """
+    
+    def __init__(self, module: ir.Module, entry_name: str):
+        self.module = module
+        self.i8 = ir.IntType(8)
+        self.i32 = ir.IntType(32)
+        self.i64 = ir.IntType(64)
+        self.char_ptr_type = self.i8.as_pointer()
+        
+        buffer_type = ir.ArrayType(self.i8, OUTPUT_BUFFER_SIZE)
+        self.buffer = self._global(buffer_type, "xlang.out.buf", ir.Constant(buffer_type, None))
+        self.length = self._global(self.i64, "xlang.out.len", ir.Constant(self.i64, 0))
+        
+        sink_type = ir.FunctionType(ir.VoidType(), [self.char_ptr_type, self.i64]).as_pointer()
+        self.sink = ir.GlobalVariable(module, sink_type, name=output_symbol(entry_name))
+        self.sink.initializer = ir.Constant(sink_type, None)
+        
+        write_type = ir.FunctionType(self.i64, [self.i32, self.char_ptr_type, self.i64])
+        self.sys_write = ir.Function(module, write_type, name="write")
+        self.memcpy = module.declare_intrinsic('llvm.memcpy', [self.char_ptr_type, self.char_ptr_type, self.i64])
+        
+        self.emit = self._define_emit()
+        self.flush = self._define_flush()
+        self.write_bytes = self._define_write_bytes()
+        self.write_int = self._define_write_int()
+    
+    def _global(self, value_type, name: str, initializer):
+        variable = ir.GlobalVariable(self.module, value_type, name=name)
+        variable.linkage = 'internal'
+        variable.initializer = initializer
+        return variable
+    
+    def _function(self, name: str, return_type, arg_types):
+        func = ir.Function(self.module, ir.FunctionType(return_type, arg_types), name=name)
+        func.linkage = 'internal'
+        func.attributes.add('noinline')
+        return func, ir.IRBuilder(func.append_basic_block(name="entry"))
+    
+    def _buffer_at(self, builder, offset):
+        return builder.gep(self.buffer, [ir.Constant(self.i32, 0), offset], inbounds=True)
+    
+    def _copy(self, builder, dest, src, length):
+        builder.call(self.memcpy, [dest, src, length, ir.Constant(ir.IntType(1), 0)])
+    
+    def _define_emit(self):
+        # emit(data, length): pass bytes to the sink, or write(2) them all to fd 1.
+        func, builder = self._function("xlang.out.emit", ir.VoidType(), [self.char_ptr_type, self.i64])
+        data, length = func.args
+        
+        call_sink = func.append_basic_block(name="sink")
+        write_cond = func.append_basic_block(name="write.cond")
+        write_body = func.append_basic_block(name="write.body")
+        done = func.append_basic_block(name="done")
+        
+        sink = builder.load(self.sink, name="sink")
+        offset = builder.alloca(self.i64, name="offset")
+        builder.store(ir.Constant(self.i64, 0), offset)
+        null = ir.Constant(sink.type, None)
+        builder.cbranch(builder.icmp_unsigned('==', sink, null), write_cond, call_sink)
+        
+        builder.position_at_end(call_sink)
+        builder.call(sink, [data, length])
+        builder.branch(done)
+        
+        builder.position_at_end(write_cond)
+        written = builder.load(offset, name="written")
+        remaining = builder.sub(length, written, name="remaining")
+        builder.cbranch(builder.icmp_signed('>', remaining, ir.Constant(self.i64, 0)), write_body, done)
+        
+        builder.position_at_end(write_body)
+        chunk = builder.gep(data, [written], inbounds=True)
+        count = builder.call(self.sys_write, [ir.Constant(self.i32, STDOUT_FD), chunk, remaining], name="count")
+        builder.store(builder.add(written, count), offset)
+        # Give up on errors rather than spin; there is nowhere to report them.
+        builder.cbranch(builder.icmp_signed('>', count, ir.Constant(self.i64, 0)), write_cond, done)
+        
+        builder.position_at_end(done)
+        builder.ret_void()
+        return func
+    
+    def _define_flush(self):
+        func, builder = self._function("xlang.out.flush", ir.VoidType(), [])
+        
+        emit = func.append_basic_block(name="emit")
+        done = func.append_basic_block(name="done")
+        
+        length = builder.load(self.length, name="len")
+        builder.cbranch(builder.icmp_unsigned('==', length, ir.Constant(self.i64, 0)), done, emit)
+        
+        builder.position_at_end(emit)
+        builder.call(self.emit, [self._buffer_at(builder, ir.Constant(self.i64, 0)), length])
+        builder.store(ir.Constant(self.i64, 0), self.length)
+        builder.branch(done)
+        
+        builder.position_at_end(done)
+        builder.ret_void()
+        return func
+    
+    def _reserve(self, func, builder, length):
+        """Flush unless length more bytes fit; returns the block to continue in."""
+        spill = func.append_basic_block(name="spill")
+        append = func.append_basic_block(name="append")
+        
+        used = builder.load(self.length, name="used")
+        needed = builder.add(used, length, name="needed")
+        capacity = ir.Constant(self.i64, OUTPUT_BUFFER_SIZE)
+        builder.cbranch(builder.icmp_unsigned('>', needed, capacity), spill, append)
+        
+        builder.position_at_end(spill)
+        builder.call(self.flush, [])
+        return spill, append
+    
+    def _define_write_bytes(self):
+        func, builder = self._function("xlang.out.bytes", ir.VoidType(), [self.char_ptr_type, self.i64])
+        data, length = func.args
+        
+        spill, append = self._reserve(func, builder, length)
+        direct = func.append_basic_block(name="direct")
+        builder.position_at_end(spill)
+        capacity = ir.Constant(self.i64, OUTPUT_BUFFER_SIZE)
+        builder.cbranch(builder.icmp_unsigned('>', length, capacity), direct, append)
+        
+        # Anything larger than the whole buffer goes out as is.
+        builder.position_at_end(direct)
+        builder.call(self.emit, [data, length])
+        builder.ret_void()
+        
+        builder.position_at_end(append)
+        used = builder.load(self.length, name="used")
+        self._copy(builder, self._buffer_at(builder, used), data, length)
+        builder.store(builder.add(used, length), self.length)
+        builder.ret_void()
+        return func
+    
+    def _define_write_int(self):
+        func, builder = self._function("xlang.out.int", ir.VoidType(), [self.i64])
+        value, = func.args
+        
+        scratch_size = MAX_INT_TEXT - 1
+        scratch_type = ir.ArrayType(self.i8, scratch_size)
+        scratch = builder.alloca(scratch_type, name="digits")
+        pos = builder.alloca(self.i64, name="pos")
+        rest = builder.alloca(self.i64, name="rest")
+        
+        spill, append = self._reserve(func, builder, ir.Constant(self.i64, MAX_INT_TEXT))
+        builder.position_at_end(spill)
+        builder.branch(append)
+        
+        digit_loop = func.append_basic_block(name="digit")
+        copy = func.append_basic_block(name="copy")
+        
+        # Work on the unsigned magnitude so INT64_MIN needs no special case.
+        builder.position_at_end(append)
+        zero = ir.Constant(self.i64, 0)
+        ten = ir.Constant(self.i64, 10)
+        negative = builder.icmp_signed('<', value, zero, name="negative")
+        magnitude = builder.select(negative, builder.sub(zero, value), value, name="magnitude")
+        builder.store(magnitude, rest)
+        builder.store(ir.Constant(self.i64, scratch_size), pos)
+        builder.branch(digit_loop)
+        
+        builder.position_at_end(digit_loop)
+        current = builder.load(rest, name="rest.val")
+        digit = builder.trunc(builder.urem(current, ten), self.i8)
+        index = builder.sub(builder.load(pos), ir.Constant(self.i64, 1), name="index")
+        slot = builder.gep(scratch, [ir.Constant(self.i32, 0), index], inbounds=True)
+        builder.store(builder.add(digit, ir.Constant(self.i8, ord('0'))), slot)
+        builder.store(index, pos)
+        quotient = builder.udiv(current, ten, name="quotient")
+        builder.store(quotient, rest)
+        builder.cbranch(builder.icmp_unsigned('!=', quotient, zero), digit_loop, copy)
+        
+        # The sign is always stored and only kept (by advancing past it) when negative.
+        builder.position_at_end(copy)
+        used = builder.load(self.length, name="used")
+        builder.store(ir.Constant(self.i8, ord('-')), self._buffer_at(builder, used))
+        start = builder.add(used, builder.zext(negative, self.i64), name="start")
+        first = builder.load(pos, name="first")
+        count = builder.sub(ir.Constant(self.i64, scratch_size), first, name="count")
+        digits = builder.gep(scratch, [ir.Constant(self.i32, 0), first], inbounds=True)
+        self._copy(builder, self._buffer_at(builder, start), digits, count)
+        end = builder.add(start, count, name="end")
+        builder.store(ir.Constant(self.i8, ord('\n')), self._buffer_at(builder, end))
+        builder.store(builder.add(end, ir.Constant(self.i64, 1)), self.length)
+        builder.ret_void()
+        return func
@@ -0,0 +1,193 @@
+"""
+Parallel lexing of large sources.
+
+The source is cut into chunks at newline boundaries and each chunk is
+lexed by its own worker process, as if it were a whole program starting
+at the chunk's line number. A worker does not know the indentation the
+chunk starts at, so instead of INDENT/DEDENT tokens it reports the width
+and number of every line together with the position of its first token. The
+merge pass then replays those widths through Lexer.handle_indentation on
+one indent stack, which produces exactly the serial lexer's tokens.
+
+A string literal may span lines, so a cut can land inside one. The chunk
+before such a cut ends in the middle of a token, which the worker reports
+(the lexer is not back at the start of a line) along with the length of
+that open literal. The merge keeps the chunk's tokens before the literal,
+finds where the literal really ends, and lexes again from the literal's
+first quote to the end of the chunk it ends in, discarding the results of
+the chunks in between, which were scanned from the wrong state. So the
+rescan costs a few passes over the literal, however many chunks it spans.
+Syntax errors are likewise only raised once the chunk that reported them
+is known to have been scanned from a real line start.
+
+    tokens = tokenize_parallel(source)            # a TokenBuffer
+    tokens = tokenize_source(source)              # serial below PARALLEL_MIN_SIZE
+"""
+
+import os
+from array import array
+
+from lexer import Lexer, TOKEN_RE
+from tokens import TokenType, TokenBuffer
+
+
+# Sources smaller than this are lexed serially by tokenize_source; below it
+# starting the worker processes costs more than it saves.
+PARALLEL_MIN_SIZE = 16 << 20
+
+# Target chunk size; every worker gets several chunks, so an uneven chunk
+# does not leave the others idle.
+CHUNK_SIZE = 4 << 20
+
+
+class _ChunkLexer(Lexer):
+    """Lexes one chunk, recording each line's indentation instead of emitting INDENT/DEDENT."""
+    
+    def __init__(self, source: str, line: int, at_line_start: bool = True):
+        super().__init__(source)
+        self.line = line
+        self.at_line_start = at_line_start
+        self.string_length = 0
+        self.indent_positions = array('i')
+        self.indent_widths = array('i')
+        # Not always the line of the first token: a string token gets the line it ends on.
+        self.indent_lines = array('i')
+    
+    def handle_indentation(self, indent, buffer: TokenBuffer):
+        self.indent_positions.append(len(buffer))
+        self.indent_widths.append(indent)
+        self.indent_lines.append(self.line)
+    
+    def read_string(self, text: str) -> str:
+        # The last literal read is the open one when the chunk ends inside a string.
+        self.string_length = len(text)
+        return super().read_string(text)
+
+
+class _ChunkResult:
+    __slots__ = ('types', 'lines', 'value_ids', 'values', 'indent_positions', 'indent_widths',
+                 'indent_lines', 'end_line', 'open', 'open_length', 'error')
+    
+    def __init__(self, buffer: TokenBuffer, lexer: _ChunkLexer, open: bool, error: str = None):
+        self.types = buffer.types
+        self.lines = buffer.lines
+        self.value_ids = buffer.value_ids
+        self.values = buffer.values
+        self.indent_positions = lexer.indent_positions
+        self.indent_widths = lexer.indent_widths
+        self.indent_lines = lexer.indent_lines
+        self.end_line = lexer.line
+        self.open = open
+        # Length of the literal left open at the end of the chunk.
+        self.open_length = lexer.string_length if open else 0
+        self.error = error
+
+
+def _lex_chunk(source: str, line: int, at_line_start: bool = True) -> _ChunkResult:
+    lexer = _ChunkLexer(source, line, at_line_start)
+    try:
+        buffer = lexer.tokenize_buffer()
+    except SyntaxError as e:
+        # Only an error if the chunk turns out to start at a real line start.
+        return _ChunkResult(TokenBuffer(), lexer, False, str(e))
+    
+    # Drop the EOF token; the merged buffer gets a single one at the end.
+    buffer.types.pop()
+    buffer.lines.pop()
+    buffer.value_ids.pop()
+    # Every newline outside a string token leaves the lexer at a line
+    # start, so a chunk ending anywhere else ends inside a string literal.
+    open = source.endswith('\n') and not lexer.at_line_start
+    return _ChunkResult(buffer, lexer, open)
+
+
+def split_source(source: str, chunk_size: int = CHUNK_SIZE) -> list:
+    """Cut source after newlines into pieces of about chunk_size; returns (start, end, line) triples."""
+    pieces = []
+    start = 0
+    line = 1
+    end_of_source = len(source)
+    while start < end_of_source:
+        end = source.find('\n', start + chunk_size - 1) + 1 or end_of_source
+        pieces.append((start, end, line))
+        line += source.count('\n', start, end)
+        start = end
+    return pieces
+
+
+def _merge_chunk(result: TokenBuffer, merger: Lexer, chunk: _ChunkResult, end: int = None):
+    """Append chunk's tokens (those before end, if given) to result, replaying its indentation on merger."""
+    remap = [result.intern(value) for value in chunk.values]
+    value_ids = array('i', [remap[value_id] for value_id in chunk.value_ids])
+    types = chunk.types
+    lines = chunk.lines
+    stack = merger.indent_stack
+    
+    copied = 0
+    for position, indent, line in zip(chunk.indent_positions, chunk.indent_widths, chunk.indent_lines):
+        if indent == stack[-1]:
+            continue
+        result.types.extend(types[copied:position])
+        result.lines.extend(lines[copied:position])
+        result.value_ids.extend(value_ids[copied:position])
+        copied = position
+        merger.line = line
+        merger.handle_indentation(indent, result)
+    
+    result.types.extend(types[copied:end])
+    result.lines.extend(lines[copied:end])
+    result.value_ids.extend(value_ids[copied:end])
+
+
+def tokenize_parallel(source: str, workers: int = None, chunk_size: int = CHUNK_SIZE) -> TokenBuffer:
+    """Lex source in worker processes; returns the same TokenBuffer as Lexer(source).tokenize_buffer()."""
+    # Importing the process pool takes longer than lexing a small program.
+    from concurrent.futures import ProcessPoolExecutor
+    
+    pieces = split_source(source, chunk_size)
+    result = TokenBuffer()
+    merger = Lexer("")
+    end_line = 1
+    
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(_lex_chunk, source[start:end], line) for start, end, line in pieces]
+        i = 0
+        while i < len(pieces):
+            start, end, line = pieces[i]
+            chunk = futures[i].result()
+            while chunk.open and i + 1 < len(pieces):
+                # A string literal runs on past this chunk. Keep the tokens
+                # before it and lex again from its opening quote to the end
+                # of the chunk it closes in; its line is the one it starts on.
+                _merge_chunk(result, merger, chunk, len(chunk.types) - 1)
+                start = end - chunk.open_length
+                line = chunk.lines[-1] - chunk.values[chunk.value_ids[-1]].count('\n')
+                string_end = TOKEN_RE.match(source, start).end()
+                while pieces[i][1] < string_end:
+                    i += 1
+                    futures[i].cancel()
+                end = pieces[i][1]
+                chunk = _lex_chunk(source[start:end], line, at_line_start=False)
+            if chunk.error is not None:
+                for future in futures[i + 1:]:
+                    future.cancel()
+                raise SyntaxError(chunk.error)
+            
+            _merge_chunk(result, merger, chunk)
+            end_line = chunk.end_line
+            i += 1
+    
+    stack = merger.indent_stack
+    while len(stack) > 1:
+        stack.pop()
+        result.append(TokenType.DEDENT.value, 0, end_line)
+    result.append(TokenType.EOF.value, None, end_line)
+    return result
+
+
+def tokenize_source(source: str, workers: int = None) -> TokenBuffer:
+    """Lex source, in parallel if it is large and there is more than one core to use."""
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(source) >= PARALLEL_MIN_SIZE:
+        return tokenize_parallel(source, workers)
+    return Lexer(source).tokenize_buffer()
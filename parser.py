@@ -1,11 +1,40 @@
-from tokens import Token, TokenType
+from itertools import islice
+
+from tokens import Token, TokenType, TokenBuffer, TOKEN_TYPES
+
+
+# Number of tokens batched into a buffer when parsing from a token iterator.
+TOKEN_BATCH = 4096
+
+# Integer codes of the token types, matching the TokenBuffer type column.
+MAKE = TokenType.MAKE.value
+SHOW = TokenType.SHOW.value
+LOOP = TokenType.LOOP.value
+IF = TokenType.IF.value
+ELSE = TokenType.ELSE.value
+STOP = TokenType.STOP.value
+IDENTIFIER = TokenType.IDENTIFIER.value
+NUMBER = TokenType.NUMBER.value
+STRING = TokenType.STRING.value
+EQUAL = TokenType.EQUAL.value
+COLON = TokenType.COLON.value
+NEWLINE = TokenType.NEWLINE.value
+INDENT = TokenType.INDENT.value
+DEDENT = TokenType.DEDENT.value
+EOF = TokenType.EOF.value
+
+COMPARISON_OPS = (TokenType.LESS.value, TokenType.EQUAL_EQUAL.value)
+ADDITIVE_OPS = (TokenType.PLUS.value, TokenType.MINUS.value)
+MULTIPLICATIVE_OPS = (TokenType.STAR.value, TokenType.SLASH.value)
 
 
 class ASTNode:
-    pass
+    __slots__ = ()
 
 
 class NumberNode(ASTNode):
+    __slots__ = ('value',)
+    
     def __init__(self, value: int):
         self.value = value
     
@@ -14,6 +43,8 @@ class NumberNode(ASTNode):
 
 
 class StringNode(ASTNode):
+    __slots__ = ('value',)
+    
     def __init__(self, value: str):
         self.value = value
     
@@ -22,6 +53,8 @@ class StringNode(ASTNode):
 
 
 class IdentifierNode(ASTNode):
+    __slots__ = ('name',)
+    
     def __init__(self, name: str):
         self.name = name
     
@@ -30,6 +63,8 @@ class IdentifierNode(ASTNode):
 
 
 class BinaryOpNode(ASTNode):
+    __slots__ = ('left', 'op', 'right')
+    
     def __init__(self, left: ASTNode, op: str, right: ASTNode):
         self.left = left
         self.op = op
@@ -40,42 +75,56 @@ class BinaryOpNode(ASTNode):
 
 
 class MakeNode(ASTNode):
-    def __init__(self, name: str, value: ASTNode):
+    __slots__ = ('name', 'value', 'line')
+    
+    def __init__(self, name: str, value: ASTNode, line: int = None):
         self.name = name
         self.value = value
+        self.line = line
     
     def __repr__(self):
         return f"Make({self.name}, {self.value})"
 
 
 class ShowNode(ASTNode):
-    def __init__(self, value: ASTNode):
+    __slots__ = ('value', 'line')
+    
+    def __init__(self, value: ASTNode, line: int = None):
         self.value = value
+        self.line = line
     
     def __repr__(self):
         return f"Show({self.value})"
 
 
 class LoopNode(ASTNode):
-    def __init__(self, condition: ASTNode, body: list):
+    __slots__ = ('condition', 'body', 'line')
+    
+    def __init__(self, condition: ASTNode, body: list, line: int = None):
         self.condition = condition
         self.body = body
+        self.line = line
     
     def __repr__(self):
         return f"Loop({self.condition}, {self.body})"
 
 
 class IfNode(ASTNode):
-    def __init__(self, condition: ASTNode, then_body: list, else_body: list = None):
+    __slots__ = ('condition', 'then_body', 'else_body', 'line')
+    
+    def __init__(self, condition: ASTNode, then_body: list, else_body: list = None, line: int = None):
         self.condition = condition
         self.then_body = then_body
         self.else_body = else_body or []
+        self.line = line
     
     def __repr__(self):
         return f"If({self.condition}, then={self.then_body}, else={self.else_body})"
 
 
 class ProgramNode(ASTNode):
+    __slots__ = ('statements',)
+    
     def __init__(self, statements: list):
         self.statements = statements
     
@@ -83,19 +132,92 @@ class ProgramNode(ASTNode):
         return f"Program({self.statements})"
 
 
+def _batch_tokens(tokens):
+    while True:
+        buffer = TokenBuffer.from_tokens(islice(tokens, TOKEN_BATCH))
+        if not len(buffer):
+            return
+        yield buffer
+
+
 class Parser:
-    def __init__(self, tokens: list):
-        self.tokens = tokens
+    """Builds the AST from tokens.
+    
+    tokens is a TokenBuffer, a list of Token objects or, for streaming, an
+    iterator of Tokens; Parser.from_buffers() takes an iterator of
+    TokenBuffers such as Lexer.iter_buffers(). The parser dispatches on the
+    integer type column directly. Streams are consumed one buffer at a time
+    and consumed tokens are dropped, so only a small window is held in memory.
+    
+    Nothing recurses on the input: binary operators are parsed in loops, and
+    the blocks of nested loop and if statements are kept on an explicit
+    stack (see _parse_blocks), so neither long expressions nor deep nesting
+    run into Python's recursion limit.
+    """
+    
+    def __init__(self, tokens):
+        self.buffer_stream = None
+        if isinstance(tokens, TokenBuffer):
+            self._set_buffer(tokens)
+        elif isinstance(tokens, list):
+            self._set_buffer(TokenBuffer.from_tokens(tokens))
+        else:
+            self._set_buffer(TokenBuffer())
+            self.buffer_stream = _batch_tokens(iter(tokens))
         self.pos = 0
+        self._statement_parsers = {
+            MAKE: self.parse_make,
+            SHOW: self.parse_show,
+            LOOP: self.parse_loop,
+            IF: self.parse_if,
+        }
+        # Parse the header of a loop or if and return its first open block.
+        self._block_openers = {
+            LOOP: self._open_loop,
+            IF: self._open_if,
+        }
+    
+    @classmethod
+    def from_buffers(cls, buffers):
+        parser = cls(TokenBuffer())
+        parser.buffer_stream = iter(buffers)
+        return parser
+    
+    def _set_buffer(self, buffer: TokenBuffer):
+        self.tokens = buffer
+        self.types = buffer.types
+        self.size = len(buffer)
+    
+    def _fill(self) -> bool:
+        buffer = next(self.buffer_stream, None)
+        while buffer is not None and not len(buffer):
+            buffer = next(self.buffer_stream, None)
+        if buffer is None:
+            self.buffer_stream = None
+            return False
+        
+        if self.pos < self.size:
+            rest = TokenBuffer()
+            rest.extend(self.tokens, self.pos)
+            rest.extend(buffer)
+            buffer = rest
+        self._set_buffer(buffer)
+        self.pos = 0
+        return True
+    
+    def current_type(self) -> int:
+        if self.pos >= self.size and (self.buffer_stream is None or not self._fill()):
+            return self.types[-1]
+        return self.types[self.pos]
     
     def current_token(self) -> Token:
-        if self.pos >= len(self.tokens):
-            return self.tokens[-1]
+        if self.pos >= self.size and (self.buffer_stream is None or not self._fill()):
+            return self.tokens[self.size - 1]
         return self.tokens[self.pos]
     
     def peek_token(self) -> Token:
-        if self.pos + 1 >= len(self.tokens):
-            return self.tokens[-1]
+        if self.pos + 1 >= self.size and (self.buffer_stream is None or not self._fill()):
+            return self.tokens[self.size - 1]
         return self.tokens[self.pos + 1]
     
     def advance(self) -> Token:
@@ -109,112 +231,140 @@ class Parser:
             raise SyntaxError(f"Expected {token_type}, got {token.type} at line {token.line}")
         return self.advance()
     
+    def _take_value(self):
+        # Only called right after current_type(), so pos is inside the buffer.
+        tokens = self.tokens
+        value = tokens.values[tokens.value_ids[self.pos]]
+        self.pos += 1
+        return value
+    
+    def _current_line(self) -> int:
+        # Only called right after current_type(), so pos is inside the buffer.
+        return self.tokens.lines[self.pos]
+    
+    def _expect_value(self, type_code: int):
+        if self.current_type() != type_code:
+            token = self.current_token()
+            raise SyntaxError(f"Expected {TOKEN_TYPES[type_code]}, got {token.type} at line {token.line}")
+        return self._take_value()
+    
     def skip_newlines(self):
-        while self.current_token().type == TokenType.NEWLINE:
-            self.advance()
+        while self.current_type() == NEWLINE:
+            self.pos += 1
     
     def parse(self) -> ProgramNode:
-        statements = []
+        return ProgramNode(list(self.iter_statements()))
+    
+    def iter_statements(self):
         self.skip_newlines()
         
-        while self.current_token().type != TokenType.EOF:
+        while self.current_type() != EOF:
             stmt = self.parse_statement()
             if stmt:
-                statements.append(stmt)
+                yield stmt
             self.skip_newlines()
-        
-        return ProgramNode(statements)
     
     def parse_statement(self):
-        token = self.current_token()
+        type_code = self.current_type()
+        statement_parser = self._statement_parsers.get(type_code)
         
-        if token.type == TokenType.MAKE:
-            return self.parse_make()
-        elif token.type == TokenType.SHOW:
-            return self.parse_show()
-        elif token.type == TokenType.LOOP:
-            return self.parse_loop()
-        elif token.type == TokenType.IF:
-            return self.parse_if()
-        elif token.type == TokenType.NEWLINE:
-            self.advance()
+        if statement_parser is not None:
+            return statement_parser()
+        elif type_code == NEWLINE:
+            self.pos += 1
             return None
         else:
+            token = self.current_token()
             raise SyntaxError(f"Unexpected token {token.type} at line {token.line}")
     
     def parse_make(self) -> MakeNode:
-        self.expect(TokenType.MAKE)
-        name_token = self.expect(TokenType.IDENTIFIER)
-        self.expect(TokenType.EQUAL)
+        line = self._current_line()
+        self._expect_value(MAKE)
+        name = self._expect_value(IDENTIFIER)
+        self._expect_value(EQUAL)
         value = self.parse_expression()
-        return MakeNode(name_token.value, value)
+        return MakeNode(name, value, line)
     
     def parse_show(self) -> ShowNode:
-        self.expect(TokenType.SHOW)
+        line = self._current_line()
+        self._expect_value(SHOW)
         value = self.parse_expression()
-        return ShowNode(value)
+        return ShowNode(value, line)
     
     def parse_loop(self) -> LoopNode:
-        self.expect(TokenType.LOOP)
-        condition = self.parse_comparison()
-        self.expect(TokenType.COLON)
-        self.skip_newlines()
-        
-        if self.current_token().type == TokenType.INDENT:
-            self.advance()
-        
-        body = self.parse_block()
-        return LoopNode(condition, body)
+        block = self._open_loop()
+        self._parse_blocks([block])
+        return block[0]
     
     def parse_if(self) -> IfNode:
-        self.expect(TokenType.IF)
-        condition = self.parse_comparison()
-        self.expect(TokenType.COLON)
-        self.skip_newlines()
-        
-        if self.current_token().type == TokenType.INDENT:
-            self.advance()
-        
-        then_body = self.parse_block()
-        else_body = []
-        
-        self.skip_newlines()
-        
-        if self.current_token().type == TokenType.ELSE:
-            self.advance()
-            self.expect(TokenType.COLON)
-            self.skip_newlines()
-            
-            if self.current_token().type == TokenType.INDENT:
-                self.advance()
-            
-            else_body = self.parse_block()
-        
-        return IfNode(condition, then_body, else_body)
+        block = self._open_if()
+        self._parse_blocks([block])
+        return block[0]
     
     def parse_block(self) -> list:
         statements = []
+        self._parse_blocks([(None, statements, False)])
+        return statements
+    
+    def _begin_block(self):
+        self._expect_value(COLON)
+        self.skip_newlines()
+        
+        if self.current_type() == INDENT:
+            self.pos += 1
+    
+    def _open_loop(self):
+        line = self._current_line()
+        self._expect_value(LOOP)
+        condition = self.parse_comparison()
+        self._begin_block()
+        node = LoopNode(condition, [], line)
+        return node, node.body, False
+    
+    def _open_if(self):
+        line = self._current_line()
+        self._expect_value(IF)
+        condition = self.parse_comparison()
+        self._begin_block()
+        node = IfNode(condition, [], [], line)
+        return node, node.then_body, True
+    
+    def _parse_blocks(self, blocks: list):
+        """Parse statements into the innermost open block until every block is closed.
         
-        while True:
+        blocks is a stack of (node, statement list, is then-block) entries. A
+        nested loop or if pushes its block instead of recursing. A then-block
+        that ends may be followed by its else-block.
+        """
+        while blocks:
+            node, statements, then_block = blocks[-1]
             self.skip_newlines()
-            token = self.current_token()
+            type_code = self.current_type()
             
-            if token.type == TokenType.STOP:
-                self.advance()
-                break
-            elif token.type == TokenType.DEDENT:
-                self.advance()
+            if type_code == DEDENT:
+                self.pos += 1
                 continue
-            elif token.type == TokenType.ELSE:
-                break
-            elif token.type == TokenType.EOF:
-                break
+            if type_code == STOP or type_code == ELSE or type_code == EOF:
+                if type_code == STOP:
+                    self.pos += 1
+                blocks.pop()
+                if then_block:
+                    self.skip_newlines()
+                    if self.current_type() == ELSE:
+                        self.pos += 1
+                        self._begin_block()
+                        blocks.append((node, node.else_body, False))
+                continue
+            
+            opener = self._block_openers.get(type_code)
+            if opener is not None:
+                block = opener()
+                statements.append(block[0])
+                blocks.append(block)
             else:
                 stmt = self.parse_statement()
                 if stmt:
                     statements.append(stmt)
-        
-        return statements
     
     def parse_expression(self) -> ASTNode:
         return self.parse_comparison()
@@ -222,44 +372,42 @@ class Parser:
     def parse_comparison(self) -> ASTNode:
         left = self.parse_additive()
         
-        while self.current_token().type in (TokenType.LESS, TokenType.EQUAL_EQUAL):
-            op_token = self.advance()
+        while self.current_type() in COMPARISON_OPS:
+            op = self._take_value()
             right = self.parse_additive()
-            left = BinaryOpNode(left, op_token.value, right)
+            left = BinaryOpNode(left, op, right)
         
         return left
     
     def parse_additive(self) -> ASTNode:
         left = self.parse_multiplicative()
         
-        while self.current_token().type in (TokenType.PLUS, TokenType.MINUS):
-            op_token = self.advance()
+        while self.current_type() in ADDITIVE_OPS:
+            op = self._take_value()
             right = self.parse_multiplicative()
-            left = BinaryOpNode(left, op_token.value, right)
+            left = BinaryOpNode(left, op, right)
         
         return left
     
     def parse_multiplicative(self) -> ASTNode:
         left = self.parse_primary()
         
-        while self.current_token().type in (TokenType.STAR, TokenType.SLASH):
-            op_token = self.advance()
+        while self.current_type() in MULTIPLICATIVE_OPS:
+            op = self._take_value()
             right = self.parse_primary()
-            left = BinaryOpNode(left, op_token.value, right)
+            left = BinaryOpNode(left, op, right)
         
         return left
     
     def parse_primary(self) -> ASTNode:
-        token = self.current_token()
+        type_code = self.current_type()
         
-        if token.type == TokenType.NUMBER:
-            self.advance()
-            return NumberNode(token.value)
-        elif token.type == TokenType.STRING:
-            self.advance()
-            return StringNode(token.value)
-        elif token.type == TokenType.IDENTIFIER:
-            self.advance()
-            return IdentifierNode(token.name if hasattr(token, 'name') else token.value)
+        if type_code == NUMBER:
+            return NumberNode(self._take_value())
+        elif type_code == STRING:
+            return StringNode(self._take_value())
+        elif type_code == IDENTIFIER:
+            return IdentifierNode(self._take_value())
         else:
+            token = self.current_token()
             raise SyntaxError(f"Unexpected token {token.type} in expression at line {token.line}")
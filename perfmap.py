@@ -0,0 +1,308 @@
+"""
+Perf maps and jitdump files for JIT-compiled code.
+
+perf cannot see symbols in code that was generated at run time, so a
+JIT-compiled Xlang program shows up in perf report as anonymous
+addresses. With perf output enabled ($XLANG_PERF, 'ide.py --perf' or
+enable()), every function loaded into the JIT is described to perf:
+
+  map      appends "START SIZE name" lines to /tmp/perf-<pid>.map, which
+           perf report reads by itself. Function names only.
+  jitdump  writes $JITDUMPDIR/jit-<pid>.dump (default /tmp) with each
+           function's machine code and, when the code generator emitted
+           DWARF line info, the Xlang source line of every instruction.
+           perf inject turns it into ELF files that perf report and
+           perf annotate read like any other binary:
+      
+      XLANG_PERF=jitdump perf record -k mono python ide.py prog.xl
+      perf inject --jit -i perf.data -o perf.jit.data
+      perf annotate -i perf.jit.data main
+
+Function offsets and sizes come from the symbol table of the ELF object
+MCJIT produced, and lines from its .debug_line section (DWARF 2-4), so
+only the entry function's load address has to come from the engine.
+"""
+
+import ctypes
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+PERF_ENV = "XLANG_PERF"
+
+PERF_MODES = ("map", "jitdump")
+
+_mode = os.environ.get(PERF_ENV) if os.environ.get(PERF_ENV) in PERF_MODES else None
+
+
+def enable(mode: str = "map"):
+    """Describe JIT code loaded from now on to perf; mode is "map", "jitdump" or None (off)."""
+    global _mode
+    if mode is not None and mode not in PERF_MODES:
+        raise ValueError(f"Unknown perf output: {mode}")
+    _mode = mode
+
+
+def perf_mode():
+    """The enabled perf output ("map" or "jitdump"), or None."""
+    return _mode
+
+
+# ELF structures (64-bit, little-endian).
+_SECTION_HEADER = struct.Struct('<IIQQQQIIQQ')
+_SYMBOL = struct.Struct('<IBBHQQ')
+_RELA = struct.Struct('<QQq')
+SHT_SYMTAB = 2
+SHT_RELA = 4
+STT_FUNC = 2
+
+
+def _c_string(data: bytes, offset: int) -> str:
+    return data[offset:data.index(b"\0", offset)].decode('utf-8', 'replace')
+
+
+def _uleb128(data: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+
+def _sleb128(data: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            if byte & 0x40:
+                value -= 1 << shift
+            return value, pos
+
+
+class ElfObject:
+    """The parts of a relocatable ELF object that perf needs: functions and line rows."""
+    
+    def __init__(self, data: bytes):
+        if data[:4] != b"\x7fELF" or data[4] != 2 or data[5] != 1:
+            raise ValueError("Not a 64-bit little-endian ELF object")
+        self.data = data
+        self.machine, = struct.unpack_from('<H', data, 0x12)
+        shoff, = struct.unpack_from('<Q', data, 0x28)
+        shentsize, shnum, shstrndx = struct.unpack_from('<HHH', data, 0x3a)
+        # (name offset, type, flags, address, offset, size, link, info, alignment, entry size)
+        headers = [_SECTION_HEADER.unpack_from(data, shoff + i * shentsize) for i in range(shnum)]
+        names_offset = headers[shstrndx][4]
+        self.sections = headers
+        self.section_index = {_c_string(data, names_offset + header[0]): i for i, header in enumerate(headers)}
+        self.symbols = self._read_symbols()
+    
+    def _section_data(self, index: int) -> bytes:
+        offset, size = self.sections[index][4:6]
+        return self.data[offset:offset + size]
+    
+    def _read_symbols(self) -> list:
+        """(name, type, section index, value, size) for every symbol."""
+        for header in self.sections:
+            if header[1] == SHT_SYMTAB:
+                symtab = self.data[header[4]:header[4] + header[5]]
+                strtab_offset = self.sections[header[6]][4]
+                return [(_c_string(self.data, strtab_offset + name), info & 0xf, shndx, value, size)
+                        for name, info, _, shndx, value, size in _SYMBOL.iter_unpack(symtab)]
+        return []
+    
+    def functions(self) -> list:
+        """(name, section index, offset, size) of every defined function."""
+        return [(name, shndx, value, size) for name, kind, shndx, value, size in self.symbols
+                if kind == STT_FUNC and shndx and size]
+    
+    def _relocations(self, target: int) -> dict:
+        """Relocated values for the section at index target: {offset: (section index, value)}."""
+        values = {}
+        for header in self.sections:
+            if header[1] == SHT_RELA and header[7] == target:
+                for offset, info, addend in _RELA.iter_unpack(self.data[header[4]:header[4] + header[5]]):
+                    _, _, shndx, value, _ = self.symbols[info >> 32]
+                    values[offset] = (shndx, value + addend)
+        return values
+    
+    def line_rows(self) -> list:
+        """(section index, offset, line) for every row of the DWARF line tables, in order."""
+        index = self.section_index.get(".debug_line")
+        if index is None:
+            return []
+        data = self._section_data(index)
+        relocations = self._relocations(index)
+        rows = []
+        unit = 0
+        while unit < len(data):
+            unit_length, version = struct.unpack_from('<IH', data, unit)
+            end = unit + 4 + unit_length
+            # Only 32-bit DWARF up to version 4 (the code generator asks for 4).
+            if unit_length >= 0xfffffff0 or not 2 <= version <= 4:
+                break
+            header_length, min_length = struct.unpack_from('<IB', data, unit + 6)
+            pos = unit + 11 + (version >= 4) + 1
+            line_base, line_range, opcode_base = struct.unpack_from('<bBB', data, pos)
+            arg_counts = data[pos + 3:pos + 2 + opcode_base]
+            # Every module has a single source file, so the file table is not needed.
+            pos = unit + 10 + header_length
+            
+            section = address = None
+            line = 1
+            while pos < end:
+                opcode = data[pos]
+                pos += 1
+                if opcode >= opcode_base:
+                    adjusted = opcode - opcode_base
+                    address += adjusted // line_range * min_length
+                    line += line_base + adjusted % line_range
+                    rows.append((section, address, line))
+                elif opcode == 0:
+                    length, pos = _uleb128(data, pos)
+                    if data[pos] == 1:  # DW_LNE_end_sequence
+                        section = address = None
+                        line = 1
+                    elif data[pos] == 2:  # DW_LNE_set_address
+                        section, address = relocations.get(pos + 1, (None, 0))
+                    pos += length
+                elif opcode == 1:  # DW_LNS_copy
+                    rows.append((section, address, line))
+                elif opcode == 2:  # DW_LNS_advance_pc
+                    advance, pos = _uleb128(data, pos)
+                    address += advance * min_length
+                elif opcode == 3:  # DW_LNS_advance_line
+                    advance, pos = _sleb128(data, pos)
+                    line += advance
+                elif opcode == 8:  # DW_LNS_const_add_pc
+                    address += (255 - opcode_base) // line_range * min_length
+                elif opcode == 9:  # DW_LNS_fixed_advance_pc
+                    address += struct.unpack_from('<H', data, pos)[0]
+                    pos += 2
+                else:
+                    for _ in range(arg_counts[opcode - 1]):
+                        _, pos = _uleb128(data, pos)
+            unit = end
+        return [row for row in rows if row[0] is not None]
+
+
+# jitdump format, from tools/perf/Documentation/jitdump-specification.txt.
+JITDUMP_MAGIC = 0x4A695444
+JITDUMP_VERSION = 1
+_JITDUMP_HEADER = struct.Struct('<IIIIIIQQ')
+_RECORD_HEADER = struct.Struct('<IIQ')
+_CODE_LOAD = struct.Struct('<IIQQQQ')
+_DEBUG_INFO = struct.Struct('<QQ')
+_DEBUG_ENTRY = struct.Struct('<QII')
+JIT_CODE_LOAD = 0
+JIT_CODE_DEBUG_INFO = 2
+
+
+def _timestamp() -> int:
+    # perf record -k mono stamps its samples with the same clock.
+    return time.clock_gettime_ns(time.CLOCK_MONOTONIC)
+
+
+class _PerfMap:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.file = open(f"/tmp/perf-{pid}.map", 'a')
+    
+    def add(self, functions: list, rows: dict, source_path: str):
+        for address, size, name in functions:
+            self.file.write(f"{address:x} {size:x} {name}\n")
+        self.file.flush()
+
+
+class _JitDump:
+    def __init__(self, pid: int, machine: int):
+        self.pid = pid
+        directory = os.environ.get("JITDUMPDIR") or "/tmp"
+        self.file = open(os.path.join(directory, f"jit-{pid}.dump"), 'w+b')
+        header = _JITDUMP_HEADER.pack(JITDUMP_MAGIC, JITDUMP_VERSION, _JITDUMP_HEADER.size, machine, 0, pid,
+                                      _timestamp(), 0)
+        self.file.write(header)
+        self.file.flush()
+        # perf record finds the dump through an executable mapping of it.
+        self.marker = mmap.mmap(self.file.fileno(), len(header), flags=mmap.MAP_PRIVATE,
+                                prot=mmap.PROT_READ | mmap.PROT_EXEC)
+        self.code_index = 0
+    
+    def _record(self, kind: int, body: bytes):
+        self.file.write(_RECORD_HEADER.pack(kind, _RECORD_HEADER.size + len(body), _timestamp()))
+        self.file.write(body)
+    
+    def add(self, functions: list, rows: dict, source_path: str):
+        tid = threading.get_native_id()
+        for address, size, name in functions:
+            lines = rows.get(address)
+            if lines and source_path:
+                # The debug info for a function must come before its code.
+                file_name = source_path.encode('utf-8') + b"\0"
+                entries = b"".join(_DEBUG_ENTRY.pack(line_address, line, 0) + file_name
+                                   for line_address, line in lines)
+                self._record(JIT_CODE_DEBUG_INFO, _DEBUG_INFO.pack(address, len(lines)) + entries)
+            code = ctypes.string_at(address, size)
+            body = _CODE_LOAD.pack(self.pid, tid, address, address, size, self.code_index)
+            self._record(JIT_CODE_LOAD, body + name.encode('utf-8') + b"\0" + code)
+            self.code_index += 1
+        self.file.flush()
+
+
+_OUTPUTS = {"map": _PerfMap, "jitdump": _JitDump}
+
+_output = None
+
+
+def _get_output(machine: int):
+    global _output
+    pid = os.getpid()
+    # A forked process (batch worker, server connection) writes its own files.
+    if _output is None or _output.pid != pid or not isinstance(_output, _OUTPUTS[_mode]):
+        _output = _PerfMap(pid) if _mode == "map" else _JitDump(pid, machine)
+    return _output
+
+
+def register_object(obj: bytes, entry_name: str, entry_address: int, source_path: str = None):
+    """Describe the functions of a loaded object to perf; does nothing unless perf output is enabled.
+    
+    entry_address is where the engine loaded entry_name; the object's other
+    functions are found relative to it, so they must be in the same
+    section (MCJIT puts all of a module's code in one). source_path names
+    the file the object's line info refers to.
+    """
+    if _mode is None:
+        return
+    elf = ElfObject(obj)
+    functions = elf.functions()
+    entry = next((function for function in functions if function[0] == entry_name), None)
+    if entry is None:
+        return
+    _, text_section, entry_offset, _ = entry
+    base = entry_address - entry_offset
+    
+    loaded = []
+    rows = {}
+    starts = []
+    for name, section, offset, size in sorted(functions, key=lambda function: function[2]):
+        if section == text_section:
+            loaded.append((base + offset, size, name))
+            rows[base + offset] = []
+            starts.append((offset, offset + size, base + offset))
+    if _mode == "jitdump" and source_path:
+        for section, offset, line in elf.line_rows():
+            if section != text_section:
+                continue
+            for start, end, address in starts:
+                if start <= offset < end:
+                    rows[address].append((base + offset, line))
+                    break
+    _get_output(elf.machine).add(loaded, rows, source_path)
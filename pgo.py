@@ -0,0 +1,101 @@
+"""
+Profile-guided optimization from recorded branch profiles.
+
+Training: compile with CodeGenerator(profile=True), run, and turn the block
+counters into a BranchProfile with BranchProfile.from_block_profile. For
+every if, "taken" is how often the then block ran and "not taken" the
+else block; for every loop they are the body and exit counts of its
+condition. Save it as JSON next to the program.
+
+Use: pass the loaded BranchProfile as CodeGenerator(branch_profile=...).
+Each matching cbranch gets !prof branch_weights, which LLVM uses for block
+layout and, on loop conditions, as the estimated trip count that drives
+loop peeling and unrolling.
+
+Branches are matched by kind, source line and occurrence on that line, so
+a profile stays usable for the parts of a program that did not change.
+"""
+
+import hashlib
+import json
+
+
+PROFILE_VERSION = 1
+
+PROFILE_SUFFIX = ".xlprof"
+
+# Branch weights are i32 in LLVM; larger counts are scaled down together.
+MAX_WEIGHT = (1 << 31) - 2
+
+
+def default_profile_path(source_path: str) -> str:
+    return source_path + PROFILE_SUFFIX
+
+
+def scale_weights(taken: int, not_taken: int) -> list:
+    largest = max(taken, not_taken)
+    if largest > MAX_WEIGHT:
+        scale = largest / MAX_WEIGHT
+        taken = int(taken / scale)
+        not_taken = int(not_taken / scale)
+    # Like clang, add one so a never-taken edge stays unlikely rather than impossible.
+    return [taken + 1, not_taken + 1]
+
+
+class BranchProfile:
+    def __init__(self, branches: dict = None):
+        # (kind, line, occurrence) -> [taken, not taken]
+        self.branches = branches or {}
+    
+    @classmethod
+    def from_block_profile(cls, block_profile) -> 'BranchProfile':
+        branches = {}
+        for kind, line, occurrence, taken, not_taken in block_profile.branches:
+            branches[(kind, line, occurrence)] = [taken, not_taken]
+        return cls(branches)
+    
+    def merge(self, other: 'BranchProfile'):
+        """Add another run's counts, e.g. from a different training input."""
+        for key, (taken, not_taken) in other.branches.items():
+            counts = self.branches.setdefault(key, [0, 0])
+            counts[0] += taken
+            counts[1] += not_taken
+    
+    def weights(self, kind: str, line: int, occurrence: int):
+        counts = self.branches.get((kind, line, occurrence))
+        if counts is None:
+            return None
+        return scale_weights(*counts)
+    
+    def digest(self) -> str:
+        """Identify the profile's contents, e.g. for object cache keys."""
+        data = json.dumps(sorted(self.branches.items()), separators=(',', ':'))
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+    
+    def as_dict(self) -> dict:
+        return {
+            "version": PROFILE_VERSION,
+            "branches": [
+                {"kind": kind, "line": line, "occurrence": occurrence, "taken": taken, "not_taken": not_taken}
+                for (kind, line, occurrence), (taken, not_taken) in sorted(self.branches.items())
+            ],
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BranchProfile':
+        if data.get("version") != PROFILE_VERSION:
+            raise ValueError(f"Unsupported profile version: {data.get('version')}")
+        branches = {}
+        for entry in data["branches"]:
+            key = (entry["kind"], entry["line"], entry["occurrence"])
+            branches[key] = [entry["taken"], entry["not_taken"]]
+        return cls(branches)
+    
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=1)
+    
+    @classmethod
+    def load(cls, path: str) -> 'BranchProfile':
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,316 @@
+"""
+Isolated execution pool for running untrusted programs from asyncio code.
+
+Programs are compiled and run in pre-forked worker processes, never in
+the caller's process, so a program that crashes (e.g. a fatal signal in
+native code) or never terminates (loop 1 == 1:) cannot take the host down
+or block its event loop:
+
+    async with ExecutionPool(workers=8, memory_limit=512 << 20) as pool:
+        result = await pool.run(source, timeout=2.0)
+        print(result.exit_code, result.output, result.error)
+
+Workers are forked by a zygote: a fresh Python process that start()
+launches, which warms LLVM up once and then does nothing but fork workers
+from that state and wait for them when asked. A worker starts in about a
+millisecond. It never inherits the host's threads, event loop or
+connections, and the host itself does not have to load LLVM. A worker is
+replaced when its run times out (it is killed), when it dies, and after
+max_runs programs, so memory leaked by a run does not accumulate.
+memory_limit caps each worker's address space (RLIMIT_AS), which includes
+the ~200 MB that a worker with LLVM loaded already maps.
+
+Workers talk to the pool over a socket pair using the server protocol
+(see client.py). The pool sends the worker's end to the zygote with
+SCM_RIGHTS, and the zygote answers with the worker's pid, or its wait
+status once the pool is done with it. All of that is awaited, so the
+event loop never blocks on fork() or waitpid().
+"""
+
+import asyncio
+import os
+import resource
+import signal
+import socket
+import sys
+import time
+
+from client import decode_header, encode_message, recv_message, send_message
+from config import DEFAULT_OPT_LEVEL, OPT_LEVELS, BACKENDS, DEFAULT_BACKEND
+from runtime import OutputCapture
+from ide import execute, warm_up
+
+
+DEFAULT_TIMEOUT = 10.0
+
+DEFAULT_MAX_RUNS = 1000
+
+# Zygote requests and replies are single JSON packets; none comes close.
+ZYGOTE_PACKET_SIZE = 4096
+
+
+class RunResult:
+    __slots__ = ('exit_code', 'output', 'seconds', 'error', 'timed_out')
+    
+    def __init__(self, exit_code: int = None, output: bytes = b"", seconds: float = 0.0,
+                 error: str = None, timed_out: bool = False):
+        self.exit_code = exit_code
+        self.output = output
+        self.seconds = seconds
+        self.error = error
+        self.timed_out = timed_out
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.exit_code == 0
+    
+    def __repr__(self):
+        return f"RunResult(exit_code={self.exit_code}, error={self.error!r}, seconds={self.seconds:.4f})"
+
+
+def describe_exit(status: int) -> str:
+    if os.WIFSIGNALED(status):
+        signum = os.WTERMSIG(status)
+        try:
+            name = signal.Signals(signum).name
+        except ValueError:
+            name = str(signum)
+        return f"Worker killed by {name}"
+    return f"Worker exited with status {os.waitstatus_to_exitcode(status)}"
+
+
+def _worker_main(sock: socket.socket, opt_level: int, backend: str, memory_limit: int, max_runs: int):
+    # Ctrl-C is for the host; the pool shuts workers down itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    
+    sock_file = sock.makefile('rwb')
+    for _ in range(max_runs):
+        request, _ = recv_message(sock_file)
+        if request is None:
+            return
+        output = OutputCapture()
+        exit_code = None
+        error = None
+        try:
+            exit_code = execute(request["source"], request.get("opt_level", opt_level), output=output,
+                                backend=request.get("backend", backend))
+        except MemoryError:
+            error = "Memory limit exceeded"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        send_message(sock_file, {"exit_code": exit_code, "error": error}, output.getvalue())
+
+
+def _zygote_main(control: socket.socket, opt_level: int, backend: str, memory_limit: int, max_runs: int):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    warm_up(opt_level)
+    while True:
+        packet, fds, _, _ = socket.recv_fds(control, ZYGOTE_PACKET_SIZE, 1)
+        if not packet:
+            # The pool closed its end.
+            return
+        request, _ = decode_header(packet)
+        if "wait" in request:
+            # Only asked for once the worker is killed, dead or exiting, so this returns at once.
+            _, status = os.waitpid(request["wait"], 0)
+            reply = {"status": status}
+        else:
+            child_sock = socket.socket(fileno=fds[0])
+            pid = os.fork()
+            if pid == 0:
+                status = 0
+                try:
+                    fd = child_sock.fileno()
+                    os.closerange(3, fd)
+                    os.closerange(fd + 1, os.sysconf("SC_OPEN_MAX"))
+                    _worker_main(child_sock, opt_level, backend, memory_limit, max_runs)
+                except BaseException:
+                    status = 1
+                finally:
+                    os._exit(status)
+            child_sock.close()
+            reply = {"pid": pid}
+        control.send(encode_message(reply))
+
+
+class _Zygote:
+    """The pool's end of the zygote process; one request at a time."""
+    
+    def __init__(self, process, control: socket.socket):
+        self.process = process
+        self.control = control
+        self.lock = asyncio.Lock()
+    
+    @classmethod
+    async def launch(cls, opt_level: int, backend: str, memory_limit: int, max_runs: int) -> '_Zygote':
+        control, zygote_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        fd = zygote_end.fileno()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), "zygote", str(fd), str(opt_level), backend,
+                str(memory_limit or 0), str(max_runs), pass_fds=(fd,))
+        finally:
+            zygote_end.close()
+        control.setblocking(False)
+        return cls(process, control)
+    
+    async def request(self, message: dict, fds=()) -> dict:
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            # A packet this small always fits in the empty socket buffer.
+            socket.send_fds(self.control, [encode_message(message)], list(fds))
+            packet = await loop.sock_recv(self.control, ZYGOTE_PACKET_SIZE)
+        if not packet:
+            raise ConnectionError("Zygote process exited")
+        reply, _ = decode_header(packet)
+        return reply
+    
+    async def close(self):
+        self.control.close()
+        await self.process.wait()
+
+
+class _Worker:
+    __slots__ = ('pid', 'sock', 'reader', 'writer', 'runs')
+    
+    def __init__(self, pid: int, sock: socket.socket, reader, writer):
+        self.pid = pid
+        self.sock = sock
+        self.reader = reader
+        self.writer = writer
+        self.runs = 0
+
+
+class ExecutionPool:
+    def __init__(self, workers: int = None, opt_level: int = DEFAULT_OPT_LEVEL, backend: str = DEFAULT_BACKEND,
+                 timeout: float = DEFAULT_TIMEOUT, memory_limit: int = None, max_runs: int = DEFAULT_MAX_RUNS):
+        if opt_level not in OPT_LEVELS:
+            raise ValueError(f"Invalid optimization level: {opt_level}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        self.size = workers or os.cpu_count() or 1
+        self.opt_level = opt_level
+        self.backend = backend
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_runs = max_runs
+        self.workers = set()
+        self.zygote = None
+        self.idle = None
+        self.closed = False
+    
+    async def start(self):
+        self.zygote = await _Zygote.launch(self.opt_level, self.backend, self.memory_limit, self.max_runs)
+        self.idle = asyncio.Queue()
+        for _ in range(self.size):
+            self.idle.put_nowait(await self._spawn())
+    
+    async def _spawn(self) -> _Worker:
+        parent_sock, child_sock = socket.socketpair()
+        try:
+            reply = await self.zygote.request({"spawn": True}, [child_sock.fileno()])
+        finally:
+            child_sock.close()
+        reader, writer = await asyncio.open_unix_connection(sock=parent_sock)
+        worker = _Worker(reply["pid"], parent_sock, reader, writer)
+        self.workers.add(worker)
+        return worker
+    
+    async def _retire(self, worker: _Worker, kill: bool):
+        """Stop a worker and return its wait status, or None if it was already retired."""
+        if worker not in self.workers:
+            return None
+        self.workers.discard(worker)
+        if kill:
+            # Not reaped until the zygote waits for it below, so the pid cannot have been reused.
+            os.kill(worker.pid, signal.SIGKILL)
+        worker.writer.close()
+        reply = await self.zygote.request({"wait": worker.pid})
+        return reply["status"]
+    
+    async def _replace(self, worker: _Worker, kill: bool):
+        status = await self._retire(worker, kill)
+        if not self.closed:
+            self.idle.put_nowait(await self._spawn())
+        return status
+    
+    async def run(self, source: str, timeout: float = None, opt_level: int = None,
+                  backend: str = None) -> RunResult:
+        """Compile and run source in a worker; never raises for a failing program."""
+        if self.idle is None:
+            await self.start()
+        if self.closed:
+            raise RuntimeError("ExecutionPool is closed")
+        timeout = self.timeout if timeout is None else timeout
+        request = {"source": source}
+        if opt_level is not None:
+            request["opt_level"] = opt_level
+        if backend is not None:
+            request["backend"] = backend
+        
+        worker = await self.idle.get()
+        if worker is None:
+            # Woken by close(); pass the wake-up on to the next waiter.
+            self.idle.put_nowait(None)
+            raise RuntimeError("ExecutionPool is closed")
+        start = time.perf_counter()
+        try:
+            worker.writer.write(encode_message(request))
+            await worker.writer.drain()
+            response, output = await asyncio.wait_for(self._read_message(worker.reader), timeout)
+        except asyncio.TimeoutError:
+            await self._replace(worker, kill=True)
+            return RunResult(seconds=time.perf_counter() - start, error=f"Timed out after {timeout} s",
+                             timed_out=True)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            status = await self._replace(worker, kill=True)
+            error = "ExecutionPool was closed" if status is None else describe_exit(status)
+            return RunResult(seconds=time.perf_counter() - start, error=error)
+        except BaseException:
+            # Cancelled mid-run: the worker's state is unknown, so it goes.
+            await asyncio.shield(self._replace(worker, kill=True))
+            raise
+        
+        seconds = time.perf_counter() - start
+        worker.runs += 1
+        if worker.runs >= self.max_runs:
+            # The worker exits by itself after its last run.
+            await self._replace(worker, kill=False)
+        else:
+            self.idle.put_nowait(worker)
+        return RunResult(response["exit_code"], output, seconds, response["error"])
+    
+    @staticmethod
+    async def _read_message(reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Worker closed the connection")
+        message, length = decode_header(line)
+        payload = await reader.readexactly(length) if length else b""
+        return message, payload
+    
+    async def close(self):
+        """Stop all workers; programs still running are killed, runs still waiting raise RuntimeError."""
+        self.closed = True
+        if self.idle is not None:
+            self.idle.put_nowait(None)
+        for worker in list(self.workers):
+            await self._retire(worker, kill=True)
+        if self.zygote is not None:
+            await self.zygote.close()
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+if __name__ == "__main__":
+    # Started by _Zygote.launch: pool.py zygote FD OPT_LEVEL BACKEND MEMORY_LIMIT MAX_RUNS
+    _, _, control_fd, opt_level, backend, memory_limit, max_runs = sys.argv
+    _zygote_main(socket.socket(fileno=int(control_fd)), int(opt_level), backend, int(memory_limit),
+                 int(max_runs))
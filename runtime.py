@@ -0,0 +1,158 @@
+"""
+Python side of the runtime shared by JIT-compiled programs and the interpreter.
+
+OutputCapture collects a run's output in memory and set_output_sink points
+a loaded module's sink at one (the native half, emitted into every module,
+is in outputgen.py). set_fuel gives a fuel-metered module its loop budget,
+BlockProfile reads a profiled run's block counters and VariableStorage
+holds REPL variables in ctypes cells.
+
+Nothing here imports LLVM, so the front end and the interpreter can use it
+without paying for llvmlite.
+"""
+
+import ctypes
+
+
+# void sink(const char *data, int64_t length)
+OUTPUT_SINK_TYPE = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_int64)
+
+
+def output_symbol(entry_name: str) -> str:
+    return entry_name + ".output"
+
+
+def profile_symbol(entry_name: str) -> str:
+    return entry_name + ".profile"
+
+
+def fuel_symbol(entry_name: str) -> str:
+    return entry_name + ".fuel"
+
+
+# Exit code of a fuel-metered program whose loops ran out of fuel (as timeout(1) uses).
+OUT_OF_FUEL_EXIT_CODE = 124
+
+# Exit code of a program that divided by zero, or INT64_MIN by -1, on any
+# backend: what a shell reports for the SIGFPE that division raises on x86.
+DIVISION_ERROR_EXIT_CODE = 136
+
+UNLIMITED_FUEL = 2 ** 63 - 1
+
+
+class OutputCapture:
+    """In-memory destination for a program's output.
+    
+    Pass one as output= to CodeGenerator.compile_and_run or run_object; the
+    bytes written by the program accumulate in a bytearray and are read back
+    with getvalue() (a bytes copy) or getbuffer() (a zero-copy memoryview).
+    """
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.sink = OUTPUT_SINK_TYPE(self._write)
+    
+    def _write(self, address, length):
+        self.buffer += (ctypes.c_char * length).from_address(address)
+    
+    def write(self, data):
+        """Append bytes produced outside native code, e.g. by the interpreter."""
+        self.buffer += data
+    
+    @property
+    def address(self) -> int:
+        return ctypes.cast(self.sink, ctypes.c_void_p).value
+    
+    def getvalue(self) -> bytes:
+        return bytes(self.buffer)
+    
+    def getbuffer(self) -> memoryview:
+        return memoryview(self.buffer)
+    
+    def clear(self):
+        self.buffer = bytearray()
+
+
+def set_output_sink(sink_address: int, output: OutputCapture = None):
+    """Point the <entry>.output global at sink_address to output (None for fd 1)."""
+    ctypes.c_void_p.from_address(sink_address).value = None if output is None else output.address
+
+
+def set_fuel(fuel_address: int, fuel: int = None):
+    """Set the <entry>.fuel global: how many loop back-edges the next run may take."""
+    if fuel is not None and fuel < 0:
+        raise ValueError(f"Invalid fuel budget: {fuel}")
+    ctypes.c_int64.from_address(fuel_address).value = UNLIMITED_FUEL if fuel is None else fuel
+
+
+class BlockProfile:
+    """Basic-block execution counts of one profiled run, mapped to source lines.
+    
+    blocks holds (line, block name, count) for every counted block, where
+    line is that of the loop or if statement that created the block (None
+    for the entry block). lines maps each statement line to the number of
+    times the statement ran, i.e. the count of the block it sits in.
+    branches holds (kind, line, occurrence, taken, not taken) for every
+    loop and if condition (see pgo.py).
+    """
+    
+    def __init__(self, blocks: list, lines: dict, branches: list = None):
+        self.blocks = blocks
+        self.lines = lines
+        self.branches = branches or []
+    
+    @classmethod
+    def read(cls, table_address: int, counter_blocks: list, statement_counters: list,
+             branch_counters: list = ()):
+        """Read the counters through the module's exported <entry>.profile table."""
+        table = (ctypes.c_void_p * len(counter_blocks)).from_address(table_address)
+        counts = [ctypes.c_int64.from_address(address).value for address in table]
+        
+        blocks = [(line, name, count) for (name, line), count in zip(counter_blocks, counts)]
+        lines = {}
+        for line, index in statement_counters:
+            lines[line] = max(lines.get(line, 0), counts[index])
+        branches = [(kind, line, occurrence, counts[taken], counts[not_taken])
+                    for kind, line, occurrence, taken, not_taken in branch_counters]
+        return cls(blocks, lines, branches)
+    
+    def hottest(self, limit: int = 10) -> list:
+        return sorted(self.lines.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    
+    def format(self, source_code: str = None, limit: int = 10) -> str:
+        source_lines = source_code.splitlines() if source_code is not None else []
+        rows = [f"{'line':>6} {'count':>14}  source"]
+        for line, count in self.hottest(limit):
+            text = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+            rows.append(f"{line:>6} {count:>14}  {text}")
+        return "\n".join(rows)
+
+
+class VariableStorage:
+    """Process-lifetime i64 cells for variables that outlive a module.
+    
+    Code generated against a storage addresses each variable's cell
+    directly, so separately compiled modules share the same variables.
+    """
+    
+    def __init__(self):
+        self.cells = {}
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.cells
+    
+    def __iter__(self):
+        return iter(self.cells)
+    
+    def address(self, name: str) -> int:
+        cell = self.cells.get(name)
+        if cell is None:
+            cell = self.cells[name] = ctypes.c_int64(0)
+        return ctypes.addressof(cell)
+    
+    def discard(self, names):
+        for name in names:
+            self.cells.pop(name, None)
+    
+    def values(self) -> dict:
+        return {name: cell.value for name, cell in self.cells.items()}
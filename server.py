@@ -0,0 +1,152 @@
+"""
+Compile-and-run daemon with warm LLVM state.
+
+'ide.py serve' imports codegen, builds the target machine and JIT engine
+and compiles one throwaway program up front, then listens on a Unix
+socket (protocol in client.py). Each connection is handled in a process
+forked from the warm daemon, so requests skip interpreter start-up and
+LLVM initialization entirely, and a program that crashes (e.g. a fatal
+signal in native code) only takes down its own connection.
+
+With the object cache, repeated programs that need the JIT are loaded
+from disk instead of recompiled. Nothing else carries over between
+connections: a fork's JIT modules and loaded objects disappear with it,
+so the daemon itself never grows.
+"""
+
+import os
+import signal
+import socket
+import socketserver
+import time
+
+from client import default_socket_path, recv_message, send_message
+from config import DEFAULT_OPT_LEVEL, OPT_LEVELS, BACKENDS, DEFAULT_BACKEND
+from cache import ObjectCache
+from runtime import OutputCapture
+from stats import CompileStats
+from ide import execute, warm_up
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request, _ = recv_message(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if request is None:
+                return
+            response, output = self.server.run_request(request)
+            try:
+                send_message(self.wfile, response, output)
+            except OSError:
+                return
+
+
+class XlangServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    def __init__(self, socket_path: str, opt_level: int = DEFAULT_OPT_LEVEL, backend: str = DEFAULT_BACKEND,
+                 cache: ObjectCache = None):
+        self.socket_path = socket_path
+        self.opt_level = opt_level
+        self.backend = backend
+        self.cache = cache
+        super().__init__(socket_path, RequestHandler)
+    
+    def prepare(self):
+        warm_up(self.opt_level)
+        if self.cache is not None:
+            self.cache.key("", self.opt_level)
+    
+    def run_request(self, request: dict):
+        start = time.perf_counter()
+        stats = CompileStats()
+        output = OutputCapture()
+        exit_code = None
+        error = None
+        try:
+            opt_level = request.get("opt_level", self.opt_level)
+            backend = request.get("backend", self.backend)
+            if opt_level not in OPT_LEVELS:
+                raise ValueError(f"Invalid optimization level: {opt_level}")
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown backend: {backend}")
+            source = request.get("source")
+            if source is None:
+                with open(request["path"], 'r') as f:
+                    source = f.read()
+            exit_code = execute(source, opt_level, self.cache, output, stats, backend=backend)
+        except FileNotFoundError as e:
+            error = f"File not found: {e.filename}"
+        except KeyError:
+            error = "Request needs a 'source' or a 'path'"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        
+        timings = {
+            "phases": [(phase["name"], phase["seconds"]) for phase in stats.phases],
+            "total_seconds": time.perf_counter() - start,
+        }
+        return {"exit_code": exit_code, "error": error, "timings": timings}, output.getvalue()
+    
+    def process_request(self, request, client_address):
+        # A SIGTERM right after the fork would unwind before ForkingMixIn
+        # records the child, and server_close() would never kill it.
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+        try:
+            super().process_request(request, client_address)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+    
+    def finish_request(self, request, client_address):
+        # Runs in the forked child, which never returns to process_request().
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+        super().finish_request(request, client_address)
+    
+    def server_close(self):
+        # ForkingMixIn waits for every connection here; one running an
+        # endless program would keep the daemon from ever shutting down.
+        for pid in self.active_children or ():
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        super().server_close()
+
+
+def socket_in_use(socket_path: str) -> bool:
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def _terminate(signum, frame):
+    # Unwind like Ctrl-C, so serve() removes the socket file.
+    raise SystemExit(0)
+
+
+def serve(socket_path: str = None, opt_level: int = DEFAULT_OPT_LEVEL, backend: str = DEFAULT_BACKEND,
+          cache: ObjectCache = None):
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        if socket_in_use(socket_path):
+            raise RuntimeError(f"An Xlang server is already listening on {socket_path}")
+        os.unlink(socket_path)
+    
+    server = XlangServer(socket_path, opt_level, backend, cache)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.prepare()
+        print(f"Xlang server listening on {socket_path} (-O{opt_level}, backend {backend})", flush=True)
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,70 @@
+"""
+Incremental compilation for the interactive IDE.
+
+Every entry (a statement or a complete block) is compiled as its own small
+module against one VariableStorage, run once on the shared JIT engine and
+unloaded again. Nothing is recompiled or replayed, so the cost of an entry
+does not depend on how long the session has been running.
+
+The AST optimizer is not used here: it assumes every variable starts at 0
+and that it sees the whole program, neither of which holds across entries.
+LLVM still optimizes each entry at the session's level.
+"""
+
+from lexer import Lexer
+from parser import Parser
+from codegen import CodeGenerator, DEFAULT_OPT_LEVEL
+from runtime import OutputCapture, VariableStorage
+
+
+BLOCK_KEYWORDS = ("loop", "if")
+
+
+def block_depth_change(line: str) -> int:
+    """How much a line opens (+1) or closes (-1) loop/if blocks."""
+    words = line.split(None, 1)
+    if not words:
+        return 0
+    if words[0] in BLOCK_KEYWORDS:
+        return 1
+    if words[0] == "stop":
+        return -1
+    return 0
+
+
+class Session:
+    def __init__(self, opt_level: int = DEFAULT_OPT_LEVEL):
+        self.opt_level = opt_level
+        self.storage = VariableStorage()
+        self.history = []
+        self.entry_count = 0
+    
+    def execute(self, source_code: str, output: OutputCapture = None):
+        """Compile and run one entry; returns its exit code.
+        
+        An entry that fails to compile leaves the session unchanged.
+        """
+        known = set(self.storage)
+        try:
+            tokens = Lexer(source_code).tokenize_buffer()
+            ast = Parser(tokens).parse()
+            
+            codegen = CodeGenerator(opt_level=self.opt_level,
+                                    entry_name=f"xlang_entry_{self.entry_count}",
+                                    storage=self.storage)
+            codegen.generate(ast)
+            codegen.verify()
+        except Exception:
+            self.storage.discard([name for name in self.storage if name not in known])
+            raise
+        
+        self.entry_count += 1
+        self.history.append(source_code)
+        return codegen.compile_and_run(output)
+    
+    def variables(self) -> dict:
+        return self.storage.values()
+    
+    def reset(self):
+        self.storage = VariableStorage()
+        self.history = []
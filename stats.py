@@ -0,0 +1,134 @@
+"""
+Per-phase timing, memory and size instrumentation for the compiler pipeline.
+
+A CompileStats records one entry per pipeline phase (wall time and, with
+trace_memory, the peak Python heap growth seen by tracemalloc during the
+phase) and named counts such as tokens, AST nodes and IR instructions.
+Every record is also sent as an event dict to the registered listeners,
+so callers can stream them to telemetry as they happen:
+
+    {"event": "phase", "name": "parse", "seconds": 0.0012, "peak_bytes": 81920}
+    {"event": "count", "name": "tokens", "value": 1234}
+
+Memory numbers cover Python allocations only; LLVM's native heap is not
+visible to tracemalloc.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from parser import ASTNode
+
+
+class CompileStats:
+    def __init__(self, trace_memory: bool = False, listeners=None):
+        self.trace_memory = trace_memory
+        self.listeners = list(listeners or [])
+        self.phases = []
+        self.counts = {}
+    
+    def _emit(self, event: dict):
+        for listener in self.listeners:
+            listener(event)
+    
+    @contextmanager
+    def phase(self, name: str):
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            event = {"event": "phase", "name": name, "seconds": seconds, "peak_bytes": None}
+            if self.trace_memory:
+                event["peak_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - base)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.phases.append(event)
+            self._emit(event)
+    
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+        self._emit({"event": "count", "name": name, "value": value})
+    
+    def count_module(self, prefix: str, mod):
+        for name, value in count_module(mod).items():
+            self.count(f"{prefix}_{name}", value)
+    
+    def total_seconds(self) -> float:
+        return sum(phase["seconds"] for phase in self.phases)
+    
+    def as_dict(self) -> dict:
+        return {
+            "phases": [{key: phase[key] for key in ("name", "seconds", "peak_bytes")} for phase in self.phases],
+            "counts": dict(self.counts),
+            "total_seconds": self.total_seconds(),
+        }
+    
+    def format(self) -> str:
+        lines = [f"{'phase':<26} {'ms':>10} {'peak KiB':>10}"]
+        for phase in self.phases:
+            peak = "-" if phase["peak_bytes"] is None else f"{phase['peak_bytes'] / 1024:.1f}"
+            lines.append(f"{phase['name']:<26} {phase['seconds'] * 1000:>10.2f} {peak:>10}")
+        lines.append(f"{'total':<26} {self.total_seconds() * 1000:>10.2f}")
+        for name, value in self.counts.items():
+            lines.append(f"{name:<26} {value:>10}")
+        return "\n".join(lines)
+
+
+class NullStats:
+    """Stand-in used when no statistics are wanted; records nothing."""
+    
+    @contextmanager
+    def phase(self, name: str):
+        yield
+    
+    def count(self, name: str, value: int):
+        pass
+    
+    def count_module(self, prefix: str, mod):
+        pass
+
+
+NULL_STATS = NullStats()
+
+
+def count_ast_nodes(node: ASTNode) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        for slot in type(node).__slots__:
+            child = getattr(node, slot)
+            if isinstance(child, ASTNode):
+                stack.append(child)
+            elif type(child) is list:
+                stack.extend(child)
+    return count
+
+
+def count_module(mod) -> dict:
+    """Count functions, basic blocks, instructions and globals of a parsed llvmlite module."""
+    functions = blocks = instructions = 0
+    for function in mod.functions:
+        if function.is_declaration:
+            continue
+        functions += 1
+        for block in function.blocks:
+            blocks += 1
+            instructions += sum(1 for _ in block.instructions)
+    return {
+        "functions": functions,
+        "basic_blocks": blocks,
+        "instructions": instructions,
+        "globals": sum(1 for _ in mod.global_variables),
+    }
@@ -0,0 +1,21 @@
+import os
+import sys
+
+# The compiler is a set of top-level modules, not a package.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import DEFAULT_BACKEND  # noqa: E402
+from ide import execute  # noqa: E402
+from runtime import OutputCapture  # noqa: E402
+
+
+def capture(run, *args, **options) -> tuple:
+    """Call run with an OutputCapture as its output; returns the exit code and the captured bytes."""
+    output = OutputCapture()
+    exit_code = run(*args, output=output, **options)
+    return exit_code, output.getvalue()
+
+
+def run(source: str, opt_level: int, backend: str = DEFAULT_BACKEND, **options) -> tuple:
+    """Run a program through ide.execute on backend."""
+    return capture(execute, source, opt_level, backend=backend, **options)
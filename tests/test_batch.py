@@ -0,0 +1,67 @@
+"""Tests for parallel batch runs (batch.py)."""
+
+import os
+import signal
+
+import batch
+from batch import collect_sources, run_batch
+from runtime import DIVISION_ERROR_EXIT_CODE
+
+
+def write_programs(directory, programs: dict) -> list:
+    paths = []
+    for name, source in programs.items():
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+        paths.append(str(path))
+    return paths
+
+
+def test_collect_sources(tmp_path):
+    write_programs(tmp_path, {"b.xl": "", "a/c.xl": "", "a/notes.txt": "", "a/b/d.xl": ""})
+    single = str(tmp_path / "b.xl")
+    assert collect_sources([str(tmp_path / "a"), single]) == \
+        [str(tmp_path / "a/b/d.xl"), str(tmp_path / "a/c.xl"), single]
+
+
+def test_results_come_back_in_order(tmp_path):
+    paths = write_programs(tmp_path, {f"p{n}.xl": f"show {n}\n" for n in range(12)})
+    paths.append(str(tmp_path / "missing.xl"))
+    paths += write_programs(tmp_path, {"bad.xl": "show 1 +\n", "trap.xl": "show 1\nmake z = 0\nshow 1 / z\n"})
+    seen = []
+    results = run_batch(paths, jobs=3, use_cache=False, on_result=seen.append)
+    assert [result.path for result in results] == paths
+    assert [result.output for result in results[:12]] == [f"{n}\n".encode() for n in range(12)]
+    assert all(result.ok for result in results[:12])
+    assert results[12].error.startswith("FileNotFoundError")
+    assert results[13].error.startswith("SyntaxError")
+    assert (results[14].exit_code, results[14].output) == (DIVISION_ERROR_EXIT_CODE, b"1\n")
+    assert sorted(result.path for result in seen) == sorted(paths)
+
+
+def test_crashing_file_is_isolated(tmp_path, monkeypatch):
+    run_file = batch.run_file
+    
+    def crash_on_marker(path, *args):
+        if path.endswith("crash.xl"):
+            os.kill(os.getpid(), signal.SIGKILL)
+        return run_file(path, *args)
+    
+    # Workers are forked, so they inherit the patched module.
+    monkeypatch.setattr(batch, "run_file", crash_on_marker)
+    paths = write_programs(tmp_path, {f"p{n}.xl": f"show {n}\n" for n in range(6)})
+    paths.insert(3, write_programs(tmp_path, {"crash.xl": "show 0\n"})[0])
+    results = run_batch(paths, jobs=2, use_cache=False)
+    assert results[3].error == "Worker process crashed"
+    assert [result.output for result in results[:3] + results[4:]] == [f"{n}\n".encode() for n in range(6)]
+
+
+def test_uses_recorded_profiles(tmp_path):
+    (path,) = write_programs(tmp_path, {"p.xl": "make i = 0\nloop i < 5:\n    make i = i + 1\nstop\nshow i\n"})
+    with open(path + ".xlprof", 'w') as f:
+        f.write('{"version": 99, "branches": []}')
+    (result,) = run_batch([path], jobs=1, use_cache=False, use_profiles=True)
+    assert result.error == "ValueError: Unsupported profile version: 99"
+    (result,) = run_batch([path], jobs=1, use_cache=False)
+    assert result.output == b"5\n"
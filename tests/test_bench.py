@@ -0,0 +1,56 @@
+"""Tests for the compiler-throughput benchmark (benchmarks/bench_compiler.py) and its baseline."""
+
+import json
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks")
+BASELINE = os.path.join(BENCHMARKS, "baseline.json")
+
+# The benchmark is a script that imports its generators as a sibling module.
+sys.path.insert(0, BENCHMARKS)
+from bench_compiler import DEFAULT_LINES, MIN_SECONDS, STAGES, measure, regressions, scaling_problems  # noqa: E402
+from generators import GENERATORS  # noqa: E402
+
+
+def row(lines: int, **seconds) -> dict:
+    return {"shape": "statements", "lines": lines, "actual_lines": lines, "seconds": seconds}
+
+
+@pytest.mark.parametrize("shape", sorted(GENERATORS))
+def test_generators_hit_the_requested_size(shape):
+    source = GENERATORS[shape](1000)
+    assert 900 <= source.count("\n") <= 1100
+
+
+def test_measure_times_every_stage():
+    assert list(measure(GENERATORS["nested"](100), 2, llvm=True)) == list(STAGES)
+    assert list(measure(GENERATORS["nested"](100), 0, llvm=False)) == ["tokenize", "lex", "parse"]
+
+
+def test_scaling_problems():
+    linear = [row(1000, parse=0.1), row(10000, parse=1.0)]
+    quadratic = [row(1000, jit=0.1), row(10000, jit=10.0)]
+    assert scaling_problems(linear, 1.3) == []
+    (problem,) = scaling_problems(quadratic, 1.3)
+    assert problem.startswith("statements/jit: time grows as lines^2.00")
+    # Too fast to measure reliably.
+    assert scaling_problems([row(1000, jit=MIN_SECONDS / 1000), row(10000, jit=MIN_SECONDS / 2)], 1.3) == []
+
+
+def test_regressions():
+    baseline = {"results": [row(1000, parse=0.1, jit=0.1)]}
+    assert regressions([row(1000, parse=0.14, jit=0.1)], baseline, 1.5) == []
+    (problem,) = regressions([row(1000, parse=0.1, jit=0.2)], baseline, 1.5)
+    assert problem == "statements/jit at 1000 lines: 2.00x slower per line than the baseline"
+    assert regressions([row(5000, jit=9.0)], baseline, 1.5) == []
+
+
+def test_baseline_covers_the_default_run():
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    sizes = {(result["shape"], result["lines"]) for result in baseline["results"]}
+    assert sizes == {(shape, lines) for shape in GENERATORS for lines in DEFAULT_LINES}
+    assert scaling_problems(baseline["results"], 1.3) == []
@@ -0,0 +1,46 @@
+"""Tests for ahead-of-time compilation (build.py)."""
+
+import shutil
+import subprocess
+
+import pytest
+
+from build import build
+from ide import capture_xlang
+from runtime import DIVISION_ERROR_EXIT_CODE
+
+PROGRAM = 'show "sum"\nmake i = 0\nloop i < 10:\n    make total = total + i\n    make i = i + 1\nstop\nshow total\n'
+
+needs_cc = pytest.mark.skipif(shutil.which("cc") is None, reason="needs a C compiler to link")
+
+
+@needs_cc
+@pytest.mark.parametrize("opt_level", [0, 2])
+def test_executable_prints_what_the_jit_prints(tmp_path, opt_level):
+    executable = str(tmp_path / "program")
+    assert build(PROGRAM, executable, opt_level) == [executable]
+    result = subprocess.run([executable], capture_output=True)
+    exit_code, output = capture_xlang(PROGRAM, opt_level, backend="jit")
+    assert (result.returncode, result.stdout) == (exit_code, bytes(output))
+
+
+@needs_cc
+def test_executable_reports_division_errors(tmp_path):
+    executable = str(tmp_path / "program")
+    build("show 1\nmake z = 0\nshow 1 / z\n", executable)
+    result = subprocess.run([executable], capture_output=True)
+    assert (result.returncode, result.stdout) == (DIVISION_ERROR_EXIT_CODE, b"1\n")
+
+
+def test_object_file_and_listings(tmp_path):
+    object_path = str(tmp_path / "program.o")
+    written = build(PROGRAM, object_path, object_only=True, emit_llvm=True, emit_asm=True)
+    assert written == [str(tmp_path / "program.ll"), str(tmp_path / "program.s"), object_path]
+    with open(object_path, 'rb') as f:
+        assert f.read(4) == b"\x7fELF"
+    assert "define" in (tmp_path / "program.ll").read_text()
+
+
+def test_link_errors_are_reported(tmp_path):
+    with pytest.raises(RuntimeError, match="Linking with false failed"):
+        build(PROGRAM, str(tmp_path / "program"), cc="false")
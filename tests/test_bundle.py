@@ -0,0 +1,86 @@
+"""Tests for compiling many programs as one JIT module (bundle.py)."""
+
+import pytest
+
+from benchmarks.generators import GENERATORS
+from bundle import Bundle, compile_bundle, run_bundle
+from ide import capture_xlang
+from runtime import OUT_OF_FUEL_EXIT_CODE, OutputCapture
+
+# Same variable names and the same string constants in every program.
+PROGRAMS = [
+    'show "shared"\nmake x = x + 1\nshow x\n',
+    'make x = 40\nmake x = x + 2\nshow "shared"\nshow x\n',
+    'make i = 0\nloop i < 3:\n    make total = total + i\n    make i = i + 1\nstop\nshow total\n',
+    'if x == 0:\n    show "x starts at zero"\nstop\nmake x = 1\n',
+] + [GENERATORS[shape](60) for shape in sorted(GENERATORS)]
+
+FOREVER = 'show "start"\nmake i = 0\nloop i < 1:\n    make n = n + 1\nstop\n'
+
+
+def alone(source: str, opt_level: int):
+    exit_code, output = capture_xlang(source, opt_level, backend="jit")
+    return exit_code, bytes(output)
+
+
+@pytest.mark.parametrize("opt_level", [0, 2])
+def test_programs_run_as_if_alone(opt_level):
+    with compile_bundle(PROGRAMS, opt_level) as bundle:
+        assert len(bundle) == len(PROGRAMS)
+        # Backwards and twice: no entry sees another's (or its own earlier) variables.
+        for _ in range(2):
+            for index in reversed(range(len(PROGRAMS))):
+                output = OutputCapture()
+                assert (bundle.run(index, output), output.getvalue()) == alone(PROGRAMS[index], opt_level)
+
+
+def test_broken_programs_are_left_out():
+    sources = ["show 1\n", "show 1 +\n", "show nope\n", "show 4\n"]
+    with compile_bundle(sources, 2) as bundle:
+        with pytest.raises(SyntaxError):
+            bundle.run(1)
+        with pytest.raises(NameError, match="Undefined variable: nope"):
+            bundle.run(2)
+        results = bundle.run_all()
+    assert [(result.exit_code, result.output) for result in results] == \
+        [(0, b"1\n"), (None, b""), (None, b""), (0, b"4\n")]
+    assert results[1].error.startswith("SyntaxError") and results[2].error.startswith("NameError")
+    assert [result.ok for result in results] == [True, False, False, True]
+
+
+def test_nothing_compiles():
+    results = run_bundle(["show 1 +\n", "show nope\n"])
+    assert [result.exit_code for result in results] == [None, None]
+    assert all(result.error for result in results)
+
+
+def test_fuel_is_per_program():
+    sources = ["show 1\n", FOREVER, "make i = 0\nloop i < 50:\n    make i = i + 1\nstop\nshow i\n"]
+    results = run_bundle(sources, fuel=1000)
+    assert [(result.exit_code, result.output) for result in results] == \
+        [(0, b"1\n"), (OUT_OF_FUEL_EXIT_CODE, b"start\n"), (0, b"50\n")]
+
+
+def test_run_bundle_keeps_source_order_across_modules():
+    sources = [f"show {n}\n" for n in range(7)] + ["show 1 +\n"]
+    results = run_bundle(sources, bundle_size=3)
+    assert [result.index for result in results] == list(range(8))
+    assert [result.output for result in results[:7]] == [f"{n}\n".encode() for n in range(7)]
+    assert results[7].error.startswith("SyntaxError")
+
+
+def test_bundles_live_side_by_side():
+    with compile_bundle(["show 1\n"]) as first, compile_bundle(["show 2\n"]) as second:
+        assert first.prefix != second.prefix
+        assert [result.output for result in first.run_all() + second.run_all()] == [b"1\n", b"2\n"]
+
+
+def test_lifecycle_errors():
+    bundle = Bundle()
+    bundle.add("show 1\n")
+    bundle.compile()
+    with pytest.raises(RuntimeError, match="cannot be added"):
+        bundle.add("show 2\n")
+    bundle.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        bundle.run(0)
@@ -0,0 +1,81 @@
+"""Tests for the on-disk object cache (cache.py)."""
+
+import os
+
+import pytest
+
+import cache
+import ide
+from cache import ObjectCache, object_key, run_cached
+from conftest import capture, run
+from ide import profile_xlang
+from pgo import BranchProfile
+from runtime import OutputCapture
+
+LOOP = "make i = 0\nloop i < 3:\n    show i\n    make i = i + 1\nstop\n"
+
+
+@pytest.fixture
+def object_cache(tmp_path):
+    return ObjectCache(str(tmp_path))
+
+
+def cached_objects(object_cache: ObjectCache) -> list:
+    return sorted(name for _, _, files in os.walk(object_cache.directory) for name in files if name.endswith(".o"))
+
+
+def test_key_covers_every_compiler_input(object_cache):
+    keys = {
+        object_cache.key(LOOP, 2),
+        object_cache.key(LOOP + "show 1\n", 2),
+        object_cache.key(LOOP, 3),
+        object_cache.key(LOOP, 2, "profile"),
+        object_key(object_cache, LOOP, 2, fuel_metering=True),
+    }
+    assert len(keys) == 5
+    assert object_cache.key(LOOP, 2) == ObjectCache(object_cache.directory).key(LOOP, 2)
+    assert object_key(object_cache, LOOP, 2) == object_cache.key(LOOP, 2)
+
+
+def test_profile_guided_builds_are_cached_apart(object_cache):
+    _, block_profile = profile_xlang(LOOP, 2, OutputCapture())
+    branch_profile = BranchProfile.from_block_profile(block_profile)
+    assert object_key(object_cache, LOOP, 2, branch_profile) != object_key(object_cache, LOOP, 2)
+    
+    assert capture(run_cached, LOOP, 2, object_cache) == \
+        capture(run_cached, LOOP, 2, object_cache, branch_profile=branch_profile) == (0, b"0\n1\n2\n")
+    assert len(cached_objects(object_cache)) == 2
+
+
+def test_second_run_loads_the_stored_object(object_cache, monkeypatch):
+    assert capture(run_cached, LOOP, 2, object_cache) == (0, b"0\n1\n2\n")
+    assert len(cached_objects(object_cache)) == 1
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("compiled a cached program")
+    
+    monkeypatch.setattr(cache, "compile_to_object", fail)
+    assert capture(run_cached, LOOP, 2, object_cache) == (0, b"0\n1\n2\n")
+
+
+def test_auto_backend_looks_up_the_cache_before_parsing(object_cache, monkeypatch):
+    assert run(LOOP, 2, "jit", cache=object_cache)[0] == 0
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("parsed a cached program")
+    
+    monkeypatch.setattr(ide, "parse_source", fail)
+    assert run(LOOP, 2, cache=object_cache) == (0, b"0\n1\n2\n")
+
+
+def test_interpreted_programs_are_remembered(object_cache):
+    assert not object_cache.was_interpreted("show 1\n", 2)
+    assert run("show 1\n", 2, cache=object_cache)[0] == 0
+    assert object_cache.was_interpreted("show 1\n", 2)
+    assert not cached_objects(object_cache)
+
+
+def test_unwritable_cache_still_runs(tmp_path):
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    assert capture(run_cached, LOOP, 2, ObjectCache(str(blocked))) == (0, b"0\n1\n2\n")
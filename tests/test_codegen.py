@@ -0,0 +1,107 @@
+"""Tests for code generation (codegen.py) against the bytecode interpreter."""
+
+import pytest
+
+import codegen as codegen_module
+import perfmap
+from benchmarks.generators import GENERATORS, nested_program, variables_program
+from codegen import CodeGenerator, get_target_machine
+from config import OPT_LEVELS
+from conftest import run
+from ide import compile_source, parse_source
+from optimizer import iter_blocks
+from parser import MakeNode
+from runtime import OutputCapture
+
+# Variables that can be read before they are made must still read as 0.
+READ_BEFORE_MAKE = {
+    "top level": "show a\nmake a = 5\nshow a\n",
+    "own value": "make a = a + 1\nshow a\n",
+    "later iteration": "make i = 0\nloop i < 3:\n    show x\n    make x = i\n    make i = i + 1\nstop\n",
+    "loop condition": "make i = 0\nloop x < 3:\n    make x = x + 1\n    make i = i + 1\nstop\nshow i\n",
+    "after the block": "if 1 == 2:\n    make y = 7\nelse:\n    show 1\nstop\nshow y\n",
+    "other branch": "make s = 0\nloop s < 2:\n    if s == 0:\n        make z = 4\n    else:\n        show z\n    stop\n"
+                    "    make s = s + 1\nstop\n",
+    "loop that never runs": "make n = 0\nloop n < 0:\n    make w = 3\nstop\nshow w\n",
+}
+
+
+@pytest.mark.parametrize("opt_level", [0, 2])
+@pytest.mark.parametrize("name", sorted(READ_BEFORE_MAKE))
+def test_variables_read_before_make_are_zero(name, opt_level):
+    source = READ_BEFORE_MAKE[name]
+    assert run(source, opt_level, "jit") == run(source, opt_level, "interp")
+
+
+@pytest.mark.parametrize("generator", [variables_program, nested_program])
+def test_made_variables_need_no_initial_store(generator):
+    # A store of 0 ahead of the first make keeps every variable live from
+    # the entry block on, which made SROA quadratic in the variable count.
+    ast = parse_source(generator(500), 2)
+    makes = sum(type(node) is MakeNode for block in iter_blocks(ast.statements) for node in block)
+    codegen = CodeGenerator(opt_level=2)
+    codegen.generate(ast)
+    stores = [instruction for block in codegen.func.blocks for instruction in block.instructions
+              if instruction.opname == "store" and instruction.operands[1].name in codegen.variables]
+    assert len(stores) == makes
+
+
+@pytest.mark.parametrize("shape", sorted(GENERATORS))
+def test_every_opt_level_gives_the_same_output(shape):
+    source = GENERATORS[shape](100)
+    expected = run(source, 0, "jit")
+    for opt_level in OPT_LEVELS[1:]:
+        assert run(source, opt_level, "jit") == expected
+
+
+def test_optimization_promotes_variables_to_registers():
+    def allocas(opt_level):
+        codegen = CodeGenerator(opt_level=opt_level)
+        codegen.generate(parse_source(GENERATORS["nested"](20), opt_level))
+        mod = codegen.optimize(codegen.verify(), None if opt_level == 0 else get_target_machine(opt_level))
+        return str(mod.get_function("main")).count(" alloca ")
+    
+    assert allocas(0) > 0
+    assert allocas(2) == 0
+
+
+def test_rejects_unknown_opt_levels():
+    with pytest.raises(ValueError, match="Invalid optimization level: 4"):
+        CodeGenerator(opt_level=4)
+
+
+def jit_output(source: str, opt_level: int = 2) -> bytes:
+    output = OutputCapture()
+    assert compile_source(source, opt_level).compile_and_run(output) == 0
+    return output.getvalue()
+
+
+def test_runs_share_one_engine(monkeypatch):
+    monkeypatch.setattr(codegen_module, "ENGINE_RECYCLE_LOADS", 10 ** 6)
+    engine = codegen_module.get_engine(2)
+    assert [jit_output(f"show {n}\n") for n in range(3)] == [b"0\n", b"1\n", b"2\n"]
+    assert codegen_module.get_engine(2) is engine
+    assert codegen_module._engine_modules[2] == 0
+
+
+def test_idle_engine_is_recycled(monkeypatch):
+    monkeypatch.setattr(codegen_module, "ENGINE_RECYCLE_LOADS", 2)
+    engines = []
+    for n in range(5):
+        assert jit_output(f"show {n}\n") == f"{n}\n".encode()
+        engines.append(codegen_module.get_engine(2))
+    assert any(engine is not engines[0] for engine in engines)
+
+
+def test_failed_run_unloads_its_module(monkeypatch):
+    registered = []
+    monkeypatch.setattr(perfmap, "_mode", "map")
+    monkeypatch.setattr(codegen_module, "register_object", lambda *args: registered.append(args))
+    # Unmetered code rejects a fuel budget after it has been loaded.
+    with pytest.raises(ValueError):
+        compile_source("show 1\n", 2).compile_and_run(OutputCapture(), fuel=10)
+    assert codegen_module._engine_modules[2] == 0
+    assert [args[1] for args in registered] == ["main"]
+    monkeypatch.setattr(perfmap, "_mode", None)
+    assert jit_output("show 2\n") == b"2\n"
+    assert len(registered) == 1
@@ -0,0 +1,36 @@
+"""Tests for fuel metering on loop back-edges."""
+
+import pytest
+
+from cache import ObjectCache
+from conftest import run
+from ide import compile_source
+from runtime import OUT_OF_FUEL_EXIT_CODE, OutputCapture
+
+FOREVER = 'show "start"\nmake i = 0\nloop i < 1:\n    make n = n + 1\nstop\nshow "never"\n'
+COUNT = "make i = 0\nloop i < 100:\n    make i = i + 1\nstop\nshow i\n"
+
+
+@pytest.mark.parametrize("opt_level", [0, 1, 2, 3])
+def test_endless_loop_runs_out_of_fuel(opt_level):
+    # Output shown before the loop is flushed on the way out.
+    assert run(FOREVER, opt_level, fuel=10000) == (OUT_OF_FUEL_EXIT_CODE, b"start\n")
+
+
+@pytest.mark.parametrize("opt_level", [0, 2])
+def test_enough_fuel_finishes(opt_level):
+    assert run(COUNT, opt_level, fuel=100) == (0, b"100\n")
+    assert run(COUNT, opt_level, fuel=50) == (OUT_OF_FUEL_EXIT_CODE, b"")
+
+
+def test_budget_is_set_per_run(tmp_path):
+    cache = ObjectCache(str(tmp_path))
+    assert run(COUNT, 2, fuel=50, cache=cache)[0] == OUT_OF_FUEL_EXIT_CODE
+    assert run(COUNT, 2, fuel=1000, cache=cache) == (0, b"100\n")
+    assert run(COUNT, 2, fuel=50, cache=cache)[0] == OUT_OF_FUEL_EXIT_CODE
+
+
+def test_unmetered_code_rejects_a_budget():
+    codegen = compile_source(COUNT, 2)
+    with pytest.raises(ValueError):
+        codegen.compile_and_run(OutputCapture(), 10)
@@ -0,0 +1,93 @@
+"""Tests for the bytecode interpreter backend against the JIT."""
+
+import random
+
+import pytest
+
+import ide
+from conftest import run
+from interpreter import choose_backend
+from runtime import DIVISION_ERROR_EXIT_CODE
+
+NAMES = ["a", "b", "c", "x"]
+CONSTANTS = ["0", "1", "2", "7", "100", "123456789", "9223372036854775807"]
+# Divisors include 0 and -1 (m), and lo is INT64_MIN, so some programs trap.
+PRELUDE = "".join(f"make {name} = {n}\n" for n, name in enumerate(NAMES)) + \
+    "make m = 0 - 1\nmake lo = 0 - 9223372036854775807 - 1\n"
+
+
+def expression(rng: random.Random, depth: int) -> str:
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(NAMES + CONSTANTS + ["lo"])
+    op = rng.choice("+-*/")
+    if op == "/":
+        return f"{expression(rng, depth - 1)} / {rng.choice(['3', '0', 'm', 'x', '1'])}"
+    return f"{expression(rng, depth - 1)} {op} {expression(rng, depth - 1)}"
+
+
+def block(rng: random.Random, depth: int, indent: str, lines: list):
+    for _ in range(rng.randint(1, 5)):
+        kind = rng.random()
+        if kind < 0.4:
+            lines.append(f"{indent}make {rng.choice(NAMES)} = {expression(rng, 3)}")
+        elif kind < 0.6:
+            lines.append(f"{indent}show {expression(rng, 3)}")
+        elif kind < 0.65:
+            lines.append(f'{indent}show "text {len(lines)}"')
+        elif kind < 0.8 and depth > 0:
+            lines.append(f"{indent}if {expression(rng, 2)} {rng.choice(['<', '=='])} {expression(rng, 2)}:")
+            block(rng, depth - 1, indent + "    ", lines)
+            if rng.random() < 0.5:
+                lines.append(f"{indent}else:")
+                block(rng, depth - 1, indent + "    ", lines)
+            lines.append(f"{indent}stop")
+        elif depth > 0:
+            # Loop counters are never assigned anywhere else, so every loop ends.
+            counter = f"k{len(lines)}"
+            lines.append(f"{indent}make {counter} = 0")
+            lines.append(f"{indent}loop {counter} < {rng.randint(0, 4)}:")
+            block(rng, depth - 1, indent + "    ", lines)
+            lines.append(f"{indent}    make {counter} = {counter} + 1")
+            lines.append(f"{indent}stop")
+
+
+def random_programs(seed: int, count: int):
+    rng = random.Random(seed)
+    for _ in range(count):
+        lines = []
+        block(rng, 3, "", lines)
+        yield PRELUDE + "\n".join(lines) + "\n"
+
+
+@pytest.mark.parametrize("opt_level", [0, 2])
+def test_matches_jit_on_random_programs(opt_level):
+    traps = 0
+    for source in random_programs(opt_level, 150):
+        result = run(source, opt_level, "interp")
+        assert result == run(source, opt_level, "jit"), source
+        traps += result[0] == DIVISION_ERROR_EXIT_CODE
+    # Make sure the trapping paths were exercised too.
+    assert traps
+
+
+@pytest.mark.parametrize("source", [
+    "show 1\nmake z = 0\nshow 5 / z\nshow 2\n",
+    "show 1\nmake z = 0 - 1\nmake lo = 0 - 9223372036854775807 - 1\nshow lo / z\n",
+])
+@pytest.mark.parametrize("backend", ["interp", "jit"])
+def test_division_errors_exit_the_same_way(source, backend):
+    assert run(source, 0, backend) == (DIVISION_ERROR_EXIT_CODE, b"1\n")
+
+
+def test_auto_backend_interprets_straight_line_code(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("compiled a straight-line program")
+    
+    monkeypatch.setattr(ide, "compile_ast", fail)
+    assert run("make a = 6\nshow a * 7\n", 2, "auto") == (0, b"42\n")
+
+
+def test_auto_backend_moves_long_loops_to_the_jit():
+    source = "make i = 0\nloop i < 3000000:\n    make i = i + 1\nstop\nshow i\n"
+    assert choose_backend(ide.parse_source(source, 2)) == "interp-fuel"
+    assert run(source, 2, "auto") == (0, b"3000000\n")
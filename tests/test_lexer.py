@@ -0,0 +1,73 @@
+"""Tests for the regex-driven lexer (lexer.py)."""
+
+import pytest
+
+from benchmarks.char_lexer import CharLexer
+from benchmarks.generators import GENERATORS
+from lexer import Lexer
+from tokens import TokenBuffer, TokenType
+
+SAMPLE = '''// leading comment
+show "Hello World!"
+make x = 42
+	make tabbed = x
+show 'single \\' quoted'
+
+make i = 0
+loop i < 5:
+    show i   // trailing comment
+    if i == 2:
+        show "two"
+    else:
+        show "multi
+line"
+    stop
+    make i = i + 1
+stop
+show x / 2 - 1 * 3
+'''
+
+
+def token_stream(tokens):
+    return [(token.type, token.value, token.line) for token in tokens]
+
+
+@pytest.mark.parametrize("shape", sorted(GENERATORS))
+def test_matches_char_lexer_on_generated_programs(shape):
+    source = GENERATORS[shape](300)
+    assert token_stream(Lexer(source).tokenize()) == token_stream(CharLexer(source).tokenize())
+
+
+def test_matches_char_lexer_on_sample():
+    assert token_stream(Lexer(SAMPLE).tokenize()) == token_stream(CharLexer(SAMPLE).tokenize())
+
+
+def test_buffer_matches_tokens():
+    buffer = Lexer(SAMPLE).tokenize_buffer()
+    assert token_stream(buffer) == token_stream(Lexer(SAMPLE).tokenize())
+    assert len(buffer) == len(buffer.types) == len(buffer.lines) == len(buffer.value_ids)
+
+
+def test_closes_open_blocks_at_end_of_input():
+    tokens = Lexer("loop x < 1:\n    show x").tokenize()
+    assert [token.type for token in tokens[-3:]] == [TokenType.IDENTIFIER, TokenType.DEDENT, TokenType.EOF]
+
+
+def test_reports_unexpected_characters():
+    with pytest.raises(SyntaxError, match="Unexpected character '>' at line 2"):
+        Lexer("show 1\nshow 2 > 1\n").tokenize()
+
+
+def test_buffer_interns_repeated_values():
+    buffer = Lexer("make x = 1\nmake x = x + 1\nshow x\n").tokenize_buffer()
+    assert buffer.values.count("x") == 1 and buffer.values.count(1) == 1
+    assert [buffer.value(i) for i in range(len(buffer))] == [token.value for token in buffer]
+
+
+def test_buffer_extend_remaps_values():
+    first = Lexer("show a\n").tokenize_buffer()
+    second = Lexer("show b\nshow a\n").tokenize_buffer()
+    combined = TokenBuffer.from_tokens(first)
+    combined.extend(second, 2)
+    assert token_stream(combined) == token_stream(list(first) + list(second)[2:])
+    assert combined.values.count("a") == 1
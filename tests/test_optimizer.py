@@ -0,0 +1,96 @@
+"""Tests for the AST optimizer (optimizer.py)."""
+
+import random
+
+import pytest
+
+from conftest import run
+from ide import parse_source
+from optimizer import INT64_MAX, INT64_MIN, fold_binary, wrap_i64
+from parser import BinaryOpNode, LoopNode, MakeNode, NumberNode, ShowNode
+from runtime import DIVISION_ERROR_EXIT_CODE
+
+
+def optimized(source: str) -> list:
+    return parse_source(source, 2).statements
+
+
+@pytest.mark.parametrize("source, value", [
+    ("show 9223372036854775807 + 1\n", INT64_MIN),
+    ("show 0 - 9223372036854775807 - 2\n", INT64_MAX),
+    ("show 4611686018427387904 * 4\n", 0),
+    ("show 3037000500 * 3037000500\n", wrap_i64(3037000500 * 3037000500)),
+    ("show 0 - 7 / 2\n", -3),
+    ("make a = 0 - 7\nshow a / 2\n", -3),
+    ("make a = 0 - 7\nmake b = 0 - 2\nshow a / b\n", 3),
+])
+def test_folds_like_i64_arithmetic(source, value):
+    statements = optimized(source)
+    assert len(statements) == 1 and type(statements[0]) is ShowNode
+    assert type(statements[0].value) is NumberNode
+    assert statements[0].value.value == value
+
+
+def test_fold_binary_division_truncates_toward_zero():
+    assert fold_binary('/', 7, -2) == -3
+    assert fold_binary('/', -7, -2) == 3
+    assert fold_binary('/', INT64_MIN, 1) == INT64_MIN
+
+
+@pytest.mark.parametrize("left, right", [(1, 0), (INT64_MIN, -1)])
+def test_trapping_divisions_are_not_folded(left, right):
+    assert fold_binary('/', left, right) is None
+
+
+def test_trapping_division_is_kept_even_if_unused():
+    statements = optimized("make x = 1 / 0\nshow 5\n")
+    assert type(statements[0]) is MakeNode and type(statements[0].value) is BinaryOpNode
+    assert run("make x = 1 / 0\nshow 5\n", 2, "jit") == (DIVISION_ERROR_EXIT_CODE, b"")
+
+
+# Invalid programs the optimizer would otherwise prune away before code generation sees them.
+PRUNED_ERRORS = {
+    "dead comparison store": ('make y = 1 < 2\nshow 5\n', "Cannot store a comparison result in variable y"),
+    "dead string store": ('make y = "hi"\nshow 5\n', "Strings can only be shown"),
+    "else never taken": ('if 1 == 1:\n    show 1\nelse:\n    make y = 1 < 2\nstop\n',
+                         "Cannot store a comparison result in variable y"),
+    "loop never run": ('loop 1 == 2:\n    make y = "hi"\nstop\n', "Strings can only be shown"),
+    "condition of a pruned if": ('if 1 == 2:\n    if 5:\n        show 1\n    stop\nstop\n',
+                                 "Loop and if conditions must be comparisons"),
+    "type error before a name error": ('make y = "hi"\nshow nope\n', "Strings can only be shown"),
+}
+
+
+@pytest.mark.parametrize("backend", ["jit", "interp"])
+@pytest.mark.parametrize("opt_level", [0, 2])
+@pytest.mark.parametrize("name", sorted(PRUNED_ERRORS))
+def test_pruning_keeps_type_errors(name, opt_level, backend):
+    source, message = PRUNED_ERRORS[name]
+    with pytest.raises(TypeError) as error:
+        run(source, opt_level, backend)
+    assert str(error.value) == message
+
+
+def test_prunes_constant_branches_and_dead_stores():
+    source = "make unused = 5\nif 1 < 2:\n    show 1\nelse:\n    show 2\nstop\n"
+    assert repr(optimized(source)) == repr([ShowNode(NumberNode(1))])
+
+
+def test_loop_variables_are_not_propagated():
+    statements = optimized("make i = 0\nloop i < 3:\n    make i = i + 1\nstop\nshow i\n")
+    assert type(statements[1]) is LoopNode
+    assert repr(statements[2]) == "Show(Identifier(i))"
+
+
+def test_folding_matches_unoptimized_code():
+    rng = random.Random(7)
+    operands = ["9223372036854775807", "4611686018427387904", "3037000500", "7", "3", "a", "b"]
+    lines = ["make a = 0 - 9223372036854775807 - 1\n", "make b = 0 - 3\n"]
+    for n in range(200):
+        terms = [rng.choice(operands) for _ in range(4)]
+        ops = [rng.choice("+-*/") for _ in range(3)]
+        # Divisors are never 0 or -1, so nothing traps.
+        expression = terms[0] + "".join(f" {op} {'7' if op == '/' else term}" for op, term in zip(ops, terms[1:]))
+        lines.append(f"make v{n} = {expression}\nshow v{n}\n")
+    source = "".join(lines)
+    assert run(source, 2, "jit") == run(source, 0, "jit")
@@ -0,0 +1,65 @@
+"""Tests for the native output runtime (outputgen.py)."""
+
+import re
+
+import pytest
+
+from benchmarks.generators import statements_program
+from ide import capture_xlang, compile_source, execute
+from optimizer import INT64_MAX, INT64_MIN
+from outputgen import OUTPUT_BUFFER_SIZE
+
+
+def test_runtime_helpers_stay_out_of_line():
+    # Inlining write_int's digit loop into every show made -O2 compile
+    # time grow super-linearly with the number of show statements.
+    source = statements_program(4000)
+    codegen = compile_source(source, 2)
+    obj = codegen.emit_object()
+    
+    optimized = str(codegen.llvm_module)
+    calls = {helper: len(re.findall(rf'call (fastcc )?void @"?{re.escape(helper)}"?\(', optimized))
+             for helper in ("xlang.out.int", "xlang.out.bytes", "xlang.out.flush")}
+    # Every show stays a single call, so the code grows linearly with the program.
+    shows = re.findall(r'^ *show ("?)', source, re.M)
+    assert calls["xlang.out.int"] == shows.count("")
+    assert calls["xlang.out.bytes"] == shows.count('"')
+    assert calls["xlang.out.flush"] > 0
+    assert len(obj) < 4000 * 40
+
+
+def capture(source: str, opt_level: int = 0) -> bytes:
+    exit_code, output = capture_xlang(source, opt_level, backend="jit")
+    assert exit_code == 0
+    return bytes(output)
+
+
+@pytest.mark.parametrize("value", [0, 7, -7, 10, 1234567890, INT64_MAX, INT64_MIN, INT64_MIN + 1])
+def test_formats_integers(value):
+    # Built from the program's own arithmetic so the optimizer cannot fold the show.
+    if value == INT64_MIN:
+        expression = f"0 - {INT64_MAX} * seed - 1"
+    elif value < 0:
+        expression = f"0 - {-value} * seed"
+    else:
+        expression = f"{value} * seed"
+    source = f"make seed = 0\nloop seed < 1:\n    make seed = seed + 1\nstop\nmake x = {expression}\nshow x\n"
+    assert capture(source, 2) == f"{value}\n".encode()
+
+
+def test_output_larger_than_the_buffer():
+    lines = [f"line {n} {'x' * (n % 50)}" for n in range(OUTPUT_BUFFER_SIZE // 16)]
+    source = "".join(f'show "{line}"\nshow {n}\n' for n, line in enumerate(lines))
+    expected = "".join(f"{line}\n{n}\n" for n, line in enumerate(lines)).encode()
+    assert len(expected) > 2 * OUTPUT_BUFFER_SIZE
+    assert capture(source) == expected
+
+
+def test_string_longer_than_the_buffer():
+    text = "é" * OUTPUT_BUFFER_SIZE
+    assert capture(f'show 1\nshow "{text}"\nshow 2\n') == f"1\n{text}\n2\n".encode()
+
+
+def test_writes_to_stdout_without_a_capture(capfd):
+    assert execute("show 42\nshow \"done\"\n", 0, backend="jit") == 0
+    assert capfd.readouterr().out == "42\ndone\n"
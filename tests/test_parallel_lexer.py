@@ -0,0 +1,60 @@
+"""Tests for the parallel lexer (parallel_lexer.py)."""
+
+import pytest
+
+from benchmarks.generators import GENERATORS
+from lexer import Lexer
+from parallel_lexer import split_source, tokenize_parallel
+
+# Small chunks, so the tests' sources get cut in many places.
+CHUNK_SIZE = 256
+
+# Long multi-line strings, so some cuts land inside a literal; one holds a
+# character the lexer would reject outside a string.
+STRINGS = "".join(f'show "{n}:{" x" * 40}\n  > inside\n{" y" * 40}"\nshow {n}\n' for n in range(20))
+
+
+def token_stream(tokens):
+    return [(token.type, token.value, token.line) for token in tokens]
+
+
+def assert_same_tokens(source: str):
+    parallel = tokenize_parallel(source, workers=2, chunk_size=CHUNK_SIZE)
+    assert token_stream(parallel) == token_stream(Lexer(source).tokenize_buffer())
+
+
+def test_split_source_cuts_after_newlines():
+    source = GENERATORS["statements"](100)
+    pieces = split_source(source, CHUNK_SIZE)
+    assert len(pieces) > 1
+    assert "".join(source[start:end] for start, end, _ in pieces) == source
+    for start, end, line in pieces:
+        assert source[end - 1] == "\n"
+        assert line == source.count("\n", 0, start) + 1
+
+
+@pytest.mark.parametrize("shape", sorted(GENERATORS))
+def test_matches_serial_lexer(shape):
+    assert_same_tokens(GENERATORS[shape](300))
+
+
+def test_strings_spanning_chunks():
+    assert_same_tokens(STRINGS)
+
+
+def test_string_spanning_many_chunks():
+    # The chunk the first literal closes in opens another one.
+    assert_same_tokens('show 1\nshow "' + "line\n" * 500 + '" + 2\n  show \'a\n' + "b\n" * 200 + "'\nshow 3\n")
+
+
+def test_source_without_final_newline():
+    assert_same_tokens(GENERATORS["nested"](100).rstrip("\n"))
+
+
+def test_reports_the_serial_lexers_error():
+    source = GENERATORS["statements"](200) + "show 1 > 2\n" + GENERATORS["statements"](200)
+    with pytest.raises(SyntaxError) as serial:
+        Lexer(source).tokenize_buffer()
+    with pytest.raises(SyntaxError) as parallel:
+        tokenize_parallel(source, workers=2, chunk_size=CHUNK_SIZE)
+    assert str(parallel.value) == str(serial.value)
@@ -0,0 +1,64 @@
+"""Tests for the parser and the compile path on deeply nested and very long input."""
+
+import sys
+
+import pytest
+
+from conftest import run
+from ide import parse_source
+from lexer import Lexer
+from optimizer import iter_blocks
+from parser import IfNode, LoopNode, Parser, ShowNode
+
+# Well past Python's recursion limit.
+DEPTH = max(3000, sys.getrecursionlimit() * 3)
+
+
+def nested(depth: int) -> str:
+    lines = []
+    for level in range(depth):
+        pad = "    " * level
+        if level % 2:
+            lines.append(f"{pad}if x{level - 1} == 1:")
+        else:
+            lines.append(f"{pad}make x{level} = 0")
+            lines.append(f"{pad}loop x{level} < 1:")
+            lines.append(f"{pad}    make x{level} = x{level} + 1")
+    lines.append("    " * depth + 'show "deep"')
+    lines.extend("    " * level + "stop" for level in reversed(range(depth)))
+    return "\n".join(lines) + "\n"
+
+
+def long_expression(terms: int) -> str:
+    return "make a = 1\nshow a" + " + a * 2 - 1" * terms + "\n"
+
+
+def test_parses_deep_nesting():
+    program = Parser(Lexer(nested(DEPTH)).tokenize_buffer()).parse()
+    blocks = list(iter_blocks(program.statements))
+    assert sum(type(node) in (LoopNode, IfNode) for block in blocks for node in block) == DEPTH
+    assert [node for block in blocks for node in block if type(node) is ShowNode][0].value.value == "deep"
+
+
+# Not the JIT at -O2: LLVM's loop passes take time quadratic in the loop depth.
+@pytest.mark.parametrize("opt_level, backend", [(0, "interp"), (2, "interp"), (0, "jit")])
+def test_runs_deep_nesting(opt_level, backend):
+    assert run(nested(DEPTH), opt_level, backend) == (0, b"deep\n")
+
+
+@pytest.mark.parametrize("backend", ["interp", "jit"])
+@pytest.mark.parametrize("opt_level", [0, 2])
+def test_runs_long_expressions(backend, opt_level):
+    assert run(long_expression(DEPTH), opt_level, backend) == (0, f"{DEPTH + 1}\n".encode())
+
+
+def test_long_expression_is_left_associative():
+    show = parse_source("show 10 - 3 - 2 - 1\n", 0).statements[0]
+    assert repr(show.value) == "BinaryOp(BinaryOp(BinaryOp(Number(10), -, Number(3)), -, Number(2)), -, Number(1))"
+
+
+def test_nodes_are_slotted_and_keep_their_lines():
+    make, loop = Parser(Lexer("make a = 1 + 2 * 3\nloop a < 9:\n    show a\nstop\n").tokenize_buffer()).parse().statements
+    assert not hasattr(make, "__dict__") and not hasattr(make.value, "__dict__")
+    assert (make.line, loop.line, loop.body[0].line) == (1, 2, 3)
+    assert repr(make.value) == "BinaryOp(Number(1), +, BinaryOp(Number(2), *, Number(3)))"
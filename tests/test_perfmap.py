@@ -0,0 +1,79 @@
+"""Tests for perf maps, jitdump files and DWARF line info (perfmap.py)."""
+
+import os
+import struct
+
+import pytest
+
+import perfmap
+from ide import compile_source
+from perfmap import JIT_CODE_DEBUG_INFO, JIT_CODE_LOAD, JITDUMP_MAGIC, ElfObject
+from runtime import OutputCapture
+
+SOURCE = "make i = 0\nloop i < 3:\n    make i = i + 1\nstop\nshow i\n"
+
+
+@pytest.fixture
+def perf_output(monkeypatch, tmp_path):
+    monkeypatch.setenv("JITDUMPDIR", str(tmp_path))
+    monkeypatch.setattr(perfmap, "_output", None)
+    yield perfmap.enable
+    perfmap.enable(None)
+    map_path = f"/tmp/perf-{os.getpid()}.map"
+    if os.path.exists(map_path):
+        os.unlink(map_path)
+
+
+def run(opt_level: int = 0, **options):
+    output = OutputCapture()
+    assert compile_source(SOURCE, opt_level, **options).compile_and_run(output) == 0
+    assert output.getvalue() == b"3\n"
+
+
+def read_jitdump(path: str) -> list:
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, _, header_size = struct.unpack_from('<III', data)
+    assert magic == JITDUMP_MAGIC
+    records = []
+    pos = header_size
+    while pos < len(data):
+        kind, size, _ = struct.unpack_from('<IIQ', data, pos)
+        records.append((kind, data[pos + 16:pos + size]))
+        pos += size
+    return records
+
+
+def test_elf_object_lists_functions_and_lines():
+    codegen = compile_source(SOURCE, 0, debug_info=True, source_path="program.xl")
+    elf = ElfObject(codegen.emit_object())
+    functions = {name: (offset, size) for name, _, offset, size in elf.functions()}
+    assert "main" in functions and functions["main"][1] > 0
+    assert {line for _, _, line in elf.line_rows()} >= {1, 2, 3, 5}
+
+
+def test_perf_map_names_the_loaded_functions(perf_output):
+    perf_output("map")
+    run()
+    with open(f"/tmp/perf-{os.getpid()}.map") as f:
+        rows = [line.split() for line in f]
+    assert "main" in [name for _, _, name in rows]
+    assert all(int(address, 16) > 0 and int(size, 16) > 0 for address, size, _ in rows)
+
+
+def test_jitdump_carries_source_lines(perf_output, tmp_path):
+    perf_output("jitdump")
+    run(debug_info=True, source_path="/src/program.xl")
+    records = read_jitdump(str(tmp_path / f"jit-{os.getpid()}.dump"))
+    loads = [index for index, (kind, body) in enumerate(records) if kind == JIT_CODE_LOAD]
+    # A code load record is 40 bytes of fields, then the function's name.
+    (main,) = [index for index in loads if records[index][1][40:45] == b"main\0"]
+    # The debug info for a function comes right before its code.
+    kind, body = records[main - 1]
+    assert kind == JIT_CODE_DEBUG_INFO
+    assert struct.unpack_from('<QQ', body)[1] > 0 and b"/src/program.xl\0" in body
+
+
+def test_rejects_unknown_outputs():
+    with pytest.raises(ValueError, match="Unknown perf output: bogus"):
+        perfmap.enable("bogus")
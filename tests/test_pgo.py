@@ -0,0 +1,74 @@
+"""Tests for profile-guided optimization from recorded branch profiles (pgo.py)."""
+
+import pytest
+
+import ide
+from ide import compile_source, execute, profile_xlang
+from pgo import MAX_WEIGHT, BranchProfile, default_profile_path, scale_weights
+from runtime import OutputCapture
+
+SOURCE = '''make i = 0
+loop i < 100:
+    if i < 3:
+        show i
+    else:
+        make j = j + 1
+    stop
+    make i = i + 1
+stop
+show j
+'''
+
+
+def recorded_profile() -> BranchProfile:
+    return BranchProfile.from_block_profile(profile_xlang(SOURCE, 2, OutputCapture())[1])
+
+
+def test_records_loop_and_if_counts():
+    assert recorded_profile().branches == {("if", 3, 0): [3, 97], ("loop", 2, 0): [100, 1]}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    profile = recorded_profile()
+    path = default_profile_path(str(tmp_path / "program.xl"))
+    assert path.endswith(".xl.xlprof")
+    profile.save(path)
+    loaded = BranchProfile.load(path)
+    assert loaded.branches == profile.branches and loaded.digest() == profile.digest()
+
+
+def test_rejects_other_profile_versions():
+    with pytest.raises(ValueError, match="Unsupported profile version: 99"):
+        BranchProfile.from_dict({"version": 99, "branches": []})
+
+
+def test_merge_adds_counts():
+    profile = recorded_profile()
+    profile.merge(recorded_profile())
+    assert profile.branches[("if", 3, 0)] == [6, 194]
+
+
+def test_weights_are_scaled_into_i32():
+    assert scale_weights(0, 5) == [1, 6]
+    taken, not_taken = scale_weights(MAX_WEIGHT * 4, MAX_WEIGHT)
+    assert taken <= MAX_WEIGHT + 1 and not_taken == MAX_WEIGHT // 4 + 1
+
+
+def test_branches_get_weights_and_output_is_unchanged():
+    profile = recorded_profile()
+    codegen = compile_source(SOURCE, 0, branch_profile=profile)
+    assert str(codegen.module).count("!prof") == 2
+    assert "i32 4, i32 98" in str(codegen.module)
+    for opt_level in (0, 2):
+        output = OutputCapture()
+        assert execute(SOURCE, opt_level, output=output, branch_profile=profile, backend="jit") == 0
+        assert output.getvalue() == b"0\n1\n2\n97\n"
+
+
+def test_profile_generate_and_use_on_the_command_line(tmp_path, capfd):
+    program = tmp_path / "program.xl"
+    program.write_text(SOURCE)
+    assert ide.main([str(program), "--profile-generate"]) == 0
+    assert BranchProfile.load(default_profile_path(str(program))).branches == recorded_profile().branches
+    assert ide.main([str(program), "--profile-use", "--no-cache"]) == 0
+    assert capfd.readouterr().out.count("0\n1\n2\n97\n") == 2
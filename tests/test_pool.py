@@ -0,0 +1,129 @@
+"""Tests for the isolated execution pool (pool.py)."""
+
+import asyncio
+import os
+import signal
+
+import pytest
+
+from pool import ExecutionPool
+from runtime import DIVISION_ERROR_EXIT_CODE
+
+FOREVER = "make x = 0\nloop x == 0:\n    make x = 0\nstop\n"
+
+
+def with_pool(test, **options):
+    async def main():
+        async with ExecutionPool(**options) as pool:
+            await test(pool)
+        assert not pool.workers
+        assert pool.zygote.process.returncode is not None
+    asyncio.run(main())
+
+
+def worker_pids(pool: ExecutionPool) -> set:
+    return {worker.pid for worker in pool.workers}
+
+
+def test_runs_programs_concurrently():
+    async def test(pool):
+        results = await asyncio.gather(*[pool.run(f"show {n}\n") for n in range(10)])
+        assert [(result.exit_code, result.output, result.error) for result in results] == \
+            [(0, f"{n}\n".encode(), None) for n in range(10)]
+        assert all(result.ok for result in results)
+    
+    with_pool(test, workers=2)
+
+
+def test_reports_program_errors_without_losing_the_worker():
+    async def test(pool):
+        pids = worker_pids(pool)
+        result = await pool.run("show 1 +\n")
+        assert result.exit_code is None and result.error.startswith("SyntaxError")
+        result = await pool.run("show 1\nmake z = 0\nshow 1 / z\n")
+        assert (result.exit_code, result.output, result.error) == (DIVISION_ERROR_EXIT_CODE, b"1\n", None)
+        assert worker_pids(pool) == pids
+    
+    with_pool(test, workers=1)
+
+
+def test_timed_out_worker_is_replaced():
+    async def test(pool):
+        pids = worker_pids(pool)
+        result = await pool.run(FOREVER, timeout=0.5)
+        assert result.timed_out and result.exit_code is None
+        assert len(pool.workers) == 1 and worker_pids(pool) != pids
+        assert (await pool.run("show 2\n")).output == b"2\n"
+    
+    with_pool(test, workers=1)
+
+
+@pytest.mark.parametrize("signum", [signal.SIGSEGV, signal.SIGKILL], ids=["SIGSEGV", "SIGKILL"])
+def test_dead_worker_is_reported_and_replaced(signum):
+    async def test(pool):
+        run = asyncio.ensure_future(pool.run(FOREVER, timeout=30))
+        # Give the worker time to start the program.
+        await asyncio.sleep(0.5)
+        (pid,) = worker_pids(pool)
+        os.kill(pid, signum)
+        result = await run
+        assert result.error == f"Worker killed by {signum.name}"
+        assert not result.timed_out and result.seconds < 30
+        assert (await pool.run("show 3\n")).output == b"3\n"
+    
+    with_pool(test, workers=1)
+
+
+def test_workers_are_recycled_after_max_runs():
+    async def test(pool):
+        pids = worker_pids(pool)
+        for n in range(2):
+            assert (await pool.run(f"show {n}\n")).ok
+        assert worker_pids(pool).isdisjoint(pids)
+        assert (await pool.run("show 9\n")).output == b"9\n"
+    
+    with_pool(test, workers=1, max_runs=2)
+
+
+def test_cancelled_run_kills_its_worker():
+    async def test(pool):
+        pids = worker_pids(pool)
+        run = asyncio.ensure_future(pool.run(FOREVER, timeout=30))
+        await asyncio.sleep(0.5)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        assert worker_pids(pool) != pids
+        assert (await pool.run("show 4\n")).output == b"4\n"
+    
+    with_pool(test, workers=1)
+
+
+def test_closed_pool_refuses_work():
+    async def main():
+        pool = ExecutionPool(workers=1)
+        await pool.start()
+        await pool.close()
+        with pytest.raises(RuntimeError):
+            await pool.run("show 1\n")
+    asyncio.run(main())
+
+
+def test_close_wakes_waiting_runs():
+    async def main():
+        pool = ExecutionPool(workers=1)
+        await pool.start()
+        runs = [asyncio.ensure_future(pool.run(FOREVER, timeout=30)) for _ in range(3)]
+        await asyncio.sleep(0.5)
+        await asyncio.wait_for(pool.close(), 10)
+        running, *waiting = await asyncio.wait_for(asyncio.gather(*runs, return_exceptions=True), 10)
+        assert running.error == "ExecutionPool was closed"
+        assert [type(error) for error in waiting] == [RuntimeError, RuntimeError]
+    asyncio.run(main())
+
+
+def test_rejects_bad_options():
+    with pytest.raises(ValueError):
+        ExecutionPool(opt_level=7)
+    with pytest.raises(ValueError):
+        ExecutionPool(backend="gpu")
@@ -0,0 +1,45 @@
+"""Tests for basic-block execution counters (CodeGenerator(profile=True), runtime.BlockProfile)."""
+
+import pytest
+
+from codegen import CodeGenerator
+from ide import profile_xlang
+from runtime import OutputCapture
+
+SOURCE = '''make i = 0
+loop i < 10:
+    if i < 3:
+        show i
+    else:
+        make j = j + 1
+    stop
+    make i = i + 1
+stop
+show j
+'''
+
+
+@pytest.mark.parametrize("opt_level", [0, 2])
+def test_counts_map_back_to_source_lines(opt_level):
+    output = OutputCapture()
+    exit_code, profile = profile_xlang(SOURCE, opt_level, output)
+    assert (exit_code, output.getvalue()) == (0, b"0\n1\n2\n7\n")
+    assert profile.lines == {1: 1, 2: 1, 3: 10, 4: 3, 6: 7, 8: 10, 10: 1}
+    assert sorted(profile.branches) == [("if", 3, 0, 3, 7), ("loop", 2, 0, 10, 1)]
+
+
+def test_report_lists_the_hottest_lines_first():
+    _, profile = profile_xlang(SOURCE, 2, OutputCapture())
+    assert profile.hottest(3) == [(3, 10), (8, 10), (6, 7)]
+    rows = profile.format(SOURCE, limit=2).splitlines()
+    assert rows[1].split() == ["3", "10", "if", "i", "<", "3:"]
+    assert rows[2].split() == ["8", "10", "make", "i", "=", "i", "+", "1"]
+
+
+def test_counters_start_at_zero_on_every_compile():
+    assert profile_xlang(SOURCE, 2, OutputCapture())[1].lines == profile_xlang(SOURCE, 2, OutputCapture())[1].lines
+
+
+def test_profiled_bundle_entries_are_rejected():
+    with pytest.raises(ValueError, match="module of its own"):
+        CodeGenerator(entry_name="second", profile=True, shared=CodeGenerator())
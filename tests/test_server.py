@@ -0,0 +1,153 @@
+"""Tests for the compile-and-run daemon (server.py) and its client (client.py)."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import client
+from client import Client
+from runtime import DIVISION_ERROR_EXIT_CODE
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FOREVER = "make x = 0\nloop x == 0:\n    make x = 0\nstop\n"
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    socket_path = str(tmp_path_factory.mktemp("server") / "xlang.sock")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "ide.py"), "serve", "--socket", socket_path,
+                                "--no-cache"], stdout=subprocess.PIPE, text=True)
+    # The server prints one line once it is warm and listening.
+    assert "listening" in process.stdout.readline()
+    yield process, socket_path
+    process.send_signal(signal.SIGTERM)
+    process.wait(10)
+    assert not os.path.exists(socket_path)
+
+
+def connection_handlers(pid: int) -> list:
+    path = f"/proc/{pid}/task/{pid}/children"
+    if not os.path.exists(path):
+        pytest.skip("needs /proc/PID/task/PID/children")
+    with open(path) as f:
+        return [int(child) for child in f.read().split()]
+
+
+def test_runs_requests_on_one_connection(server):
+    _, socket_path = server
+    with Client(socket_path) as connection:
+        assert connection.run("show 1\n")[1] == b"1\n"
+        response, output = connection.run("show 2\nmake z = 0\nshow 1 / z\n", opt_level=0, backend="jit")
+        assert (response["exit_code"], response["error"], output) == (DIVISION_ERROR_EXIT_CODE, None, b"2\n")
+        response, output = connection.run("show 3\n", backend="interp")
+        assert (response["exit_code"], output) == (0, b"3\n")
+        assert response["timings"]["total_seconds"] > 0
+
+
+@pytest.mark.parametrize("request_options, error", [
+    ({"source": "show 1 +\n"}, "SyntaxError"),
+    ({"source": "show 1\n", "opt_level": 9}, "ValueError: Invalid optimization level: 9"),
+    ({"source": "show 1\n", "backend": "gpu"}, "ValueError: Unknown backend: gpu"),
+    ({"path": "/nonexistent/program.xl"}, "File not found: /nonexistent/program.xl"),
+    ({}, "Request needs a 'source' or a 'path'"),
+])
+def test_reports_bad_requests_and_keeps_the_connection(server, request_options, error):
+    _, socket_path = server
+    with Client(socket_path) as connection:
+        client.send_message(connection.file, request_options)
+        response, output = client.recv_message(connection.file)
+        assert response["exit_code"] is None and response["error"].startswith(error)
+        assert connection.run("show 4\n")[1] == b"4\n"
+
+
+def test_malformed_message_closes_only_that_connection(server):
+    _, socket_path = server
+    with Client(socket_path) as connection:
+        connection.file.write(b"not json\n")
+        connection.file.flush()
+        assert connection.file.readline() == b""
+    with Client(socket_path) as connection:
+        assert connection.run("show 5\n")[1] == b"5\n"
+
+
+def test_crashed_connection_leaves_the_server_running(server):
+    process, socket_path = server
+    # Handlers of earlier tests' connections may not have been reaped yet.
+    earlier = set(connection_handlers(process.pid))
+    connection = Client(socket_path)
+    errors = []
+    
+    def run_forever():
+        try:
+            connection.run(FOREVER)
+        except ConnectionError as e:
+            errors.append(e)
+    
+    thread = threading.Thread(target=run_forever)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not set(connection_handlers(process.pid)) - earlier and time.monotonic() < deadline:
+        time.sleep(0.05)
+    for pid in set(connection_handlers(process.pid)) - earlier:
+        os.kill(pid, signal.SIGSEGV)
+    thread.join(10)
+    connection.close()
+    assert errors
+    with Client(socket_path) as connection:
+        assert connection.run("show 6\n")[1] == b"6\n"
+
+
+def test_refuses_a_socket_that_is_in_use(server):
+    _, socket_path = server
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "ide.py"), "serve", "--socket", socket_path,
+                             "--no-cache"], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1
+    assert "already listening" in result.stdout
+
+
+def test_client_exit_status(server, tmp_path, capfd):
+    _, socket_path = server
+    good = tmp_path / "good.xl"
+    good.write_text("show 7\n")
+    trapping = tmp_path / "trap.xl"
+    trapping.write_text("make z = 0\nshow 1 / z\n")
+    assert client.main(["--socket", socket_path, str(good)]) == 0
+    assert client.main(["--socket", socket_path, str(trapping)]) == DIVISION_ERROR_EXIT_CODE
+    assert client.main(["--socket", socket_path, str(tmp_path / "missing.xl")]) == 1
+    assert capfd.readouterr().out == "7\n"
+
+
+def test_client_without_a_server(tmp_path, capfd):
+    stale = tmp_path / "stale.sock"
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(stale))
+    listener.close()
+    assert client.main(["--socket", str(stale), "-"]) == 1
+    assert "Cannot reach the Xlang server" in capfd.readouterr().err
+
+
+def test_shuts_down_while_a_program_runs(tmp_path):
+    socket_path = str(tmp_path / "xlang.sock")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "ide.py"), "serve", "--socket", socket_path,
+                                "--no-cache"], stdout=subprocess.PIPE, text=True)
+    assert "listening" in process.stdout.readline()
+    with Client(socket_path) as connection:
+        client.send_message(connection.file, {"source": FOREVER})
+        deadline = time.monotonic() + 10
+        while not connection_handlers(process.pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(10) == 0
+        # A handler killed before reading the request resets the connection.
+        try:
+            closed = connection.file.readline() == b""
+        except ConnectionResetError:
+            closed = True
+        assert closed
+    assert not os.path.exists(socket_path)
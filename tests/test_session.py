@@ -0,0 +1,60 @@
+"""Tests for incremental REPL compilation (session.py)."""
+
+import pytest
+
+from conftest import capture
+from runtime import DIVISION_ERROR_EXIT_CODE
+from session import Session, block_depth_change
+
+
+@pytest.mark.parametrize("opt_level", [0, 2])
+def test_variables_carry_over_between_entries(opt_level):
+    session = Session(opt_level)
+    assert capture(session.execute, "make x = 5\n") == (0, b"")
+    assert capture(session.execute, "loop x < 8:\n    make x = x + 1\nstop\n") == (0, b"")
+    assert capture(session.execute, "show x * 2\n") == (0, b"16\n")
+    assert session.variables() == {"x": 8}
+    assert session.history == ["make x = 5\n", "loop x < 8:\n    make x = x + 1\nstop\n", "show x * 2\n"]
+
+
+def test_failed_entry_leaves_the_session_unchanged():
+    session = Session()
+    capture(session.execute, "make x = 1\n")
+    with pytest.raises(SyntaxError):
+        session.execute("make y = 2\nshow 1 +\n")
+    with pytest.raises(NameError):
+        session.execute("make y = x\nshow nope\n")
+    assert session.variables() == {"x": 1}
+    assert len(session.history) == 1
+    assert capture(session.execute, "show x\n") == (0, b"1\n")
+
+
+def test_runtime_errors_keep_earlier_assignments():
+    session = Session()
+    assert capture(session.execute, "make x = 3\nmake z = 0\nshow x / z\n") == (DIVISION_ERROR_EXIT_CODE, b"")
+    assert session.variables() == {"x": 3, "z": 0}
+
+
+def test_reset_forgets_everything():
+    session = Session()
+    capture(session.execute, "make x = 9\n")
+    session.reset()
+    assert session.variables() == {} and session.history == []
+    with pytest.raises(NameError):
+        session.execute("show x\n")
+
+
+def test_entries_do_not_replay_history():
+    session = Session()
+    for n in range(50):
+        assert capture(session.execute, f"make x = x + {n}\n") == (0, b"")
+    assert session.variables() == {"x": sum(range(50))}
+    assert session.entry_count == 50
+
+
+@pytest.mark.parametrize("line, change", [
+    ("loop i < 3:", 1), ("  if x == 1:", 1), ("stop", -1), ("    stop", -1),
+    ("show looped", 0), ("else:", 0), ("", 0),
+])
+def test_block_depth_change(line, change):
+    assert block_depth_change(line) == change
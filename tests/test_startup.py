@@ -0,0 +1,51 @@
+"""Tests that front-end-only and interpreted commands start without loading llvmlite."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Runs ide.py as a script, then reports whether llvmlite got imported.
+PROBE = '''
+import runpy, sys
+sys.argv = ["ide.py"] + sys.argv[1:]
+try:
+    runpy.run_path("ide.py", run_name="__main__")
+except SystemExit:
+    pass
+print("llvmlite loaded:", "llvmlite" in sys.modules)
+'''
+
+
+def loads_llvmlite(*argv) -> bool:
+    result = subprocess.run([sys.executable, "-c", PROBE, *argv], cwd=ROOT, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode == 0, result.stderr
+    last_line = result.stdout.splitlines()[-1]
+    assert last_line.startswith("llvmlite loaded: ")
+    return last_line == "llvmlite loaded: True"
+
+
+@pytest.fixture
+def program(tmp_path):
+    path = tmp_path / "program.xl"
+    path.write_text("make x = 2\nshow x * 21\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("argv", [
+    ["check", "{program}"],
+    ["check", "--emit", "ast", "{program}"],
+    ["{program}", "--emit", "tokens"],
+    ["{program}", "--backend", "interp", "--no-cache"],
+    ["{program}", "--no-cache"],
+], ids=["check", "check --emit ast", "--emit tokens", "interp", "auto"])
+def test_front_end_and_interpreter_skip_llvm(program, argv):
+    assert not loads_llvmlite(*[arg.format(program=program) for arg in argv])
+
+
+def test_jit_still_loads_llvm(program):
+    assert loads_llvmlite(program, "--backend", "jit", "--no-cache")
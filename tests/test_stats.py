@@ -0,0 +1,73 @@
+"""Tests for compiler phase timing and counts (stats.py)."""
+
+import json
+import tracemalloc
+
+import pytest
+
+import ide
+from ide import execute
+from runtime import OutputCapture
+from stats import CompileStats, count_ast_nodes
+
+SOURCE = "make a = 1\nshow a + 2\n"
+
+
+def run(opt_level: int, backend: str, stats: CompileStats):
+    assert execute(SOURCE, opt_level, None, OutputCapture(), stats, backend=backend) == 0
+
+
+@pytest.mark.parametrize("backend, phases", [
+    ("jit", ["lex", "parse", "optimize_ast", "codegen", "verify", "optimize", "emit", "run"]),
+    ("interp", ["lex", "parse", "optimize_ast", "bytecode", "interpret"]),
+])
+def test_records_every_phase(backend, phases):
+    events = []
+    stats = CompileStats(listeners=[events.append])
+    run(2, backend, stats)
+    assert [phase["name"] for phase in stats.phases] == phases
+    assert all(phase["seconds"] >= 0 and phase["peak_bytes"] is None for phase in stats.phases)
+    assert [event for event in events if event["event"] == "phase"] == stats.phases
+    assert stats.counts["tokens"] == 11 and stats.counts["ast_nodes"] == 7
+    assert stats.counts["optimized_ast_nodes"] < stats.counts["ast_nodes"]
+
+
+def test_counts_ir_before_and_after_llvm():
+    stats = CompileStats()
+    run(2, "jit", stats)
+    assert 0 < stats.counts["optimized_ir_instructions"] < stats.counts["ir_instructions"]
+    stats = CompileStats()
+    run(0, "jit", stats)
+    assert "optimize" not in [phase["name"] for phase in stats.phases]
+    assert "optimized_ir_instructions" not in stats.counts
+
+
+def test_trace_memory():
+    stats = CompileStats(trace_memory=True)
+    run(2, "jit", stats)
+    assert all(phase["peak_bytes"] >= 0 for phase in stats.phases)
+    assert stats.phases[0]["peak_bytes"] > 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_failed_phase_is_still_recorded():
+    stats = CompileStats()
+    with pytest.raises(SyntaxError):
+        execute("show 1 +\n", 2, None, OutputCapture(), stats)
+    assert stats.phases[-1]["name"] == "parse"
+
+
+def test_count_ast_nodes():
+    assert count_ast_nodes(ide.parse_source(SOURCE, 0)) == 7
+
+
+def test_stats_json_on_the_command_line(tmp_path, capfd):
+    program = tmp_path / "program.xl"
+    program.write_text(SOURCE)
+    assert ide.main([str(program), "--backend", "jit", "--stats-json", "-"]) == 0
+    output = capfd.readouterr().out
+    start = output.index("{")
+    assert "3" in output[:start].splitlines()
+    report = json.loads(output[start:])
+    assert report["total_seconds"] == pytest.approx(sum(phase["seconds"] for phase in report["phases"]))
+    assert report["counts"]["tokens"] == 11
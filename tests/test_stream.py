@@ -0,0 +1,70 @@
+"""Tests for the streaming front end: chunked lexing, lazy parsing and generate_stream."""
+
+import io
+
+import pytest
+
+import lexer
+from benchmarks.generators import GENERATORS
+from codegen import CodeGenerator
+from ide import capture_xlang
+from lexer import Lexer
+from parser import Parser
+from runtime import OutputCapture
+
+STRING_ACROSS_CHUNKS = 'make x = 1\nshow "one\ntwo\nthree"\n' * 5 + "show x\n"
+
+
+def token_stream(tokens):
+    return [(token.type, token.value, token.line) for token in tokens]
+
+
+def stream_output(source: str, opt_level: int = 0) -> bytes:
+    codegen = CodeGenerator(opt_level=opt_level)
+    codegen.generate_stream(Parser.from_buffers(Lexer(io.StringIO(source)).iter_buffers()).iter_statements())
+    codegen.verify()
+    output = OutputCapture()
+    assert codegen.compile_and_run(output) == 0
+    return output.getvalue()
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Make every test source span many chunks.
+    monkeypatch.setattr(lexer, "CHUNK_LINES", 3)
+
+
+@pytest.mark.parametrize("shape", sorted(GENERATORS))
+def test_streamed_tokens_match(small_chunks, shape):
+    source = GENERATORS[shape](200)
+    assert token_stream(Lexer(io.StringIO(source)).iter_tokens()) == token_stream(Lexer(source).tokenize())
+
+
+def test_string_literals_can_span_chunks(small_chunks):
+    streamed = Lexer(io.StringIO(STRING_ACROSS_CHUNKS)).iter_tokens()
+    assert token_stream(streamed) == token_stream(Lexer(STRING_ACROSS_CHUNKS).tokenize())
+
+
+@pytest.mark.parametrize("shape", sorted(GENERATORS))
+def test_streamed_statements_match(small_chunks, shape):
+    source = GENERATORS[shape](200)
+    streamed = Parser.from_buffers(Lexer(io.StringIO(source)).iter_buffers()).iter_statements()
+    assert repr(list(streamed)) == repr(Parser(Lexer(source).tokenize_buffer()).parse().statements)
+
+
+@pytest.mark.parametrize("shape", sorted(GENERATORS))
+def test_generate_stream_output_matches(small_chunks, shape):
+    source = GENERATORS[shape](200)
+    exit_code, output = capture_xlang(source, 0, backend="jit")
+    assert exit_code == 0
+    assert stream_output(source) == bytes(output)
+
+
+def test_forward_references_read_zero():
+    source = "show a\nmake a = 5\nloop 0 < a:\n    make c = c + a\n    make a = a - 1\nstop\nshow c\n"
+    assert stream_output(source, 2) == b"0\n15\n"
+
+
+def test_undefined_variable_reported_after_reading_everything():
+    with pytest.raises(NameError, match="Undefined variable: nope"):
+        stream_output("show nope\nshow 1\n")
@@ -1,3 +1,4 @@
+from array import array
 from enum import Enum, auto
 
 class TokenType(Enum):
@@ -30,6 +31,8 @@ class TokenType(Enum):
 
 
 class Token:
+    __slots__ = ('type', 'value', 'line')
+    
     def __init__(self, type: TokenType, value, line: int):
         self.type = type
         self.value = value
@@ -47,3 +50,67 @@ KEYWORDS = {
     "else": TokenType.ELSE,
     "stop": TokenType.STOP,
 }
+
+
+# TokenType by integer code (TokenType.X.value), for decoding TokenBuffer columns.
+TOKEN_TYPES = [None] * (max(t.value for t in TokenType) + 1)
+for _token_type in TokenType:
+    TOKEN_TYPES[_token_type.value] = _token_type
+
+
+class TokenBuffer:
+    """Columnar token storage.
+    
+    Token types and lines live in parallel array('i') columns; values are
+    interned in a table and referenced by index, so a token costs 12 bytes
+    instead of a full Token object. Indexing and iteration still produce
+    Token objects for callers that want them.
+    """
+    
+    __slots__ = ('types', 'lines', 'value_ids', 'values', 'value_index')
+    
+    def __init__(self):
+        self.types = array('i')
+        self.lines = array('i')
+        self.value_ids = array('i')
+        self.values = []
+        self.value_index = {}
+    
+    @classmethod
+    def from_tokens(cls, tokens):
+        buffer = cls()
+        for token in tokens:
+            buffer.append(token.type.value, token.value, token.line)
+        return buffer
+    
+    def intern(self, value) -> int:
+        value_id = self.value_index.get(value)
+        if value_id is None:
+            value_id = self.value_index[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+    
+    def append(self, type_code: int, value, line: int):
+        self.types.append(type_code)
+        self.lines.append(line)
+        self.value_ids.append(self.intern(value))
+    
+    def extend(self, other, start: int = 0):
+        remap = [self.intern(value) for value in other.values]
+        self.types.extend(other.types[start:])
+        self.lines.extend(other.lines[start:])
+        self.value_ids.extend(array('i', [remap[value_id] for value_id in other.value_ids[start:]]))
+    
+    def value(self, i: int):
+        return self.values[self.value_ids[i]]
+    
+    def __len__(self):
+        return len(self.types)
+    
+    def __getitem__(self, i: int) -> Token:
+        return Token(TOKEN_TYPES[self.types[i]], self.values[self.value_ids[i]], self.lines[i])
+    
+    def __iter__(self):
+        values = self.values
+        for type_code, value_id, line in zip(self.types, self.value_ids, self.lines):
+            yield Token(TOKEN_TYPES[type_code], values[value_id], line)